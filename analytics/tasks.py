@@ -102,6 +102,7 @@ def cleanup_old_usage_data():
 def cleanup_inactive_sessions():
     """Clean up inactive WhatsApp sessions"""
     from sessions.models import WhatsAppSession
+    from sessions.session_pool import SessionPoolService
     from django.utils import timezone
     
     # Find sessions that haven't been active for more than 24 hours
@@ -119,6 +120,7 @@ def cleanup_inactive_sessions():
             # Update session status to disconnected
             session.status = 'disconnected'
             session.save()
+            SessionPoolService.invalidate_user_sessions_cache(session.user_id)
             cleaned_count += 1
             logger.info(f"Marked session {session.id} as disconnected")
         except Exception as e:
@@ -131,35 +133,55 @@ def cleanup_inactive_sessions():
 @shared_task
 def cleanup_old_messages():
     """Clean up old message records and files"""
-    from messages.models import Message
+    from messages import partitions
+    from messages.retention import purge_expired_messages
+    from django.conf import settings
     from django.utils import timezone
-    import os
     
-    # Find messages older than 90 days
-    cutoff_date = timezone.now() - timedelta(days=90)
-    old_messages = Message.objects.filter(sent_at__lt=cutoff_date)
+    cutoff_date = timezone.now() - timedelta(days=settings.MESSAGE_RETENTION_DAYS)
     
-    logger.info(f"Found {old_messages.count()} old messages to clean up")
+    if partitions.is_partitioned():
+        return drop_expired_message_partitions(cutoff_date)
     
-    cleaned_count = 0
-    for message in old_messages:
+    # Chunked, resumable purge of an unpartitioned table
+    stats = purge_expired_messages(cutoff_date)
+    
+    logger.info(
+        f"Message cleanup completed. Removed {stats['deleted']} old messages "
+        f"({stats['media_failed']} media files could not be deleted)"
+    )
+    return f"Cleaned up {stats['deleted']} old messages"
+
+
+def drop_expired_message_partitions(cutoff_date):
+    """Drop monthly message partitions entirely older than cutoff_date, with their media"""
+    from django.db import transaction
+    from messages import partitions
+    from messages.media_store import delete_media_files, release_media_references
+    
+    dropped = 0
+    for month, name in partitions.expired_partitions(cutoff_date):
         try:
-            # Delete associated media files if they exist
-            if message.content and message.message_type in ['image', 'document', 'video']:
-                file_path = message.content
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                    logger.info(f"Deleted media file: {file_path}")
-            
-            # Delete the message record
-            message.delete()
-            cleaned_count += 1
-            
+            # References are released in the drop's transaction, so neither can
+            # happen without the other; the drop goes last so the exclusive
+            # lock on the messages table is only held until the commit
+            with transaction.atomic():
+                media_paths = partitions.partition_media_paths(name)
+                unused_paths = release_media_references(media_paths)
+                partitions.drop_partition(name)
         except Exception as e:
-            logger.error(f"Error cleaning message {message.id}: {e}")
+            logger.error(f"Error dropping message partition {name}: {e}")
+            continue
+        dropped += 1
+        
+        failed = delete_media_files(unused_paths)
+        
+        logger.info(
+            f"Dropped message partition {name} ({month:%Y-%m}) and released "
+            f"{len(media_paths)} media references ({failed} files could not be deleted)"
+        )
     
-    logger.info(f"Message cleanup completed. Removed {cleaned_count} old messages")
-    return f"Cleaned up {cleaned_count} old messages"
+    return f"Dropped {dropped} expired message partitions"
 
 
 @shared_task
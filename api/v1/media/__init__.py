@@ -0,0 +1 @@
+# Media API package
@@ -0,0 +1,35 @@
+"""
+Media serializers
+"""
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework import serializers
+from messages.models import MediaUpload
+from messages.uploads import validate_media_upload
+
+
+class MediaUploadSerializer(serializers.ModelSerializer):
+    """Uploaded media; its id is the media_id accepted by the send endpoints"""
+    
+    media_id = serializers.IntegerField(source='id', read_only=True)
+    size = serializers.IntegerField(source='media.size', read_only=True)
+    content_type = serializers.CharField(source='media.content_type', read_only=True)
+    sha256 = serializers.CharField(source='media.sha256', read_only=True)
+    
+    class Meta:
+        model = MediaUpload
+        fields = ['media_id', 'media_type', 'file_name', 'size', 'content_type', 'sha256', 'created_at']
+        read_only_fields = fields
+
+
+class MediaUploadCreateSerializer(serializers.Serializer):
+    """Upload a file to send later by media_id"""
+    
+    file = serializers.FileField()
+    media_type = serializers.ChoiceField(choices=MediaUpload.MEDIA_TYPE_CHOICES)
+    
+    def validate(self, attrs):
+        try:
+            validate_media_upload(attrs['file'], attrs['media_type'])
+        except DjangoValidationError as e:
+            raise serializers.ValidationError({'file': e.messages})
+        return attrs
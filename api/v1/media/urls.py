@@ -0,0 +1,11 @@
+"""
+Media API URLs
+"""
+from django.urls import path
+from .views import MediaUploadListCreateView, MediaUploadDetailView, MediaFileView
+
+urlpatterns = [
+    path('', MediaUploadListCreateView.as_view(), name='media-list'),
+    path('<int:media_id>/', MediaUploadDetailView.as_view(), name='media-detail'),
+    path('files/<path:file_path>', MediaFileView.as_view(), name='media-file'),
+]
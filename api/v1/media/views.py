@@ -0,0 +1,145 @@
+"""
+Media API views
+"""
+import mimetypes
+import re
+from urllib.parse import quote
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect
+from rest_framework import generics, views, status
+from rest_framework.permissions import AllowAny
+from messages.media_store import (
+    release_media, signed_media_url, store_media, verify_media_signature
+)
+from messages.models import MediaUpload, Message
+from messages.retention import MEDIA_TYPES
+from .serializers import MediaUploadSerializer, MediaUploadCreateSerializer
+from core.responses import APIResponse
+from core.permissions import IsActiveUser
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class MediaUploadListCreateView(generics.ListCreateAPIView):
+    """List uploaded media and upload a file once to send it by media_id"""
+    
+    permission_classes = [IsActiveUser]
+    serializer_class = MediaUploadSerializer
+    
+    def get_queryset(self):
+        return MediaUpload.objects.filter(user=self.request.user).select_related('media')
+    
+    def create(self, request, *args, **kwargs):
+        serializer = MediaUploadCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        file = serializer.validated_data['file']
+        upload = MediaUpload.objects.create(
+            user=request.user,
+            media=store_media(file),
+            media_type=serializer.validated_data['media_type'],
+            file_name=file.name[:255]
+        )
+        
+        logger.info(f'User {request.user.id} uploaded media {upload.id} ({upload.media.size} bytes)')
+        
+        return APIResponse.created(
+            MediaUploadSerializer(upload).data,
+            'Media uploaded successfully'
+        )
+
+
+class MediaUploadDetailView(generics.RetrieveDestroyAPIView):
+    """Get or delete uploaded media"""
+    
+    permission_classes = [IsActiveUser]
+    serializer_class = MediaUploadSerializer
+    lookup_url_kwarg = 'media_id'
+    
+    def get_queryset(self):
+        return MediaUpload.objects.filter(user=self.request.user).select_related('media')
+    
+    def perform_destroy(self, instance):
+        # Messages already sent from the upload keep their own references
+        instance.delete()
+        release_media([instance.media.file_path])
+
+
+class MediaFileView(views.APIView):
+    """
+    Serve a stored media file to the holder of a signed URL (the Node.js service)
+    
+    With MEDIA_ACCEL_REDIRECT_PREFIX set the response only names the file and
+    nginx sends it from an internal location; otherwise FileResponse hands the
+    open file to the server's sendfile wrapper. Either way no worker thread
+    copies the bytes.
+    """
+    
+    authentication_classes = []
+    permission_classes = [AllowAny]  # Authorised by the URL signature
+    
+    def get(self, request, file_path):
+        if not verify_media_signature(file_path, request.GET.get('expires'), request.GET.get('signature')):
+            return APIResponse.error(
+                'Invalid or expired media link',
+                error_code='MEDIA_LINK_INVALID',
+                status_code=status.HTTP_403_FORBIDDEN
+            )
+        
+        content_type = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+        
+        if settings.MEDIA_ACCEL_REDIRECT_PREFIX:
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = quote(f'{settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip("/")}/{file_path}')
+            return response
+        
+        if not default_storage.exists(file_path):
+            return APIResponse.error(
+                'Media not found',
+                error_code='MEDIA_NOT_FOUND',
+                status_code=status.HTTP_404_NOT_FOUND
+            )
+        
+        return FileResponse(default_storage.open(file_path, 'rb'), content_type=content_type)
+
+
+class LegacyMediaView(views.APIView):
+    """
+    Redirect a public /media/ URL of a media message sent before content
+    addressing to a signed link for it
+    
+    Such URLs were handed to the Node.js service and clients before media
+    became private, and older messages still store those paths. Only
+    whatsapp_media/<user_id>/<name> files that one of that user's messages
+    references are redirected; exports, recipient imports and content
+    addressed files stay reachable through signed links only. Off unless
+    MEDIA_LEGACY_URLS_ENABLED is set.
+    """
+    
+    authentication_classes = []
+    permission_classes = [AllowAny]  # These files were public when the link was issued
+    
+    LEGACY_PATH_RE = re.compile(r'^whatsapp_media/(?P<user_id>\d+)/[^/]+$')
+    
+    def get(self, request, file_path):
+        match = self.LEGACY_PATH_RE.match(file_path)
+        if (
+            not settings.MEDIA_LEGACY_URLS_ENABLED
+            or not match
+            # Uses the (user, ...) indexes rather than scanning content
+            or not Message.objects.filter(
+                user_id=int(match['user_id']),
+                message_type__in=MEDIA_TYPES,
+                content=file_path
+            ).exists()
+            or not default_storage.exists(file_path)
+        ):
+            return APIResponse.error(
+                'Media not found',
+                error_code='MEDIA_NOT_FOUND',
+                status_code=status.HTTP_404_NOT_FOUND
+            )
+        
+        return HttpResponseRedirect(signed_media_url(file_path))
@@ -1,8 +1,19 @@
 """
 Message serializers
 """
+from django.conf import settings
+from django.db.models import Count
+from django.urls import reverse
+from django.utils import timezone
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import serializers
-from messages.models import Message
+from messages.models import (
+    Message, MessageBatch, Campaign, ScheduledMessage, MessageTemplate, RecipientImport, MessageExport,
+    InboundMessage, MediaUpload
+)
+from messages.filters import parse_bound
+from messages.uploads import validate_media_upload
+from messages.templating import compile_template
 from core.validators import validate_phone_number
 
 
@@ -10,12 +21,29 @@ class MessageSerializer(serializers.ModelSerializer):
     """Message serializer"""
     
     username = serializers.CharField(source='user.username', read_only=True)
+    content = serializers.CharField(source='text', read_only=True)
     
     class Meta:
         model = Message
-        fields = ['id', 'username', 'recipient', 'message_type', 'content', 
-                  'status', 'error_message', 'sent_at']
-        read_only_fields = ['id', 'username', 'status', 'error_message', 'sent_at']
+        fields = ['id', 'username', 'recipient', 'message_type', 'priority', 'content', 
+                  'status', 'error_message', 'whatsapp_message_id', 'attempt_count',
+                  'next_retry_at', 'sent_at', 'delivered_at', 'read_at']
+        read_only_fields = ['id', 'username', 'priority', 'status', 'error_message', 'whatsapp_message_id',
+                            'attempt_count', 'next_retry_at', 'sent_at', 'delivered_at', 'read_at']
+
+
+class InboundMessageSerializer(serializers.ModelSerializer):
+    """Inbound message serializer"""
+    
+    session = serializers.CharField(source='session.session_id', read_only=True, default=None)
+    
+    class Meta:
+        model = InboundMessage
+        fields = [
+            'id', 'session', 'chat_id', 'sender', 'message_type', 'body', 'has_media',
+            'whatsapp_message_id', 'received_at'
+        ]
+        read_only_fields = fields
 
 
 class SendTextMessageSerializer(serializers.Serializer):
@@ -23,13 +51,339 @@ class SendTextMessageSerializer(serializers.Serializer):
     
     recipient = serializers.CharField(validators=[validate_phone_number])
     message = serializers.CharField(max_length=5000)
+    send_async = serializers.BooleanField(
+        required=False,
+        default=False,
+        help_text='Queue the message and return 202 instead of waiting for delivery'
+    )
+    priority = serializers.ChoiceField(
+        choices=Message.PRIORITY_CHOICES,
+        required=False,
+        default='normal',
+        help_text='Delivery lane for queued sends; use high for OTP/transactional messages'
+    )
+
+
+class MediaUploadField(serializers.IntegerField):
+    """media_id of one of the requesting user's uploads, resolved to the MediaUpload"""
+    
+    def to_internal_value(self, data):
+        media_id = super().to_internal_value(data)
+        upload = MediaUpload.objects.select_related('media').filter(
+            id=media_id,
+            user=self.context['request'].user
+        ).first()
+        if not upload:
+            raise serializers.ValidationError('Media not found.')
+        return upload
+    
+    def to_representation(self, value):
+        return value.id
 
 
 class SendMediaMessageSerializer(serializers.Serializer):
-    """Send media message serializer"""
+    """Send media message serializer: a file upload or the media_id of an earlier upload"""
     
     recipient = serializers.CharField(validators=[validate_phone_number])
-    media_type = serializers.ChoiceField(choices=['image', 'document', 'video'])
-    file = serializers.FileField()
+    media_type = serializers.ChoiceField(
+        choices=['image', 'document', 'video'],
+        required=False,
+        help_text='Required with file; defaults to the upload type with media_id'
+    )
+    file = serializers.FileField(required=False)
+    media_id = MediaUploadField(source='upload', required=False)
     caption = serializers.CharField(max_length=1000, required=False, allow_blank=True)
+    
+    def validate(self, attrs):
+        if ('file' in attrs) == ('upload' in attrs):
+            raise serializers.ValidationError('Provide either file or media_id.')
+        
+        if 'upload' in attrs:
+            attrs.setdefault('media_type', attrs['upload'].media_type)
+        elif 'media_type' not in attrs:
+            raise serializers.ValidationError({'media_type': 'This field is required with file.'})
+        else:
+            try:
+                validate_media_upload(attrs['file'], attrs['media_type'])
+            except DjangoValidationError as e:
+                raise serializers.ValidationError({'file': e.messages})
+        return attrs
+
+
+class BulkRecipientSerializer(serializers.Serializer):
+    """Single bulk recipient with optional per-recipient text"""
+    
+    recipient = serializers.CharField(validators=[validate_phone_number])
+    message = serializers.CharField(max_length=5000, required=False)
+
+
+class BulkRecipientField(serializers.Field):
+    """Bulk recipient given as a phone number or a {recipient, message} object"""
+    
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            data = {'recipient': data}
+        if not isinstance(data, dict):
+            raise serializers.ValidationError('Expected a phone number or an object with a recipient.')
+        
+        serializer = BulkRecipientSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        return dict(serializer.validated_data)
+    
+    def to_representation(self, value):
+        return value
+
+
+class SendBulkMessageSerializer(serializers.Serializer):
+    """Send bulk text message serializer; with media_id the texts are captions"""
+    
+    recipients = serializers.ListField(
+        child=BulkRecipientField(),
+        min_length=1,
+        max_length=settings.MAX_BULK_RECIPIENTS
+    )
+    message = serializers.CharField(
+        max_length=5000,
+        required=False,
+        help_text='Default text for recipients without their own message'
+    )
+    media_id = MediaUploadField(
+        source='upload',
+        required=False,
+        help_text='Send this upload to every recipient instead of a text message'
+    )
+    priority = serializers.ChoiceField(
+        choices=Message.PRIORITY_CHOICES,
+        required=False,
+        default='low',
+        help_text='Delivery lane; bulk traffic defaults to low'
+    )
+    
+    def validate(self, attrs):
+        default_message = attrs.get('message')
+        for entry in attrs['recipients']:
+            entry.setdefault('message', default_message)
+            # Captions are optional
+            if not entry['message'] and 'upload' not in attrs:
+                raise serializers.ValidationError(
+                    {'message': f'No message given for recipient {entry["recipient"]}.'}
+                )
+        return attrs
+
+
+class MessageBatchSerializer(serializers.ModelSerializer):
+    """Message batch serializer with per-status counts"""
+    
+    status_counts = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = MessageBatch
+        fields = ['id', 'total_count', 'status_counts', 'created_at']
+        read_only_fields = fields
+    
+    def get_status_counts(self, obj):
+        counts = {choice: 0 for choice, _ in Message.STATUS_CHOICES}
+        for row in obj.messages.values('status').annotate(count=Count('id')).order_by():
+            counts[row['status']] = row['count']
+        return counts
+
+
+class BulkResultSerializer(serializers.ModelSerializer):
+    """Per-recipient result of a bulk send"""
+    
+    class Meta:
+        model = Message
+        fields = ['id', 'recipient', 'status', 'error_message', 'sent_at']
+        read_only_fields = fields
+
+
+class ScheduleMessageSerializer(SendBulkMessageSerializer):
+    """Schedule text messages for later delivery"""
+    
+    media_id = None
+    send_at = serializers.DateTimeField()
+    campaign_name = serializers.CharField(max_length=100, required=False, allow_blank=True, default='')
+    
+    def validate_send_at(self, value):
+        if value <= timezone.now():
+            raise serializers.ValidationError('send_at must be in the future.')
+        return value
 
+
+class CampaignSerializer(serializers.ModelSerializer):
+    """Campaign serializer with per-status counts of its scheduled messages"""
+    
+    status_counts = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Campaign
+        fields = ['id', 'name', 'status_counts', 'created_at']
+        read_only_fields = fields
+    
+    def get_status_counts(self, obj):
+        counts = {choice: 0 for choice, _ in ScheduledMessage.STATUS_CHOICES}
+        for row in obj.scheduled_messages.values('status').annotate(count=Count('id')).order_by():
+            counts[row['status']] = row['count']
+        return counts
+
+
+class RecipientImportUploadSerializer(serializers.Serializer):
+    """Upload a CSV/NDJSON recipient file into a new campaign"""
+    
+    file = serializers.FileField()
+    format = serializers.ChoiceField(
+        choices=RecipientImport.FORMAT_CHOICES,
+        required=False,
+        help_text='Inferred from the file extension when omitted'
+    )
+    message = serializers.CharField(
+        max_length=5000,
+        required=False,
+        allow_blank=True,
+        default='',
+        help_text='Text for rows without a message column'
+    )
+    send_at = serializers.DateTimeField(required=False)
+    campaign_name = serializers.CharField(max_length=100, required=False, allow_blank=True, default='')
+    
+    def validate_file(self, value):
+        max_size = settings.RECIPIENT_IMPORT_MAX_SIZE
+        if value.size > max_size:
+            raise serializers.ValidationError(f'File must be at most {max_size} bytes.')
+        return value
+    
+    def validate(self, attrs):
+        if 'format' not in attrs:
+            extension = attrs['file'].name.rsplit('.', 1)[-1].lower()
+            formats = {'csv': 'csv', 'ndjson': 'ndjson', 'jsonl': 'ndjson'}
+            if extension not in formats:
+                raise serializers.ValidationError({
+                    'format': 'Could not infer format from file name; pass csv or ndjson.'
+                })
+            attrs['format'] = formats[extension]
+        
+        attrs.setdefault('send_at', timezone.now())
+        return attrs
+
+
+class RecipientImportSerializer(serializers.ModelSerializer):
+    """Recipient import job progress"""
+    
+    class Meta:
+        model = RecipientImport
+        fields = [
+            'id', 'campaign', 'file_format', 'status', 'rows_read', 'rows_imported',
+            'rows_invalid', 'error_message', 'send_at', 'created_at', 'completed_at'
+        ]
+        read_only_fields = fields
+
+
+class MessageExportRequestSerializer(serializers.Serializer):
+    """Format and filters of a message history export"""
+    
+    file_format = serializers.ChoiceField(choices=MessageExport.FORMAT_CHOICES, default='csv')
+    gzip = serializers.BooleanField(default=False)
+    status = serializers.CharField(required=False, allow_blank=True, help_text='Comma separated statuses')
+    recipient = serializers.CharField(max_length=20, required=False, allow_blank=True)
+    start_date = serializers.CharField(required=False, allow_blank=True, help_text='YYYY-MM-DD or ISO 8601')
+    end_date = serializers.CharField(required=False, allow_blank=True, help_text='YYYY-MM-DD or ISO 8601')
+    
+    def validate_start_date(self, value):
+        if value and parse_bound(value) is None:
+            raise serializers.ValidationError('Use YYYY-MM-DD or an ISO 8601 datetime.')
+        return value
+    
+    def validate_end_date(self, value):
+        return self.validate_start_date(value)
+    
+    @property
+    def filters(self):
+        """Non-empty filter values, in the form accepted by filter_messages"""
+        return {
+            key: value for key, value in self.validated_data.items()
+            if key not in ('file_format', 'gzip') and value
+        }
+
+
+class MessageExportSerializer(serializers.ModelSerializer):
+    """Message export job progress"""
+    
+    download_url = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = MessageExport
+        fields = [
+            'id', 'file_format', 'compress', 'filters', 'status', 'rows_exported',
+            'error_message', 'download_url', 'created_at', 'completed_at'
+        ]
+        read_only_fields = fields
+    
+    def get_download_url(self, obj):
+        if obj.status != 'completed':
+            return None
+        url = reverse('api_v1:message-export-download', args=[obj.id])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+
+class MessageTemplateSerializer(serializers.ModelSerializer):
+    """Message template serializer"""
+    
+    variables = serializers.ListField(child=serializers.CharField(), read_only=True)
+    
+    class Meta:
+        model = MessageTemplate
+        fields = ['id', 'name', 'body', 'variables', 'created_at']
+        read_only_fields = ['id', 'variables', 'created_at']
+    
+    def validate_body(self, value):
+        if len(value) > 5000:
+            raise serializers.ValidationError('Template body must be at most 5000 characters.')
+        if not compile_template(value).variables:
+            raise serializers.ValidationError('Template must contain at least one {{variable}}.')
+        return value
+
+
+class SendTemplateMessageSerializer(serializers.Serializer):
+    """Send template message serializer"""
+    
+    template_id = serializers.IntegerField()
+    rows = serializers.ListField(
+        child=serializers.ListField(child=serializers.CharField(max_length=1000, allow_blank=True)),
+        min_length=1,
+        max_length=settings.MAX_BULK_RECIPIENTS,
+        help_text='One row per recipient: [recipient, value, ...] with values ordered like the template variables'
+    )
+    priority = serializers.ChoiceField(
+        choices=Message.PRIORITY_CHOICES,
+        required=False,
+        default='low',
+        help_text='Delivery lane; template sends default to low'
+    )
+    
+    def validate_template_id(self, value):
+        template = MessageTemplate.objects.filter(
+            id=value,
+            user=self.context['request'].user,
+            is_active=True
+        ).first()
+        if not template:
+            raise serializers.ValidationError('Template not found.')
+        return value
+    
+    def validate(self, attrs):
+        template = MessageTemplate.objects.get(id=attrs['template_id'])
+        width = len(template.variables) + 1
+        
+        for index, row in enumerate(attrs['rows']):
+            if len(row) != width:
+                raise serializers.ValidationError(
+                    {'rows': f'Row {index} must have {width} values: recipient, {", ".join(template.variables)}.'}
+                )
+            try:
+                validate_phone_number(row[0])
+            except DjangoValidationError as e:
+                raise serializers.ValidationError({'rows': f'Row {index}: {e.messages[0]}'})
+        
+        attrs['template'] = template
+        return attrs
@@ -2,11 +2,40 @@
 Messages API URLs
 """
 from django.urls import path
-from .views import SendTextMessageView, SendMediaMessageView, MessageListView
+from .views import (
+    SendTextMessageView, SendMediaMessageView, MessageListView, MessageSearchView, MessageStatusView,
+    InboundMessageListView,
+    SendBulkMessageView, BulkStatusView, BulkResultListView,
+    ScheduleMessageView, CampaignStatusView, CancelCampaignView,
+    RecipientImportView, RecipientImportStatusView,
+    MessageExportView, MessageExportJobView, MessageExportStatusView, MessageExportDownloadView,
+    SendTemplateMessageView, MessageTemplateListCreateView, MessageTemplateDetailView
+)
+from .webhooks import MessageReceiptWebhookView, InboundMessageWebhookView
 
 urlpatterns = [
     path('send-text/', SendTextMessageView.as_view(), name='send-text'),
     path('send-media/', SendMediaMessageView.as_view(), name='send-media'),
+    path('send-bulk/', SendBulkMessageView.as_view(), name='send-bulk'),
+    path('send-template/', SendTemplateMessageView.as_view(), name='send-template'),
+    path('templates/', MessageTemplateListCreateView.as_view(), name='template-list'),
+    path('templates/<int:template_id>/', MessageTemplateDetailView.as_view(), name='template-detail'),
+    path('bulk/<int:batch_id>/', BulkStatusView.as_view(), name='bulk-status'),
+    path('bulk/<int:batch_id>/results/', BulkResultListView.as_view(), name='bulk-results'),
+    path('schedule/', ScheduleMessageView.as_view(), name='schedule'),
+    path('campaigns/import/', RecipientImportView.as_view(), name='campaign-import'),
+    path('imports/<int:import_id>/', RecipientImportStatusView.as_view(), name='import-status'),
+    path('campaigns/<int:campaign_id>/', CampaignStatusView.as_view(), name='campaign-status'),
+    path('campaigns/<int:campaign_id>/cancel/', CancelCampaignView.as_view(), name='campaign-cancel'),
+    path('receipts/webhook/', MessageReceiptWebhookView.as_view(), name='message-receipts-webhook'),
+    path('inbound/webhook/', InboundMessageWebhookView.as_view(), name='inbound-messages-webhook'),
+    path('inbound/', InboundMessageListView.as_view(), name='inbound-message-list'),
     path('list/', MessageListView.as_view(), name='message-list'),
+    path('search/', MessageSearchView.as_view(), name='message-search'),
+    path('export/', MessageExportView.as_view(), name='message-export'),
+    path('exports/', MessageExportJobView.as_view(), name='message-export-create'),
+    path('exports/<int:export_id>/', MessageExportStatusView.as_view(), name='message-export-status'),
+    path('exports/<int:export_id>/download/', MessageExportDownloadView.as_view(), name='message-export-download'),
+    path('status/<int:message_id>/', MessageStatusView.as_view(), name='message-status'),
 ]
 
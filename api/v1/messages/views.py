@@ -1,14 +1,34 @@
 """
 Message API views
 """
+import os
+from django.conf import settings
+from django.http import FileResponse, StreamingHttpResponse
 from rest_framework import views, generics, permissions, status
-from messages.models import Message
+from django.core.files.storage import default_storage
+from django.db import transaction
+from messages.models import (
+    Message, MessageBatch, Campaign, MessageTemplate, RecipientImport, MessageExport, InboundMessage
+)
+from messages import exporting
 from messages.services import MessageService
-from .serializers import MessageSerializer, SendTextMessageSerializer, SendMediaMessageSerializer
+from messages.filters import filter_messages, parse_bound
+from messages.search import search_messages
+from .serializers import (
+    MessageSerializer, SendTextMessageSerializer, SendMediaMessageSerializer,
+    SendBulkMessageSerializer, MessageBatchSerializer, BulkResultSerializer,
+    ScheduleMessageSerializer, CampaignSerializer,
+    RecipientImportUploadSerializer, RecipientImportSerializer,
+    MessageExportRequestSerializer, MessageExportSerializer, InboundMessageSerializer,
+    MessageTemplateSerializer, SendTemplateMessageSerializer
+)
 from core.responses import APIResponse
+from core.pagination import MessageCursorPagination, InboundCursorPagination
 from core.permissions import IsActiveUser
-from core.exceptions import SessionNotConnected, APIException
+from core.exceptions import SessionNotConnected, RateLimitExceeded, SessionThrottled, APIException
+from core.idempotency import idempotent
 import logging
+import math
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +38,7 @@ class SendTextMessageView(views.APIView):
     
     permission_classes = [IsActiveUser]
     
+    @idempotent
     def post(self, request):
         # Validate request
         serializer = SendTextMessageSerializer(data=request.data)
@@ -25,12 +46,28 @@ class SendTextMessageView(views.APIView):
         
         recipient = serializer.validated_data['recipient']
         message_text = serializer.validated_data['message']
+        send_async = serializer.validated_data['send_async']
+        priority = serializer.validated_data['priority']
         user = request.user
         
         try:
-            # Send message via service
             message_service = MessageService()
-            result = message_service.send_text_message(user, recipient, message_text)
+            
+            if send_async:
+                # Queue for the send workers and return immediately
+                result = message_service.queue_text_message(user, recipient, message_text, priority)
+                return APIResponse.success({
+                    'dbId': result.get('dbId'),
+                    'status': result.get('status'),
+                    'message': 'Message queued for delivery'
+                }, message='Accepted', status_code=status.HTTP_202_ACCEPTED)
+            
+            # Send message via service
+            result = message_service.send_text_message(
+                user, recipient, message_text,
+                idempotency_key=request.idempotency_key,
+                priority=priority
+            )
             
             if result.get('success'):
                 return APIResponse.success({
@@ -39,6 +76,14 @@ class SendTextMessageView(views.APIView):
                     'dbId': result.get('dbId'),
                     'message': 'Message sent successfully'
                 })
+            elif result.get('status') == 'retrying':
+                # Transient failure; the retry dispatcher delivers it later
+                return APIResponse.success({
+                    'dbId': result.get('dbId'),
+                    'status': result.get('status'),
+                    'nextRetryAt': result.get('nextRetryAt'),
+                    'message': f'Delivery failed temporarily and will be retried: {result.get("error")}'
+                }, message='Accepted', status_code=status.HTTP_202_ACCEPTED)
             else:
                 return APIResponse.error(
                     result.get('error', 'Failed to send message'),
@@ -51,6 +96,14 @@ class SendTextMessageView(views.APIView):
                 error_code='SESSION_NOT_CONNECTED',
                 status_code=status.HTTP_400_BAD_REQUEST
             )
+        except SessionThrottled as e:
+            response = APIResponse.error(
+                str(e),
+                error_code=e.error_code,
+                status_code=e.status_code
+            )
+            response['Retry-After'] = str(math.ceil(e.retry_after))
+            return response
         except APIException as e:
             logger.error(f'API error sending text message: {e}')
             return APIResponse.error(
@@ -71,14 +124,16 @@ class SendMediaMessageView(views.APIView):
     
     permission_classes = [IsActiveUser]
     
+    @idempotent
     def post(self, request):
         # Validate request
-        serializer = SendMediaMessageSerializer(data=request.data)
+        serializer = SendMediaMessageSerializer(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
         
         recipient = serializer.validated_data['recipient']
         media_type = serializer.validated_data['media_type']
-        file = serializer.validated_data['file']
+        file = serializer.validated_data.get('file')
+        upload = serializer.validated_data.get('upload')
         caption = serializer.validated_data.get('caption', '')
         user = request.user
         
@@ -86,7 +141,9 @@ class SendMediaMessageView(views.APIView):
             # Send media via service
             message_service = MessageService()
             result = message_service.send_media_message(
-                user, recipient, file, caption, media_type
+                user, recipient, file, caption, media_type,
+                idempotency_key=request.idempotency_key,
+                upload=upload
             )
             
             if result.get('success'):
@@ -97,6 +154,15 @@ class SendMediaMessageView(views.APIView):
                     'filePath': result.get('filePath'),
                     'message': 'Media sent successfully'
                 })
+            elif result.get('status') == 'retrying':
+                # Transient failure; the retry dispatcher delivers it later
+                return APIResponse.success({
+                    'dbId': result.get('dbId'),
+                    'status': result.get('status'),
+                    'nextRetryAt': result.get('nextRetryAt'),
+                    'filePath': result.get('filePath'),
+                    'message': f'Delivery failed temporarily and will be retried: {result.get("error")}'
+                }, message='Accepted', status_code=status.HTTP_202_ACCEPTED)
             else:
                 return APIResponse.error(
                     result.get('error', 'Failed to send media'),
@@ -109,6 +175,14 @@ class SendMediaMessageView(views.APIView):
                 error_code='SESSION_NOT_CONNECTED',
                 status_code=status.HTTP_400_BAD_REQUEST
             )
+        except SessionThrottled as e:
+            response = APIResponse.error(
+                str(e),
+                error_code=e.error_code,
+                status_code=e.status_code
+            )
+            response['Retry-After'] = str(math.ceil(e.retry_after))
+            return response
         except APIException as e:
             logger.error(f'API error sending media message: {e}')
             return APIResponse.error(
@@ -124,12 +198,538 @@ class SendMediaMessageView(views.APIView):
             )
 
 
+class SendBulkMessageView(views.APIView):
+    """Queue a text message, or an uploaded file, for many recipients as one batch"""
+    
+    permission_classes = [IsActiveUser]
+    
+    @idempotent
+    def post(self, request):
+        # Validate request
+        serializer = SendBulkMessageSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        
+        entries = serializer.validated_data['recipients']
+        upload = serializer.validated_data.get('upload')
+        priority = serializer.validated_data['priority']
+        user = request.user
+        
+        try:
+            message_service = MessageService()
+            if upload:
+                result = message_service.queue_bulk_media_messages(user, entries, upload, priority)
+            else:
+                result = message_service.queue_bulk_text_messages(user, entries, priority)
+            
+            return APIResponse.success({
+                'batchId': result.get('batchId'),
+                'queued': result.get('queued'),
+                'sessions': result.get('sessions'),
+                'message': 'Bulk messages queued for delivery'
+            }, message='Accepted', status_code=status.HTTP_202_ACCEPTED)
+        
+        except SessionNotConnected as e:
+            return APIResponse.error(
+                str(e),
+                error_code='SESSION_NOT_CONNECTED',
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+        except RateLimitExceeded as e:
+            return APIResponse.error(
+                str(e),
+                error_code=e.error_code,
+                status_code=e.status_code
+            )
+        except Exception as e:
+            logger.error(f'Unexpected error queuing bulk messages: {e}')
+            return APIResponse.error(
+                f'Failed to queue bulk messages: {str(e)}',
+                error_code='BULK_SEND_ERROR',
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class SendTemplateMessageView(views.APIView):
+    """Queue personalised messages rendered from a template"""
+    
+    permission_classes = [IsActiveUser]
+    
+    @idempotent
+    def post(self, request):
+        # Validate request
+        serializer = SendTemplateMessageSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        
+        template = serializer.validated_data['template']
+        rows = serializer.validated_data['rows']
+        user = request.user
+        
+        try:
+            message_service = MessageService()
+            result = message_service.queue_template_messages(
+                user, template, rows, serializer.validated_data['priority']
+            )
+            
+            return APIResponse.success({
+                'batchId': result.get('batchId'),
+                'queued': result.get('queued'),
+                'sessions': result.get('sessions'),
+                'message': 'Template messages queued for delivery'
+            }, message='Accepted', status_code=status.HTTP_202_ACCEPTED)
+        
+        except SessionNotConnected as e:
+            return APIResponse.error(
+                str(e),
+                error_code='SESSION_NOT_CONNECTED',
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+        except RateLimitExceeded as e:
+            return APIResponse.error(
+                str(e),
+                error_code=e.error_code,
+                status_code=e.status_code
+            )
+        except Exception as e:
+            logger.error(f'Unexpected error queuing template messages: {e}')
+            return APIResponse.error(
+                f'Failed to queue template messages: {str(e)}',
+                error_code='TEMPLATE_SEND_ERROR',
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class MessageTemplateListCreateView(generics.ListCreateAPIView):
+    """List and create message templates"""
+    
+    permission_classes = [IsActiveUser]
+    serializer_class = MessageTemplateSerializer
+    
+    def get_queryset(self):
+        return MessageTemplate.objects.filter(user=self.request.user, is_active=True)
+    
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        template = serializer.save(user=request.user)
+        
+        return APIResponse.created(
+            MessageTemplateSerializer(template).data,
+            'Template created successfully'
+        )
+
+
+class MessageTemplateDetailView(generics.RetrieveDestroyAPIView):
+    """Get or delete a message template"""
+    
+    permission_classes = [IsActiveUser]
+    serializer_class = MessageTemplateSerializer
+    lookup_url_kwarg = 'template_id'
+    
+    def get_queryset(self):
+        return MessageTemplate.objects.filter(user=self.request.user, is_active=True)
+    
+    def perform_destroy(self, instance):
+        # Soft delete: sent messages keep rendering from the template
+        instance.is_active = False
+        instance.save(update_fields=['is_active'])
+
+
+class BulkStatusView(views.APIView):
+    """Get progress summary of a bulk batch"""
+    
+    permission_classes = [IsActiveUser]
+    
+    def get(self, request, batch_id):
+        batch = MessageBatch.objects.filter(user=request.user, id=batch_id).first()
+        
+        if not batch:
+            return APIResponse.error(
+                'Batch not found',
+                error_code='BATCH_NOT_FOUND',
+                status_code=status.HTTP_404_NOT_FOUND
+            )
+        
+        return APIResponse.success(MessageBatchSerializer(batch).data)
+
+
+class BulkResultListView(generics.ListAPIView):
+    """List per-recipient results of a bulk batch"""
+    
+    permission_classes = [IsActiveUser]
+    serializer_class = BulkResultSerializer
+    
+    def get_queryset(self):
+        return Message.objects.filter(
+            user=self.request.user,
+            batch_id=self.kwargs['batch_id']
+        ).order_by('id')
+
+
+class ScheduleMessageView(views.APIView):
+    """Schedule text messages for one or more recipients"""
+    
+    permission_classes = [IsActiveUser]
+    
+    @idempotent
+    def post(self, request):
+        # Validate request
+        serializer = ScheduleMessageSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        data = serializer.validated_data
+        
+        try:
+            message_service = MessageService()
+            result = message_service.schedule_text_messages(
+                request.user,
+                data['recipients'],
+                data['send_at'],
+                data['campaign_name'],
+                data['priority']
+            )
+            
+            return APIResponse.created({
+                'campaignId': result.get('campaignId'),
+                'scheduled': result.get('scheduled'),
+                'sendAt': result.get('sendAt')
+            }, message='Messages scheduled')
+        
+        except RateLimitExceeded as e:
+            return APIResponse.error(
+                str(e),
+                error_code=e.error_code,
+                status_code=e.status_code
+            )
+        except Exception as e:
+            logger.error(f'Unexpected error scheduling messages: {e}')
+            return APIResponse.error(
+                f'Failed to schedule messages: {str(e)}',
+                error_code='SCHEDULE_ERROR',
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class RecipientImportView(views.APIView):
+    """Import a CSV/NDJSON recipient file into a new campaign in the background"""
+    
+    permission_classes = [IsActiveUser]
+    
+    @idempotent
+    def post(self, request):
+        from messages.tasks import import_recipients
+        
+        # Validate request
+        serializer = RecipientImportUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        data = serializer.validated_data
+        
+        try:
+            file = data['file']
+            file_path = default_storage.save(f'recipient_imports/{request.user.id}/{file.name}', file)
+            
+            with transaction.atomic():
+                campaign = Campaign.objects.create(user=request.user, name=data['campaign_name'])
+                recipient_import = RecipientImport.objects.create(
+                    user=request.user,
+                    campaign=campaign,
+                    file_path=file_path,
+                    file_format=data['format'],
+                    default_message=data['message'],
+                    send_at=data['send_at']
+                )
+                transaction.on_commit(lambda: import_recipients.delay(recipient_import.id))
+            
+            return APIResponse.success({
+                'importId': recipient_import.id,
+                'campaignId': campaign.id,
+                'status': recipient_import.status
+            }, message='Accepted', status_code=status.HTTP_202_ACCEPTED)
+        
+        except Exception as e:
+            logger.error(f'Unexpected error queueing recipient import: {e}')
+            return APIResponse.error(
+                f'Failed to queue import: {str(e)}',
+                error_code='IMPORT_ERROR',
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class RecipientImportStatusView(views.APIView):
+    """Get progress of a recipient import"""
+    
+    permission_classes = [IsActiveUser]
+    
+    def get(self, request, import_id):
+        recipient_import = RecipientImport.objects.filter(user=request.user, id=import_id).first()
+        
+        if not recipient_import:
+            return APIResponse.error(
+                'Import not found',
+                error_code='IMPORT_NOT_FOUND',
+                status_code=status.HTTP_404_NOT_FOUND
+            )
+        
+        return APIResponse.success(RecipientImportSerializer(recipient_import).data)
+
+
+class CampaignStatusView(views.APIView):
+    """Get progress summary of a scheduled campaign"""
+    
+    permission_classes = [IsActiveUser]
+    
+    def get(self, request, campaign_id):
+        campaign = Campaign.objects.filter(user=request.user, id=campaign_id).first()
+        
+        if not campaign:
+            return APIResponse.error(
+                'Campaign not found',
+                error_code='CAMPAIGN_NOT_FOUND',
+                status_code=status.HTTP_404_NOT_FOUND
+            )
+        
+        return APIResponse.success(CampaignSerializer(campaign).data)
+
+
+class CancelCampaignView(views.APIView):
+    """Cancel the not yet dispatched messages of a campaign"""
+    
+    permission_classes = [IsActiveUser]
+    
+    def post(self, request, campaign_id):
+        campaign = Campaign.objects.filter(user=request.user, id=campaign_id).first()
+        
+        if not campaign:
+            return APIResponse.error(
+                'Campaign not found',
+                error_code='CAMPAIGN_NOT_FOUND',
+                status_code=status.HTTP_404_NOT_FOUND
+            )
+        
+        cancelled = MessageService().cancel_campaign(campaign)
+        
+        return APIResponse.success({
+            'campaignId': campaign.id,
+            'cancelled': cancelled
+        }, message='Campaign cancelled')
+
+
 class MessageListView(generics.ListAPIView):
-    """List user's messages"""
+    """
+    List user's messages, newest first, with cursor pagination
+    
+    Optional filters: status (comma separated), recipient, start_date and
+    end_date (YYYY-MM-DD or ISO 8601 datetime).
+    """
     
     permission_classes = [IsActiveUser]
     serializer_class = MessageSerializer
+    pagination_class = MessageCursorPagination
+    
+    def get_queryset(self):
+        queryset = Message.objects.filter(user=self.request.user).select_related('user', 'template')
+        return filter_messages(queryset, self.request.query_params)
+
+
+class InboundMessageListView(generics.ListAPIView):
+    """
+    List messages received on the user's sessions, newest first
+    
+    Optional filters: chat (a conversation, e.g. +254700000000) and session
+    (session_id).
+    """
+    
+    permission_classes = [IsActiveUser]
+    serializer_class = InboundMessageSerializer
+    pagination_class = InboundCursorPagination
     
     def get_queryset(self):
-        return Message.objects.filter(user=self.request.user)
+        queryset = InboundMessage.objects.filter(user=self.request.user).select_related('session')
+        
+        chat = self.request.query_params.get('chat')
+        session_id = self.request.query_params.get('session')
+        
+        if chat:
+            queryset = queryset.filter(chat_id=chat)
+        
+        if session_id:
+            queryset = queryset.filter(session__session_id=session_id)
+        
+        return queryset
+
 
+class MessageSearchView(views.APIView):
+    """
+    Search user's message history by content and/or recipient
+    
+    Query params: q (content words), recipient (full or partial number),
+    start_date, end_date, cursor and page_size. Results are ordered by
+    relevance; pass the returned cursor to fetch the next page. Template
+    messages are matched by recipient only, as their text is not stored.
+    """
+    
+    permission_classes = [IsActiveUser]
+    
+    def get(self, request):
+        text = request.query_params.get('q', '').strip()
+        recipient = request.query_params.get('recipient', '').strip()
+        
+        if not text and not recipient:
+            return APIResponse.error(
+                'Provide q or recipient to search',
+                error_code='SEARCH_TERM_REQUIRED'
+            )
+        
+        try:
+            page_size = int(request.query_params.get('page_size', 20))
+        except ValueError:
+            page_size = 20
+        page_size = max(1, min(page_size, settings.MESSAGE_SEARCH_MAX_PAGE_SIZE))
+        
+        try:
+            messages, next_cursor = search_messages(
+                request.user,
+                text=text or None,
+                recipient=recipient or None,
+                start=parse_bound(request.query_params.get('start_date')),
+                end=parse_bound(request.query_params.get('end_date'), end_of_day=True),
+                cursor=request.query_params.get('cursor'),
+                limit=page_size
+            )
+        except Exception as e:
+            logger.error(f'Message search failed for user {request.user.id}: {e}')
+            return APIResponse.error(
+                'Search failed',
+                error_code='SEARCH_ERROR',
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        
+        return APIResponse.success({
+            'results': MessageSerializer(messages, many=True).data,
+            'next': next_cursor
+        })
+
+
+class MessageExportView(views.APIView):
+    """
+    Stream the user's message history as CSV or NDJSON
+    
+    Query params: file_format (csv or ndjson), gzip, and the message list
+    filters. Rows are streamed as they are read, so exports of any size use
+    constant memory; use POST exports/ to build the file in the background.
+    """
+    
+    permission_classes = [IsActiveUser]
+    
+    def get(self, request):
+        serializer = MessageExportRequestSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        
+        file_format = serializer.validated_data['file_format']
+        compress = serializer.validated_data['gzip']
+        queryset = filter_messages(Message.objects.filter(user=request.user), serializer.filters)
+        
+        response = StreamingHttpResponse(
+            exporting.export_messages(queryset, file_format, compress),
+            content_type='application/gzip' if compress else exporting.CONTENT_TYPES[file_format]
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{exporting.export_filename(file_format, compress)}"'
+        )
+        # Stop proxies from buffering the whole export before sending it on
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class MessageExportJobView(views.APIView):
+    """Build a message history export file in the background"""
+    
+    permission_classes = [IsActiveUser]
+    
+    @idempotent
+    def post(self, request):
+        from messages.tasks import export_messages
+        
+        serializer = MessageExportRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        try:
+            with transaction.atomic():
+                export = MessageExport.objects.create(
+                    user=request.user,
+                    file_format=serializer.validated_data['file_format'],
+                    compress=serializer.validated_data['gzip'],
+                    filters=serializer.filters
+                )
+                transaction.on_commit(lambda: export_messages.delay(export.id))
+            
+            return APIResponse.success({
+                'exportId': export.id,
+                'status': export.status
+            }, message='Accepted', status_code=status.HTTP_202_ACCEPTED)
+        
+        except Exception as e:
+            logger.error(f'Unexpected error queueing message export: {e}')
+            return APIResponse.error(
+                f'Failed to queue export: {str(e)}',
+                error_code='EXPORT_ERROR',
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class MessageExportStatusView(views.APIView):
+    """Get progress and download link of a message export"""
+    
+    permission_classes = [IsActiveUser]
+    
+    def get(self, request, export_id):
+        export = MessageExport.objects.filter(user=request.user, id=export_id).first()
+        
+        if not export:
+            return APIResponse.error(
+                'Export not found',
+                error_code='EXPORT_NOT_FOUND',
+                status_code=status.HTTP_404_NOT_FOUND
+            )
+        
+        return APIResponse.success(MessageExportSerializer(export, context={'request': request}).data)
+
+
+class MessageExportDownloadView(views.APIView):
+    """Download a completed message export"""
+    
+    permission_classes = [IsActiveUser]
+    
+    def get(self, request, export_id):
+        export = MessageExport.objects.filter(user=request.user, id=export_id, status='completed').first()
+        
+        if not export or not default_storage.exists(export.file_path):
+            return APIResponse.error(
+                'Export not found',
+                error_code='EXPORT_NOT_FOUND',
+                status_code=status.HTTP_404_NOT_FOUND
+            )
+        
+        return FileResponse(
+            default_storage.open(export.file_path, 'rb'),
+            as_attachment=True,
+            filename=os.path.basename(export.file_path)
+        )
+
+
+class MessageStatusView(views.APIView):
+    """Get delivery status of a single message"""
+    
+    permission_classes = [IsActiveUser]
+    
+    def get(self, request, message_id):
+        message = Message.objects.filter(user=request.user, id=message_id).first()
+        
+        if not message:
+            return APIResponse.error(
+                'Message not found',
+                error_code='MESSAGE_NOT_FOUND',
+                status_code=status.HTTP_404_NOT_FOUND
+            )
+        
+        return APIResponse.success(MessageSerializer(message).data)
@@ -0,0 +1,146 @@
+"""
+Message webhook handlers for receipts and inbound messages from Node.js service
+"""
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import views, status
+from rest_framework.permissions import AllowAny
+from core.responses import APIResponse
+from messages.services import MessageService
+from api_keys.authentication import NodeServiceAuthentication
+import logging
+
+logger = logging.getLogger(__name__)
+
+RECEIPT_STATUSES = ('delivered', 'read')
+
+
+class MessageReceiptWebhookView(views.APIView):
+    """
+    Webhook endpoint to receive batched delivery/read receipts from Node.js service
+    
+    Expected payload:
+    {
+        "receipts": [
+            {"messageId": "3EB0C767D26A", "status": "delivered", "timestamp": 1704067200000},
+            {"messageId": "3EB0C767D26B", "status": "read", "timestamp": 1704067260000}
+        ]
+    }
+    """
+    
+    authentication_classes = [NodeServiceAuthentication]
+    permission_classes = [AllowAny]  # Authentication handled by NodeServiceAuthentication
+    
+    @csrf_exempt
+    def dispatch(self, *args, **kwargs):
+        return super().dispatch(*args, **kwargs)
+    
+    def post(self, request):
+        raw_receipts = request.data.get('receipts')
+        
+        if not isinstance(raw_receipts, list):
+            return APIResponse.error(
+                'receipts must be a list',
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if len(raw_receipts) > settings.RECEIPT_WEBHOOK_MAX_BATCH:
+            return APIResponse.error(
+                f'At most {settings.RECEIPT_WEBHOOK_MAX_BATCH} receipts per request',
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Validated by hand: per-item serializers cost more than the update itself at receipt volume
+        receipts = []
+        skipped = 0
+        for item in raw_receipts:
+            if not isinstance(item, dict) or not item.get('messageId') or item.get('status') not in RECEIPT_STATUSES:
+                skipped += 1
+                continue
+            
+            timestamp = None
+            if isinstance(item.get('timestamp'), (int, float)):
+                timestamp = datetime.fromtimestamp(item['timestamp'] / 1000, tz=dt_timezone.utc)
+            
+            receipts.append({
+                'message_id': str(item['messageId']),
+                'status': item['status'],
+                'timestamp': timestamp
+            })
+        
+        try:
+            updated = MessageService().apply_receipts(receipts)
+        except Exception as e:
+            logger.error(f'Error applying message receipts: {e}')
+            return APIResponse.error(
+                'Failed to process receipts',
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        
+        return APIResponse.success({
+            'received': len(raw_receipts),
+            'updated': updated,
+            'skipped': skipped
+        })
+
+
+class InboundMessageWebhookView(views.APIView):
+    """
+    Webhook endpoint to receive batched inbound messages from Node.js service
+    
+    The batch is queued for the ingest task and acknowledged straight away;
+    rows are written there with one bulk insert.
+    
+    Expected payload:
+    {
+        "messages": [
+            {
+                "sessionId": "user_1_abc", "messageId": "3EB0C767D26C",
+                "from": "254700000000@c.us", "author": null, "type": "chat",
+                "body": "Hello", "hasMedia": false, "timestamp": 1704067200000
+            }
+        ]
+    }
+    """
+    
+    authentication_classes = [NodeServiceAuthentication]
+    permission_classes = [AllowAny]  # Authentication handled by NodeServiceAuthentication
+    
+    @csrf_exempt
+    def dispatch(self, *args, **kwargs):
+        return super().dispatch(*args, **kwargs)
+    
+    def post(self, request):
+        from messages.tasks import ingest_inbound_messages
+        
+        events = request.data.get('messages')
+        
+        if not isinstance(events, list):
+            return APIResponse.error(
+                'messages must be a list',
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if len(events) > settings.INBOUND_WEBHOOK_MAX_BATCH:
+            return APIResponse.error(
+                f'At most {settings.INBOUND_WEBHOOK_MAX_BATCH} messages per request',
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if events:
+            try:
+                ingest_inbound_messages.delay(events)
+            except Exception as e:
+                # Tell the service to keep the batch and retry
+                logger.error(f'Error queueing {len(events)} inbound messages: {e}')
+                return APIResponse.error(
+                    'Failed to queue inbound messages',
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE
+                )
+        
+        return APIResponse.success(
+            {'accepted': len(events)},
+            message='Accepted',
+            status_code=status.HTTP_202_ACCEPTED
+        )
@@ -7,6 +7,7 @@ from rest_framework.permissions import AllowAny
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from core.responses import APIResponse
+from sessions.circuit_breaker import SessionCircuitBreaker
 from sessions.models import WhatsAppSession
 from sessions.session_pool import SessionPoolService
 from api_keys.authentication import NodeServiceAuthentication
@@ -89,6 +90,9 @@ class SessionWebhookView(views.APIView):
             
             # Invalidate session cache for the user
             SessionPoolService.invalidate_user_sessions_cache(session.user_id)
+            if new_status == 'connected':
+                # A fresh connection starts with a closed circuit breaker
+                SessionCircuitBreaker().reset(session_id)
             
             logger.info(f'Session {session_id} status updated to {new_status} via webhook')
             
@@ -10,6 +10,7 @@ urlpatterns = [
     path('users/', include('api.v1.users.urls')),
     path('sessions/', include('api.v1.sessions.urls')),
     path('messages/', include('api.v1.messages.urls')),
+    path('media/', include('api.v1.media.urls')),
     path('api-keys/', include('api.v1.api_keys.urls')),
     path('analytics/', include('api.v1.analytics.urls')),
 ]
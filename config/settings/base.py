@@ -54,6 +54,7 @@ MIDDLEWARE = [
     'core.security.SecurityHeadersMiddleware',
     'core.security.BruteForceProtectionMiddleware',
     'core.security.RequestValidationMiddleware',
+    'messages.uploads.MediaUploadMiddleware',
     'core.security.SQLInjectionProtectionMiddleware',
     'core.security.InputSanitizationMiddleware',
     'core.security.IPWhitelistMiddleware',
@@ -228,6 +229,12 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+# Message delivery runs on its own queue so send workers can be scaled
+# independently of the housekeeping worker (celery -A config worker -Q messages)
+CELERY_TASK_ROUTES = {
+    'messages.tasks.drain_session_queue': {'queue': 'messages'},
+    'messages.tasks.send_bulk_chunk': {'queue': 'messages'},
+}
 CELERY_BEAT_SCHEDULE = {
     'aggregate-daily-usage': {
         'task': 'analytics.tasks.aggregate_daily_usage_stats',
@@ -245,10 +252,31 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'analytics.tasks.cleanup_old_messages',
         'schedule': 60.0 * 60.0 * 24.0,  # Run daily
     },
+    'cleanup-message-exports': {
+        'task': 'messages.tasks.cleanup_message_exports',
+        'schedule': 60.0 * 60.0 * 24.0,  # Run daily
+    },
+    'create-message-partitions': {
+        'task': 'messages.tasks.create_message_partitions',
+        'schedule': 60.0 * 60.0 * 24.0,  # Run daily
+    },
     'health-check': {
         'task': 'analytics.tasks.health_check',
         'schedule': 60.0 * 5.0,  # Run every 5 minutes
     },
+    # Message Delivery Tasks
+    'dispatch-scheduled-messages': {
+        'task': 'messages.tasks.dispatch_scheduled_messages',
+        'schedule': 30.0,  # Run every 30 seconds
+    },
+    'retry-failed-messages': {
+        'task': 'messages.tasks.retry_failed_messages',
+        'schedule': 15.0,  # Run every 15 seconds
+    },
+    'kick-outbound-queues': {
+        'task': 'messages.tasks.kick_outbound_queues',
+        'schedule': 60.0,  # Run every minute
+    },
     # WhatsApp Session Management Tasks
     'cleanup-expired-qr-codes': {
         'task': 'sessions.tasks.cleanup_expired_qr_codes',
@@ -275,6 +303,121 @@ DJANGO_BASE_URL = config('DJANGO_BASE_URL', default='http://localhost:8000')
 MAX_MESSAGES_PER_MINUTE = config('MAX_MESSAGES_PER_MINUTE', default=10, cast=int)
 MAX_MESSAGES_PER_DAY = config('MAX_MESSAGES_PER_DAY', default=1000, cast=int)
 
+# Idempotency-Key records for send endpoints
+IDEMPOTENCY_KEY_TTL = config('IDEMPOTENCY_KEY_TTL', default=60 * 60 * 24, cast=int)  # 24 hours
+IDEMPOTENCY_LOCK_TIMEOUT = config('IDEMPOTENCY_LOCK_TIMEOUT', default=300, cast=int)  # In-flight claim
+
+# Bulk Sending
+MAX_BULK_RECIPIENTS = config('MAX_BULK_RECIPIENTS', default=1000, cast=int)
+BULK_SEND_CHUNK_SIZE = config('BULK_SEND_CHUNK_SIZE', default=50, cast=int)
+
+# Per-session outbound queues (Redis lists drained by one sender per session)
+SESSION_OUTBOUND_QUEUES_ENABLED = config('SESSION_OUTBOUND_QUEUES_ENABLED', default=True, cast=bool)
+SESSION_SEND_INTERVAL = config('SESSION_SEND_INTERVAL', default=1.0, cast=float)  # Seconds between sender runs per session
+# Messages per sender run; their statuses and acks are written together (the default burst lasts one run)
+SESSION_SEND_BATCH_SIZE = config('SESSION_SEND_BATCH_SIZE', default=10, cast=int)
+SESSION_SENDER_LOCK_TIMEOUT = config('SESSION_SENDER_LOCK_TIMEOUT', default=300, cast=int)
+# Popped messages not acknowledged within this are queued again; keep it below the Node.js idempotency TTL (10 minutes)
+SESSION_OUTBOUND_ACK_TIMEOUT = config('SESSION_OUTBOUND_ACK_TIMEOUT', default=300, cast=int)
+
+# Session health scoring (Redis EWMA of send latency and success per session, used to pick sessions)
+SESSION_HEALTH_ENABLED = config('SESSION_HEALTH_ENABLED', default=True, cast=bool)
+SESSION_HEALTH_ALPHA = config('SESSION_HEALTH_ALPHA', default=0.2, cast=float)  # Weight of the latest attempt
+SESSION_HEALTH_DEFAULT_LATENCY_MS = config('SESSION_HEALTH_DEFAULT_LATENCY_MS', default=1000, cast=int)  # Sessions without data
+SESSION_HEALTH_TTL = config('SESSION_HEALTH_TTL', default=3600, cast=int)  # Forget metrics of idle sessions
+SESSION_HEALTH_INFLIGHT_TIMEOUT = config('SESSION_HEALTH_INFLIGHT_TIMEOUT', default=120, cast=int)  # Abandoned attempts
+
+# Session circuit breakers (skip a session after repeated session-level send failures)
+SESSION_BREAKER_ENABLED = config('SESSION_BREAKER_ENABLED', default=True, cast=bool)
+SESSION_BREAKER_FAILURE_THRESHOLD = config('SESSION_BREAKER_FAILURE_THRESHOLD', default=5, cast=int)  # Failures to open
+SESSION_BREAKER_WINDOW = config('SESSION_BREAKER_WINDOW', default=60, cast=int)  # Seconds failures are counted over
+SESSION_BREAKER_COOLDOWN = config('SESSION_BREAKER_COOLDOWN', default=30, cast=int)  # Seconds open before a probe
+SESSION_BREAKER_PROBE_TIMEOUT = config('SESSION_BREAKER_PROBE_TIMEOUT', default=90, cast=int)  # Longest send
+
+# Per-session send rate limits (Redis token bucket; WhatsAppSession.send_rate_per_minute/send_burst override)
+SESSION_RATE_LIMIT_ENABLED = config('SESSION_RATE_LIMIT_ENABLED', default=True, cast=bool)
+SESSION_RATE_LIMIT_PER_MINUTE = config('SESSION_RATE_LIMIT_PER_MINUTE', default=30, cast=int)  # Sustained rate
+SESSION_RATE_LIMIT_BURST = config('SESSION_RATE_LIMIT_BURST', default=10, cast=int)  # Back-to-back sends
+
+# Priority lanes: pops per scheduling round for each lane of a session queue
+OUTBOUND_LANE_WEIGHTS = {
+    'high': config('OUTBOUND_LANE_WEIGHT_HIGH', default=10, cast=int),
+    'normal': config('OUTBOUND_LANE_WEIGHT_NORMAL', default=3, cast=int),
+    'low': config('OUTBOUND_LANE_WEIGHT_LOW', default=1, cast=int),
+}
+# Celery queue for high priority sends, consumed by its own worker
+CELERY_PRIORITY_QUEUE = 'messages_priority'
+
+# Scheduled Messages
+SCHEDULED_DISPATCH_BATCH_SIZE = config('SCHEDULED_DISPATCH_BATCH_SIZE', default=500, cast=int)
+SCHEDULED_DISPATCH_MAX_BATCHES = config('SCHEDULED_DISPATCH_MAX_BATCHES', default=20, cast=int)
+
+# Delivery Retries (transient failures only; exhausted messages go to dead letters)
+MESSAGE_RETRY_MAX_ATTEMPTS = config('MESSAGE_RETRY_MAX_ATTEMPTS', default=5, cast=int)
+MESSAGE_RETRY_BASE_DELAY = config('MESSAGE_RETRY_BASE_DELAY', default=30, cast=int)  # seconds
+MESSAGE_RETRY_MAX_DELAY = config('MESSAGE_RETRY_MAX_DELAY', default=1800, cast=int)  # seconds
+MESSAGE_RETRY_BATCH_SIZE = config('MESSAGE_RETRY_BATCH_SIZE', default=500, cast=int)
+
+# Status write-behind buffer used by the send workers. Sends take about a
+# second each, so a worker writes roughly ten statuses per UPDATE by default
+STATUS_WRITE_BUFFER_SIZE = config('STATUS_WRITE_BUFFER_SIZE', default=100, cast=int)
+STATUS_WRITE_BUFFER_MAX_DELAY_MS = config('STATUS_WRITE_BUFFER_MAX_DELAY_MS', default=10000, cast=int)
+
+# Delivery Receipts
+RECEIPT_WEBHOOK_MAX_BATCH = config('RECEIPT_WEBHOOK_MAX_BATCH', default=5000, cast=int)
+RECEIPT_UPDATE_BATCH_SIZE = config('RECEIPT_UPDATE_BATCH_SIZE', default=1000, cast=int)
+# Receipts arriving before their message's buffered status is written are held this long
+RECEIPT_HOLD_SECONDS = config('RECEIPT_HOLD_SECONDS', default=300, cast=int)
+
+# Inbound Messages
+INBOUND_WEBHOOK_MAX_BATCH = config('INBOUND_WEBHOOK_MAX_BATCH', default=5000, cast=int)
+INBOUND_INSERT_BATCH_SIZE = config('INBOUND_INSERT_BATCH_SIZE', default=1000, cast=int)
+
+# Recipient Imports
+RECIPIENT_IMPORT_CHUNK_SIZE = config('RECIPIENT_IMPORT_CHUNK_SIZE', default=1000, cast=int)
+RECIPIENT_IMPORT_MAX_SIZE = config('RECIPIENT_IMPORT_MAX_SIZE', default=50 * 1024 * 1024, cast=int)  # 50MB
+
+# Message Retention (on PostgreSQL whole monthly partitions are dropped, so
+# messages are kept until their month is entirely older than the cutoff)
+MESSAGE_RETENTION_DAYS = config('MESSAGE_RETENTION_DAYS', default=90, cast=int)
+MESSAGE_PARTITION_MONTHS_AHEAD = config('MESSAGE_PARTITION_MONTHS_AHEAD', default=3, cast=int)
+# Unpartitioned tables are purged in id ranges of this size, media deleted by a thread pool
+MESSAGE_PURGE_BATCH_SIZE = config('MESSAGE_PURGE_BATCH_SIZE', default=5000, cast=int)
+MESSAGE_PURGE_MEDIA_WORKERS = config('MESSAGE_PURGE_MEDIA_WORKERS', default=8, cast=int)
+
+# Message History Exports
+MESSAGE_EXPORT_FETCH_SIZE = config('MESSAGE_EXPORT_FETCH_SIZE', default=2000, cast=int)  # rows per cursor fetch
+MESSAGE_EXPORT_RETENTION_DAYS = config('MESSAGE_EXPORT_RETENTION_DAYS', default=7, cast=int)
+
+# Message Search (rank = content weight * ts_rank + recipient weight * trigram similarity)
+MESSAGE_SEARCH_CONTENT_WEIGHT = config('MESSAGE_SEARCH_CONTENT_WEIGHT', default=1.0, cast=float)
+MESSAGE_SEARCH_RECIPIENT_WEIGHT = config('MESSAGE_SEARCH_RECIPIENT_WEIGHT', default=0.5, cast=float)
+MESSAGE_SEARCH_MAX_PAGE_SIZE = config('MESSAGE_SEARCH_MAX_PAGE_SIZE', default=100, cast=int)
+
+# Media Delivery (files are served from signed URLs only; with an nginx
+# internal location set, e.g. /protected-media/, the bytes are sent by nginx)
+MEDIA_URL_TTL = config('MEDIA_URL_TTL', default=900, cast=int)  # seconds
+MEDIA_ACCEL_REDIRECT_PREFIX = config('MEDIA_ACCEL_REDIRECT_PREFIX', default='')
+MEDIA_LEGACY_URLS_ENABLED = config('MEDIA_LEGACY_URLS_ENABLED', default=False, cast=bool)  # Redirect /media/ URLs of pre-content-addressing messages to signed links
+
+# Media Uploads (streamed to a temporary file; size limits in bytes per media type)
+MEDIA_MAX_UPLOAD_SIZES = {
+    'image': config('MEDIA_MAX_IMAGE_SIZE', default=16 * 1024 * 1024, cast=int),
+    'video': config('MEDIA_MAX_VIDEO_SIZE', default=64 * 1024 * 1024, cast=int),
+    'document': config('MEDIA_MAX_DOCUMENT_SIZE', default=100 * 1024 * 1024, cast=int),
+}
+# Largest multipart body RequestValidationMiddleware accepts (1MB for the other form fields)
+MAX_UPLOAD_REQUEST_SIZE = max(*MEDIA_MAX_UPLOAD_SIZES.values(), RECIPIENT_IMPORT_MAX_SIZE) + 1024 * 1024
+
+# Media Optimisation (derivatives computed once per stored file and sent instead of the original)
+MEDIA_IMAGE_MAX_DIMENSION = config('MEDIA_IMAGE_MAX_DIMENSION', default=1600, cast=int)  # pixels
+MEDIA_IMAGE_QUALITY = config('MEDIA_IMAGE_QUALITY', default=80, cast=int)  # JPEG quality
+# Videos larger than MEDIA_VIDEO_TARGET_SIZE are downscaled when an ffmpeg binary is configured
+MEDIA_VIDEO_FFMPEG = config('MEDIA_VIDEO_FFMPEG', default='')
+MEDIA_VIDEO_TARGET_SIZE = config('MEDIA_VIDEO_TARGET_SIZE', default=16 * 1024 * 1024, cast=int)
+MEDIA_VIDEO_MAX_DIMENSION = config('MEDIA_VIDEO_MAX_DIMENSION', default=1280, cast=int)  # pixels
+MEDIA_VIDEO_TIMEOUT = config('MEDIA_VIDEO_TIMEOUT', default=600, cast=int)  # seconds
+
 # API Documentation
 SPECTACULAR_SETTINGS = {
     'TITLE': 'SanaSend',
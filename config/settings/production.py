@@ -226,6 +226,7 @@ MIDDLEWARE = [
     'core.security.SecurityHeadersMiddleware',
     'core.security.BruteForceProtectionMiddleware',
     'core.security.RequestValidationMiddleware',
+    'messages.uploads.MediaUploadMiddleware',
     'core.security.SQLInjectionProtectionMiddleware',
     'core.security.InputSanitizationMiddleware',
     'core.security.IPWhitelistMiddleware',
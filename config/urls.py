@@ -7,6 +7,7 @@ from django.conf import settings
 from django.conf.urls.static import static
 from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
 from core.health import health_check, readiness_check, liveness_check
+from api.v1.media.views import LegacyMediaView
 from dashboard.views import landing_page
 
 urlpatterns = [
@@ -23,6 +24,9 @@ urlpatterns = [
     path('api/docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
     path('api/redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
     
+    # Public media URLs issued before media was made private
+    path(f'{settings.MEDIA_URL.strip("/")}/<path:file_path>', LegacyMediaView.as_view(), name='legacy-media'),
+    
     # Health Check Endpoints
     path('health/', health_check, name='health'),
     path('health/ready/', readiness_check, name='readiness'),
@@ -32,9 +36,9 @@ urlpatterns = [
     path('', landing_page, name='landing'),
 ]
 
-# Serve media files in development
+# Serve static files in development; media is only served from signed URLs
+# (api/v1/media/files/)
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
 
 # Customize admin site
@@ -60,6 +60,36 @@ class RateLimitExceeded(APIException):
     error_code = 'RATE_LIMIT_EXCEEDED'
 
 
+class SessionThrottled(RateLimitExceeded):
+    """Every WhatsApp session is out of send tokens"""
+    default_message = 'All WhatsApp sessions are sending at their rate limit'
+    error_code = 'SESSION_RATE_LIMITED'
+    
+    def __init__(self, message=None, retry_after=1.0):
+        self.retry_after = retry_after
+        super().__init__(message)
+
+
+class QuotaUnavailable(RateLimitExceeded):
+    """The daily message counter could not be reached, so bulk work is refused"""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_message = 'Daily message quota cannot be checked right now. Please try again later.'
+    error_code = 'QUOTA_UNAVAILABLE'
+
+
+class WhatsAppServiceError(APIException):
+    """The Node.js WhatsApp service failed a request or could not be reached"""
+    status_code = status.HTTP_502_BAD_GATEWAY
+    default_message = 'WhatsApp service error'
+    
+    def __init__(self, message=None, error_code=None, http_status=None):
+        # The service's code for the failure (e.g. SESSION_NOT_READY) and the
+        # HTTP status it answered with; None when it gave none
+        self.error_code = error_code
+        self.http_status = http_status
+        super().__init__(message)
+
+
 class InvalidAPIKey(APIException):
     """Invalid API key"""
     status_code = status.HTTP_401_UNAUTHORIZED
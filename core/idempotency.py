@@ -0,0 +1,126 @@
+"""
+Idempotency-Key support for API write endpoints
+"""
+import hashlib
+import json
+import logging
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import UploadedFile
+from rest_framework import status
+from rest_framework.response import Response
+from core.responses import APIResponse
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+MAX_KEY_LENGTH = 255
+
+
+def _cache_key(user_id, raw_key):
+    """Get cache key for a user's idempotency record"""
+    digest = hashlib.sha256(raw_key.encode('utf-8')).hexdigest()
+    return f"idempotency:{user_id}:{digest}"
+
+
+def _request_fingerprint(request):
+    """Hash of endpoint and payload, used to reject key reuse with a different request"""
+    payload = request.data
+    if hasattr(request.data, 'items'):
+        payload = {}
+        for field, value in request.data.items():
+            if isinstance(value, UploadedFile):
+                # Avoid hashing file contents; name and size identify the upload well enough
+                payload[field] = [value.name, value.size]
+            else:
+                payload[field] = value
+
+    body = json.dumps([request.method, request.path, payload], sort_keys=True, default=str)
+    return hashlib.sha256(body.encode('utf-8')).hexdigest()
+
+
+def idempotent(view_method):
+    """
+    Make an APIView handler safe to retry with an Idempotency-Key header
+
+    The first request with a key is processed normally and its response is
+    stored for IDEMPOTENCY_KEY_TTL seconds. Replays return the stored response
+    without calling the handler. Server errors (5xx) are not stored so the
+    client can retry them. The raw key is exposed as request.idempotency_key.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        raw_key = request.META.get(IDEMPOTENCY_HEADER)
+        request.idempotency_key = None
+
+        if not raw_key or not request.user or not request.user.is_authenticated:
+            return view_method(self, request, *args, **kwargs)
+
+        if len(raw_key) > MAX_KEY_LENGTH:
+            return APIResponse.error(
+                f'Idempotency-Key must be at most {MAX_KEY_LENGTH} characters',
+                error_code='INVALID_IDEMPOTENCY_KEY',
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+
+        cache_key = _cache_key(request.user.id, raw_key)
+        fingerprint = _request_fingerprint(request)
+
+        try:
+            claimed = cache.add(
+                cache_key,
+                {'state': 'in_progress', 'fingerprint': fingerprint},
+                settings.IDEMPOTENCY_LOCK_TIMEOUT
+            )
+            record = None if claimed else cache.get(cache_key)
+        except Exception as e:
+            # If cache is unavailable (e.g., Redis not running), log and process normally
+            logger.warning(f'Idempotency cache error: {e}. Processing request without idempotency.')
+            return view_method(self, request, *args, **kwargs)
+
+        if not claimed:
+            if record is None or record['state'] == 'in_progress':
+                return APIResponse.error(
+                    'A request with this Idempotency-Key is still being processed',
+                    error_code='IDEMPOTENCY_KEY_IN_USE',
+                    status_code=status.HTTP_409_CONFLICT
+                )
+
+            if record['fingerprint'] != fingerprint:
+                return APIResponse.error(
+                    'Idempotency-Key was already used for a different request',
+                    error_code='IDEMPOTENCY_KEY_REUSED',
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY
+                )
+
+            logger.info(f'Replaying stored response for idempotency key of user {request.user.id}')
+            response = Response(record['data'], status=record['status_code'])
+            response['Idempotent-Replayed'] = 'true'
+            return response
+
+        request.idempotency_key = raw_key
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            cache.delete(cache_key)
+            raise
+
+        try:
+            # Server errors and rate limits are not final; let the client retry with the key
+            if response.status_code >= 500 or response.status_code == status.HTTP_429_TOO_MANY_REQUESTS:
+                cache.delete(cache_key)
+            else:
+                cache.set(cache_key, {
+                    'state': 'completed',
+                    'fingerprint': fingerprint,
+                    'status_code': response.status_code,
+                    'data': response.data
+                }, settings.IDEMPOTENCY_KEY_TTL)
+        except Exception as e:
+            logger.warning(f'Failed to store idempotency record: {e}')
+
+        return response
+
+    return wrapper
@@ -168,7 +168,7 @@ class UsageTrackingMiddleware(MiddlewareMixin):
             # Track message sending specifically
             if (request.path in ['/api/v1/messages/send-text/', '/api/v1/messages/send-media/'] 
                 and request.method == 'POST' 
-                and response.status_code == 200):
+                and response.status_code in (200, 202)):
                 
                 # Increment daily message count
                 daily_msg_key = f"rate_limit:daily:{user_id}:{now.date()}"
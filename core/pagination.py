@@ -1,7 +1,7 @@
 """
 Custom pagination classes
 """
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from rest_framework.response import Response
 
 
@@ -20,3 +20,33 @@ class StandardResultsSetPagination(PageNumberPagination):
             'results': data
         })
 
+
+
+class MessageCursorPagination(CursorPagination):
+    """
+    Keyset pagination for message history, newest first
+
+    Pages are fetched with WHERE sent_at < cursor ORDER BY sent_at, id
+    against the (user, -sent_at) indexes, with no COUNT(*) or OFFSET, so a
+    page costs the same however long the history is. Only a page whose rows
+    all share one sent_at falls back to an offset, so messages arriving
+    meanwhile could shift it; sent_at has microsecond precision, which makes
+    such runs practically impossible.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-sent_at', '-id')
+    
+    def get_paginated_response(self, data):
+        return Response({
+            'success': True,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data
+        })
+
+
+class InboundCursorPagination(MessageCursorPagination):
+    """Keyset pagination for inbound messages, newest first, on the thread index"""
+    ordering = ('-received_at', '-id')
@@ -116,6 +116,10 @@ class BruteForceProtectionMiddleware(MiddlewareMixin):
 class RequestValidationMiddleware(MiddlewareMixin):
     """Validate and sanitize incoming requests"""
     
+    # Signed media links name stored files, which may contain "--"; their
+    # HMAC signature already rules out tampering with the path
+    SQL_PATTERN_EXEMPT_PATHS = ('/api/v1/media/files/',)
+    
     def process_request(self, request):
         # Only apply to API endpoints
         if not request.path.startswith('/api/'):
@@ -130,10 +134,17 @@ class RequestValidationMiddleware(MiddlewareMixin):
                 'error_code': 'SUSPICIOUS_REQUEST'
             }, status=400)
         
-        # Validate request size
-        if hasattr(request, 'content_length') and request.content_length:
-            max_size = getattr(settings, 'DATA_UPLOAD_MAX_MEMORY_SIZE', 10 * 1024 * 1024)
-            if request.content_length > max_size:
+        # Validate request size; file uploads are streamed to disk and get a larger limit
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            content_length = 0
+        if content_length:
+            if request.content_type == 'multipart/form-data':
+                max_size = settings.MAX_UPLOAD_REQUEST_SIZE
+            else:
+                max_size = getattr(settings, 'DATA_UPLOAD_MAX_MEMORY_SIZE', 10 * 1024 * 1024)
+            if content_length > max_size:
                 return JsonResponse({
                     'success': False,
                     'message': 'Request too large',
@@ -185,8 +196,11 @@ class RequestValidationMiddleware(MiddlewareMixin):
             r'%2e%2e%5c'
         ]
         
-        # Check URL path
         path = request.path.lower()
+        if path.startswith(self.SQL_PATTERN_EXEMPT_PATHS):
+            sql_patterns = []
+        
+        # Check URL path
         for pattern in sql_patterns + xss_patterns + path_patterns:
             if re.search(pattern, path, re.IGNORECASE):
                 return True
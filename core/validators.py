@@ -17,3 +17,21 @@ def validate_phone_number(value):
             'Up to 15 digits allowed.'
         )
 
+
+
+def normalize_phone_number(value):
+    """
+    Canonical E.164 form of a phone number: "+" followed by the digits
+    Separators and an international "00" prefix are dropped, so
+    "+254 700-000001", "254700000001" and "00254700000001" are one recipient.
+    Raises ValidationError if the result is not a valid phone number
+    """
+    digits = re.sub(r'[\s\-().]', '', str(value))
+    if digits.startswith('+'):
+        digits = digits[1:]
+    elif digits.startswith('00'):
+        digits = digits[2:]
+
+    normalized = f'+{digits}'
+    validate_phone_number(normalized)
+    return normalized
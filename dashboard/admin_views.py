@@ -37,7 +37,7 @@ def admin_dashboard(request):
     # Message statistics
     total_messages = Message.objects.count()
     messages_today = Message.objects.filter(sent_at__date=today).count()
-    sent_messages = Message.objects.filter(status='sent').count()
+    sent_messages = Message.objects.filter(status__in=['sent', 'delivered', 'read']).count()
     failed_messages = Message.objects.filter(status='failed').count()
     pending_messages = Message.objects.filter(status='pending').count()
     
@@ -257,6 +257,7 @@ def sessions(request):
                 # Disconnect session
                 from sessions.services import WhatsAppService
                 from sessions.models import WhatsAppSession
+                from sessions.session_pool import SessionPoolService
                 
                 try:
                     session_id = request.POST.get('session_id')
@@ -269,6 +270,7 @@ def sessions(request):
                         session.qr_code = None
                         session.qr_expires_at = None
                         session.save()
+                        SessionPoolService.invalidate_user_sessions_cache(session.user_id)
                         django_messages.success(request, f'"{session.instance_name}" disconnected successfully.')
                     else:
                         django_messages.warning(request, 'Session not found.')
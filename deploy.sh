@@ -175,7 +175,7 @@ User=$USER
 Group=$USER
 WorkingDirectory=$PROJECT_DIR
 Environment=DJANGO_SETTINGS_MODULE=config.settings.production
-ExecStart=$VENV_DIR/bin/celery -A config worker --loglevel=info
+ExecStart=$VENV_DIR/bin/celery -A config worker -Q messages_priority,celery,messages --loglevel=info
 ExecReload=/bin/kill -s HUP \$MAINPID
 Restart=always
 RestartSec=10
@@ -257,11 +257,11 @@ server {
         add_header Cache-Control "public, immutable";
     }
 
-    # Media files
-    location /media/ {
+    # Media files: not public, sent via X-Accel-Redirect from the signed
+    # /api/v1/media/files/ view (MEDIA_ACCEL_REDIRECT_PREFIX=/protected-media/)
+    location /protected-media/ {
+        internal;
         alias $MEDIA_DIR/;
-        expires 1M;
-        add_header Cache-Control "public";
     }
 
     # Django application
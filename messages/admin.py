@@ -1,7 +1,10 @@
 from django.contrib import admin
 from unfold.admin import ModelAdmin
 from unfold.decorators import display
-from .models import Message
+from .models import (
+    Message, MessageBatch, Campaign, ScheduledMessage, MessageTemplate, RecipientImport, MessageExport,
+    DeadLetterMessage, InboundMessage, MediaObject, MediaUpload, MediaDerivative
+)
 
 
 @admin.register(Message)
@@ -9,18 +12,18 @@ class MessageAdmin(ModelAdmin):
     """Message admin with Unfold styling"""
     
     list_display = ['user', 'recipient', 'message_type', 'display_status', 'sent_at']
-    list_filter = ['status', 'message_type', 'sent_at']
+    list_filter = ['status', 'message_type', 'priority', 'sent_at']
     search_fields = ['user__username', 'recipient', 'content']
-    readonly_fields = ['sent_at']
+    readonly_fields = ['sent_at', 'batch', 'template', 'template_variables']
     date_hierarchy = 'sent_at'
     list_filter_submit = True
     
     fieldsets = [
         ('Message Info', {
-            'fields': ['user', 'recipient', 'message_type', 'content']
+            'fields': ['user', 'recipient', 'message_type', 'content', 'template', 'template_variables']
         }),
         ('Status', {
-            'fields': ['status', 'error_message']
+            'fields': ['status', 'error_message', 'batch']
         }),
         ('Timestamp', {
             'fields': ['sent_at']
@@ -31,6 +34,9 @@ class MessageAdmin(ModelAdmin):
     def display_status(self, obj):
         status_map = {
             'sent': ('Sent', 'success'),
+            'delivered': ('Delivered', 'success'),
+            'read': ('Read', 'success'),
+            'retrying': ('Retrying', 'warning'),
             'pending': ('Pending', 'warning'),
             'failed': ('Failed', 'danger'),
         }
@@ -41,3 +47,175 @@ class MessageAdmin(ModelAdmin):
         # Messages should only be created via API
         return False
 
+
+
+@admin.register(MessageBatch)
+class MessageBatchAdmin(ModelAdmin):
+    """Bulk send batch admin with Unfold styling"""
+    
+    list_display = ['id', 'user', 'total_count', 'created_at']
+    search_fields = ['user__username']
+    readonly_fields = ['user', 'total_count', 'created_at']
+    date_hierarchy = 'created_at'
+    
+    def has_add_permission(self, request):
+        # Batches should only be created via API
+        return False
+
+
+@admin.register(Campaign)
+class CampaignAdmin(ModelAdmin):
+    """Campaign admin with Unfold styling"""
+    
+    list_display = ['id', 'name', 'user', 'created_at']
+    search_fields = ['name', 'user__username']
+    readonly_fields = ['created_at']
+    date_hierarchy = 'created_at'
+
+
+@admin.register(ScheduledMessage)
+class ScheduledMessageAdmin(ModelAdmin):
+    """Scheduled message admin with Unfold styling"""
+    
+    list_display = ['user', 'recipient', 'campaign', 'send_at', 'status']
+    list_filter = ['status', 'send_at']
+    search_fields = ['user__username', 'recipient']
+    readonly_fields = ['message', 'created_at']
+    date_hierarchy = 'send_at'
+    list_filter_submit = True
+    
+    def has_add_permission(self, request):
+        # Scheduled messages should only be created via API
+        return False
+
+
+@admin.register(RecipientImport)
+class RecipientImportAdmin(ModelAdmin):
+    """Recipient import admin with Unfold styling"""
+    
+    list_display = ['user', 'campaign', 'file_format', 'status', 'rows_imported', 'rows_invalid', 'created_at']
+    list_filter = ['status', 'file_format', 'created_at']
+    search_fields = ['user__username', 'campaign__name']
+    readonly_fields = [
+        'campaign', 'file_path', 'rows_read', 'rows_imported', 'rows_invalid',
+        'error_message', 'created_at', 'completed_at'
+    ]
+    list_filter_submit = True
+    
+    def has_add_permission(self, request):
+        # Imports should only be created via API
+        return False
+
+
+@admin.register(MessageExport)
+class MessageExportAdmin(ModelAdmin):
+    """Message export admin with Unfold styling"""
+    
+    list_display = ['user', 'file_format', 'compress', 'status', 'rows_exported', 'created_at']
+    list_filter = ['status', 'file_format', 'created_at']
+    search_fields = ['user__username']
+    readonly_fields = [
+        'filters', 'file_path', 'rows_exported', 'error_message', 'created_at', 'completed_at'
+    ]
+    list_filter_submit = True
+    
+    def has_add_permission(self, request):
+        # Exports should only be created via API
+        return False
+
+
+@admin.register(DeadLetterMessage)
+class DeadLetterMessageAdmin(ModelAdmin):
+    """Dead-lettered message admin with Unfold styling"""
+    
+    list_display = ['message', 'user', 'attempt_count', 'last_error', 'created_at', 'replayed_at']
+    list_filter = ['created_at', 'replayed_at']
+    search_fields = ['user__username', 'message__recipient', 'last_error']
+    readonly_fields = ['message', 'user', 'attempt_count', 'last_error', 'created_at', 'replayed_at']
+    date_hierarchy = 'created_at'
+    list_filter_submit = True
+    
+    actions = ['replay_messages']
+    
+    def replay_messages(self, request, queryset):
+        from .services import MessageService
+        replayed = MessageService().replay_dead_letters(queryset)
+        self.message_user(request, f'{replayed} messages queued for replay.')
+    replay_messages.short_description = 'Replay selected messages'
+    
+    def has_add_permission(self, request):
+        # Dead letters are only created by the retry policy
+        return False
+
+
+@admin.register(MessageTemplate)
+class MessageTemplateAdmin(ModelAdmin):
+    """Message template admin with Unfold styling"""
+    
+    list_display = ['name', 'user', 'is_active', 'created_at']
+    list_filter = ['is_active']
+    search_fields = ['name', 'user__username', 'body']
+    readonly_fields = ['body', 'created_at']
+
+
+@admin.register(InboundMessage)
+class InboundMessageAdmin(ModelAdmin):
+    """Inbound message admin with Unfold styling"""
+    
+    list_display = ['user', 'chat_id', 'sender', 'message_type', 'has_media', 'received_at']
+    list_filter = ['message_type', 'has_media', 'received_at']
+    search_fields = ['user__username', 'chat_id', 'sender']
+    readonly_fields = [
+        'user', 'session', 'whatsapp_message_id', 'chat_id', 'sender', 'message_type',
+        'body', 'has_media', 'received_at', 'created_at'
+    ]
+    list_filter_submit = True
+    
+    def has_add_permission(self, request):
+        # Inbound messages are only created by the ingestion webhook
+        return False
+
+
+@admin.register(MediaObject)
+class MediaObjectAdmin(ModelAdmin):
+    """Stored media admin with Unfold styling"""
+    
+    list_display = ['sha256', 'content_type', 'size', 'ref_count', 'created_at', 'last_used_at']
+    list_filter = ['content_type', 'created_at']
+    search_fields = ['sha256', 'file_path']
+    readonly_fields = ['sha256', 'file_path', 'size', 'content_type', 'ref_count', 'created_at', 'last_used_at']
+    list_filter_submit = True
+    
+    def has_add_permission(self, request):
+        # Media objects are only created by media sends
+        return False
+
+
+@admin.register(MediaUpload)
+class MediaUploadAdmin(ModelAdmin):
+    """Media upload admin with Unfold styling"""
+    
+    list_display = ['user', 'file_name', 'media_type', 'media', 'created_at']
+    list_filter = ['media_type', 'created_at']
+    search_fields = ['user__username', 'file_name', 'media__sha256']
+    readonly_fields = ['user', 'media', 'media_type', 'file_name', 'created_at']
+    list_filter_submit = True
+    
+    def has_add_permission(self, request):
+        # Uploads go through the media API so the file is reference counted
+        return False
+
+
+@admin.register(MediaDerivative)
+class MediaDerivativeAdmin(ModelAdmin):
+    """Optimised media admin with Unfold styling"""
+    
+    list_display = ['media', 'preset', 'content_type', 'size', 'created_at']
+    list_filter = ['preset', 'created_at']
+    search_fields = ['media__sha256', 'file_path']
+    readonly_fields = ['media', 'preset', 'file_path', 'size', 'content_type', 'created_at']
+    list_filter_submit = True
+    
+    def has_add_permission(self, request):
+        # Derivatives are only created by the optimise_media task
+        return False
@@ -0,0 +1,151 @@
+"""
+Streaming export of message history
+
+Rows are read with values_list(...).iterator(), which uses a server-side
+cursor on PostgreSQL, and rendered as a generator of byte chunks. The same
+generator backs the streaming HTTP response and the background export job,
+so memory use does not depend on the number of messages. Template sends
+are exported with the text that was sent in content, rendered from the
+template as the send workers do, next to their variable values.
+"""
+import csv
+import json
+import zlib
+from django.conf import settings
+from messages.templating import compile_template
+
+EXPORT_FIELDS = [
+    'id', 'recipient', 'message_type', 'priority', 'status', 'content', 'template__name',
+    'template_variables', 'error_message', 'whatsapp_message_id', 'attempt_count',
+    'sent_at', 'delivered_at', 'read_at',
+]
+
+# Column names in the exported file
+EXPORT_COLUMNS = [field.replace('__', '_') for field in EXPORT_FIELDS]
+
+CONTENT_INDEX = EXPORT_FIELDS.index('content')
+VARIABLES_INDEX = EXPORT_FIELDS.index('template_variables')
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Rendered rows are joined into chunks of about this size before being yielded
+CHUNK_BYTES = 64 * 1024
+
+
+class _LineBuffer:
+    """File-like target for csv.writer that hands back the written line"""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(queryset):
+    """Yield export rows of a message queryset in id order, template sends rendered"""
+    rows = (
+        queryset.order_by('id')
+        .values_list(*EXPORT_FIELDS, 'template__body')
+        .iterator(chunk_size=settings.MESSAGE_EXPORT_FETCH_SIZE)
+    )
+    for row in rows:
+        *row, template_body = row
+        if template_body is not None:
+            row[CONTENT_INDEX] = compile_template(template_body).render(row[VARIABLES_INDEX] or [])
+        yield row
+
+
+def _format_value(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def _format_csv_value(value):
+    # Variable lists as JSON, like the NDJSON export
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return _format_value(value)
+
+
+def render_csv(rows):
+    """Yield CSV lines (header first) as strings"""
+    writer = csv.writer(_LineBuffer())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        yield writer.writerow([_format_csv_value(value) for value in row])
+
+
+def render_ndjson(rows):
+    """Yield one JSON object per line"""
+    for row in rows:
+        yield json.dumps(
+            {column: _format_value(value) for column, value in zip(EXPORT_COLUMNS, row)},
+            ensure_ascii=False
+        ) + '\n'
+
+
+def encode_chunks(lines):
+    """Encode rendered lines to UTF-8 and join them into CHUNK_BYTES chunks"""
+    buffer = []
+    size = 0
+    first = True
+    for line in lines:
+        data = line.encode('utf-8')
+        buffer.append(data)
+        size += len(data)
+        # The first line (the CSV header) is sent on its own so the
+        # client gets a byte before the query has produced any rows
+        if first or size >= CHUNK_BYTES:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+            first = False
+    if buffer:
+        yield b''.join(buffer)
+
+
+def gzip_chunks(chunks):
+    """Compress a stream of byte chunks into a single gzip member"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    first = True
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if first:
+            # Push the gzip header and first chunk out instead of buffering them
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+            first = False
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _count_rows(rows, stats):
+    for row in rows:
+        stats['rows_exported'] += 1
+        yield row
+
+
+def export_messages(queryset, file_format, compress=False, stats=None):
+    """
+    Render a message queryset as a stream of byte chunks
+
+    Args:
+        queryset: Messages to export (ordering is replaced by id order)
+        file_format: 'csv' or 'ndjson'
+        compress: Gzip the stream
+        stats: Optional dict whose rows_exported is incremented per row
+
+    Returns:
+        Generator of bytes
+    """
+    rows = export_rows(queryset)
+    if stats is not None:
+        rows = _count_rows(rows, stats)
+    lines = render_csv(rows) if file_format == 'csv' else render_ndjson(rows)
+    chunks = encode_chunks(lines)
+    return gzip_chunks(chunks) if compress else chunks
+
+
+def export_filename(file_format, compress=False, stem='messages'):
+    """Download file name for an export"""
+    return f'{stem}.{file_format}' + ('.gz' if compress else '')
@@ -0,0 +1,55 @@
+"""
+Message history filters shared by the list, search and export endpoints
+"""
+from datetime import datetime, time, timedelta
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+FILTER_PARAMS = ('status', 'recipient', 'start_date', 'end_date')
+
+
+def parse_bound(value, end_of_day=False):
+    """Parse a date or datetime filter; a date end bound covers the whole day"""
+    if not value:
+        return None
+
+    try:
+        day = parse_date(value)
+        if day:
+            if end_of_day:
+                day += timedelta(days=1)
+            return timezone.make_aware(datetime.combine(day, time.min))
+
+        parsed = parse_datetime(value)
+    except ValueError:
+        return None
+
+    if not parsed:
+        return None
+    return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+
+
+def filter_messages(queryset, params):
+    """
+    Apply the status (comma separated), recipient, start_date and end_date
+    filters from a query-param mapping; unparseable dates are ignored
+    """
+    statuses = params.get('status')
+    recipient = params.get('recipient')
+    start = parse_bound(params.get('start_date'))
+    end = parse_bound(params.get('end_date'), end_of_day=True)
+
+    if statuses:
+        queryset = queryset.filter(status__in=statuses.split(','))
+
+    if recipient:
+        queryset = queryset.filter(recipient=recipient)
+
+    # Plain range on sent_at (not __date) so the (user, -sent_at) index is used
+    if start:
+        queryset = queryset.filter(sent_at__gte=start)
+
+    if end:
+        queryset = queryset.filter(sent_at__lt=end)
+
+    return queryset
@@ -0,0 +1,136 @@
+"""
+Streaming recipient import for campaigns
+
+Files are processed as a generator pipeline (read -> normalise -> chunk ->
+bulk_create) so memory use does not depend on the file size. Recipients are
+normalised to E.164 and duplicates are dropped by the (campaign, recipient)
+unique constraint.
+"""
+import csv
+import io
+import json
+import logging
+from itertools import islice
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from core.validators import normalize_phone_number
+from messages.models import ScheduledMessage
+
+logger = logging.getLogger(__name__)
+
+
+def read_rows(stream, file_format):
+    """Yield one dict per record of a binary CSV or NDJSON stream"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+    if file_format == 'csv':
+        yield from csv.DictReader(text)
+        return
+
+    for line in text:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield record if isinstance(record, dict) else {}
+
+
+def normalize_rows(rows, default_message, stats):
+    """Yield (E.164 recipient, message) pairs for valid rows, counting the rest as invalid"""
+    for row in rows:
+        stats['rows_read'] += 1
+
+        message = row.get('message') or default_message
+
+        try:
+            # One canonical form so "+254..." and "254..." are deduplicated
+            recipient = normalize_phone_number(row.get('recipient') or '')
+        except ValidationError:
+            stats['rows_invalid'] += 1
+            continue
+
+        if not message:
+            stats['rows_invalid'] += 1
+            continue
+
+        yield recipient, message
+
+
+def chunked(iterable, size):
+    """Yield lists of at most size items"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class RecipientImporter:
+    """Import a recipient file into a campaign as scheduled messages"""
+
+    def __init__(self, campaign, send_at, default_message='', chunk_size=None, on_chunk=None):
+        """
+        Args:
+            campaign: Campaign receiving the rows
+            send_at: When the imported messages are due
+            default_message: Text for rows without a message column
+            chunk_size: Rows per bulk_create (defaults to settings.RECIPIENT_IMPORT_CHUNK_SIZE)
+            on_chunk: Optional callback(chunk_length, stats) called before each chunk
+                is written, with the number of recipients new to the campaign;
+                may raise to abort the import
+        """
+        self.campaign = campaign
+        self.send_at = send_at
+        self.default_message = default_message
+        self.chunk_size = chunk_size or settings.RECIPIENT_IMPORT_CHUNK_SIZE
+        self.on_chunk = on_chunk
+        self.stats = {'rows_read': 0, 'rows_imported': 0, 'rows_invalid': 0}
+
+    def run(self, stream, file_format):
+        """Process the whole stream and return the row counters"""
+        campaign = self.campaign
+        existing = ScheduledMessage.objects.filter(campaign=campaign).count()
+
+        entries = normalize_rows(read_rows(stream, file_format), self.default_message, self.stats)
+
+        for chunk in chunked(entries, self.chunk_size):
+            # First occurrence wins, matching the unique constraint across chunks
+            unique = {}
+            for recipient, message in chunk:
+                unique.setdefault(recipient, message)
+
+            # Rows of earlier chunks would be dropped by bulk_create, so they
+            # are left out before the chunk is counted against the quota
+            for recipient in ScheduledMessage.objects.filter(
+                campaign=campaign, recipient__in=list(unique)
+            ).values_list('recipient', flat=True):
+                unique.pop(recipient, None)
+            chunk = list(unique.items())
+            if not chunk:
+                continue
+
+            if self.on_chunk:
+                self.on_chunk(len(chunk), self.stats)
+
+            ScheduledMessage.objects.bulk_create([
+                ScheduledMessage(
+                    user_id=campaign.user_id,
+                    campaign=campaign,
+                    recipient=recipient,
+                    content=message,
+                    send_at=self.send_at
+                )
+                for recipient, message in chunk
+            ], ignore_conflicts=True)
+
+        self.stats['rows_imported'] = ScheduledMessage.objects.filter(campaign=campaign).count() - existing
+
+        logger.info(
+            f'Imported {self.stats["rows_imported"]} recipients into campaign {campaign.id} '
+            f'({self.stats["rows_read"]} read, {self.stats["rows_invalid"]} invalid)'
+        )
+        return self.stats
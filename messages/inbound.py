@@ -0,0 +1,93 @@
+"""
+Batched ingestion of inbound WhatsApp messages
+
+The Node.js service posts received messages in arrays; the webhook only
+queues each array and the ingest_inbound_messages task turns it into rows
+with a single bulk_create, so the write path stays one INSERT per batch
+however many messages arrive.
+"""
+import logging
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.utils import timezone
+from messages.models import InboundMessage
+from sessions.models import WhatsAppSession
+
+logger = logging.getLogger(__name__)
+
+# whatsapp-web.js message types that differ from our outbound names
+MESSAGE_TYPE_ALIASES = {
+    'chat': 'text',
+    'ptt': 'audio',
+}
+
+
+def chat_id_from_whatsapp_id(whatsapp_id):
+    """'254700000000@c.us' -> '+254700000000' (the outbound recipient format); groups stay as-is"""
+    whatsapp_id = str(whatsapp_id or '')
+    if whatsapp_id.endswith('@c.us'):
+        return '+' + whatsapp_id[:-len('@c.us')]
+    return whatsapp_id
+
+
+def build_inbound_messages(events):
+    """
+    Turn raw webhook events into unsaved InboundMessage rows
+
+    Events from unknown sessions or without a message id/sender are skipped.
+
+    Returns:
+        (messages, skipped)
+    """
+    session_ids = {str(event.get('sessionId')) for event in events if isinstance(event, dict)}
+    sessions = {
+        session.session_id: session
+        for session in WhatsAppSession.objects.filter(session_id__in=session_ids).only('id', 'session_id', 'user_id')
+    }
+
+    messages = []
+    skipped = 0
+    for event in events:
+        session = sessions.get(str(event.get('sessionId'))) if isinstance(event, dict) else None
+        if not session or not event.get('messageId') or not event.get('from'):
+            skipped += 1
+            continue
+
+        received_at = None
+        if isinstance(event.get('timestamp'), (int, float)):
+            received_at = datetime.fromtimestamp(event['timestamp'] / 1000, tz=dt_timezone.utc)
+
+        message_type = str(event.get('type') or 'text')
+        messages.append(InboundMessage(
+            user_id=session.user_id,
+            session=session,
+            whatsapp_message_id=str(event['messageId'])[:128],
+            chat_id=chat_id_from_whatsapp_id(event['from'])[:64],
+            sender=chat_id_from_whatsapp_id(event.get('author') or event['from'])[:64],
+            message_type=MESSAGE_TYPE_ALIASES.get(message_type, message_type)[:20],
+            body=str(event.get('body') or ''),
+            has_media=bool(event.get('hasMedia')),
+            received_at=received_at or timezone.now()
+        ))
+
+    return messages, skipped
+
+
+def ingest_inbound_events(events):
+    """
+    Persist a batch of inbound events
+
+    Returns:
+        Dict with received, stored and skipped counts; stored includes rows
+        dropped as duplicates of an earlier delivery
+    """
+    messages, skipped = build_inbound_messages(events)
+
+    if messages:
+        InboundMessage.objects.bulk_create(
+            messages,
+            batch_size=settings.INBOUND_INSERT_BATCH_SIZE,
+            ignore_conflicts=True
+        )
+
+    return {'received': len(events), 'stored': len(messages), 'skipped': skipped}
@@ -0,0 +1,113 @@
+"""
+Django management command to benchmark message history search
+
+Seeds 10M synthetic text messages by default, the scale the search indexes
+are meant for; pass --rows for a quicker run.
+"""
+import random
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Max, Min
+from messages.models import Message
+from messages.search import search_queryset
+from users.models import User
+
+WORDS = [
+    'order', 'invoice', 'delivery', 'payment', 'reminder', 'appointment', 'refund',
+    'confirmed', 'shipped', 'cancelled', 'tomorrow', 'today', 'receipt', 'account',
+    'balance', 'promo', 'discount', 'welcome', 'verification', 'code', 'ticket',
+]
+
+QUERIES = [
+    {'text': 'invoice'},
+    {'text': 'delivery tomorrow'},
+    {'text': '"payment confirmed"'},
+    {'recipient': '2547001'},
+    {'text': 'refund', 'recipient': '25470'},
+]
+
+
+class Command(BaseCommand):
+    help = 'Seed synthetic messages and time the search queries (EXPLAIN ANALYZE on PostgreSQL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10_000_000, help='Synthetic messages to create')
+        parser.add_argument('--user', default='search-benchmark', help='Username owning the synthetic messages')
+        parser.add_argument('--runs', type=int, default=5, help='Timed runs per query')
+        parser.add_argument('--skip-seed', action='store_true', help='Reuse messages from a previous run')
+        parser.add_argument('--cleanup', action='store_true', help='Delete the synthetic messages afterwards')
+
+    def handle(self, *args, **options):
+        user, _ = User.objects.get_or_create(username=options['user'])
+
+        if not options['skip_seed']:
+            self._seed(user, options['rows'])
+
+        total = Message.objects.filter(user=user).count()
+        self.stdout.write(f'Benchmarking search over {total} messages ({connection.vendor})')
+
+        for params in QUERIES:
+            queryset = search_queryset(user, **params)[:20]
+
+            timings = []
+            for _ in range(options['runs']):
+                started = time.perf_counter()
+                results = list(queryset.all())
+                timings.append((time.perf_counter() - started) * 1000)
+
+            timings.sort()
+            self.stdout.write(
+                f'{params}: {len(results)} results, '
+                f'median {timings[len(timings) // 2]:.1f}ms, max {timings[-1]:.1f}ms'
+            )
+
+            if connection.vendor == 'postgresql':
+                self.stdout.write(queryset.explain(analyze=True, buffers=True))
+
+        if options['cleanup']:
+            deleted = self._cleanup(user)
+            self.stdout.write(f'Deleted {deleted} synthetic messages')
+
+        self.stdout.write(self.style.SUCCESS('Benchmark complete'))
+
+    def _cleanup(self, user, batch_size=50000):
+        """
+        Delete the synthetic messages with one DELETE per id range, like
+        messages.retention; they have no related rows, so the ORM's cascade
+        collection would only load millions of ids for nothing
+        """
+        bounds = Message.objects.filter(user=user).aggregate(first=Min('id'), last=Max('id'))
+        if bounds['first'] is None:
+            return 0
+
+        deleted = 0
+        for start in range(bounds['first'], bounds['last'] + 1, batch_size):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {Message._meta.db_table} WHERE user_id = %s AND id BETWEEN %s AND %s',
+                    [user.id, start, start + batch_size - 1]
+                )
+                deleted += cursor.rowcount
+        return deleted
+
+    def _seed(self, user, rows, batch_size=5000):
+        """Insert rows messages with random word content and recipients"""
+        created = 0
+        while created < rows:
+            size = min(batch_size, rows - created)
+            Message.objects.bulk_create([
+                Message(
+                    user=user,
+                    recipient=f'+2547{random.randint(0, 99999999):08d}',
+                    content=' '.join(random.choices(WORDS, k=random.randint(3, 12))),
+                    status='sent'
+                )
+                for _ in range(size)
+            ], batch_size=size)
+            created += size
+            self.stdout.write(f'  {created}/{rows} messages seeded...')
+
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE messages')
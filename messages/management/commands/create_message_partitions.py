@@ -0,0 +1,39 @@
+"""
+Django management command to create monthly messages partitions ahead of time
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from messages import partitions
+
+
+class Command(BaseCommand):
+    help = 'Create messages partitions from the current month through --months-ahead months (PostgreSQL only)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months-ahead', type=int, default=settings.MESSAGE_PARTITION_MONTHS_AHEAD,
+            help='Months after the current one to create partitions for'
+        )
+
+    def handle(self, *args, **options):
+        if not partitions.is_partitioned():
+            raise CommandError('The messages table is not partitioned (PostgreSQL migration 0011 not applied?)')
+
+        if options['months_ahead'] < 0:
+            raise CommandError('--months-ahead must not be negative')
+
+        created = partitions.ensure_partitions(options['months_ahead'])
+        for name in created:
+            self.stdout.write(f'  created {name}')
+
+        stray = partitions.default_partition_rows()
+        if stray:
+            self.stdout.write(self.style.WARNING(
+                f'{stray} messages are in {partitions.DEFAULT_PARTITION}; they will not be dropped by retention'
+            ))
+
+        existing = sorted(partitions.list_partitions())
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {len(created)} partitions; monthly partitions cover '
+            f'{existing[0]:%Y-%m} to {existing[-1]:%Y-%m}'
+        ))
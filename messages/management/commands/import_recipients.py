@@ -0,0 +1,60 @@
+"""
+Django management command to import a recipient file into a campaign
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from messages.models import Campaign
+from messages.services import MessageService
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Stream a CSV/NDJSON recipient file into a new scheduled campaign'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (recipient,message columns) or NDJSON file')
+        parser.add_argument('--user', required=True, help='Username owning the campaign')
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help='Inferred from extension by default')
+        parser.add_argument('--message', default='', help='Text for rows without a message column')
+        parser.add_argument('--send-at', help='ISO 8601 send time (default: now)')
+        parser.add_argument('--campaign-name', default='', help='Campaign name')
+    
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['user']} not found")
+        
+        file_format = options['format'] or ('csv' if options['path'].lower().endswith('.csv') else 'ndjson')
+        
+        send_at = timezone.now()
+        if options['send_at']:
+            send_at = parse_datetime(options['send_at'])
+            if send_at is None:
+                raise CommandError('--send-at must be an ISO 8601 datetime')
+            if timezone.is_naive(send_at):
+                send_at = timezone.make_aware(send_at)
+        
+        try:
+            stream = open(options['path'], 'rb')
+        except OSError as e:
+            raise CommandError(f"Could not read {options['path']}: {e}")
+        
+        campaign = Campaign.objects.create(user=user, name=options['campaign_name'])
+        
+        def report(stats):
+            self.stdout.write(f"  {stats['rows_read']} rows read...")
+        
+        try:
+            with stream:
+                stats = MessageService().import_recipients(
+                    campaign, stream, file_format, send_at, options['message'], on_progress=report
+                )
+        except Exception as e:
+            raise CommandError(f'Import into campaign {campaign.id} stopped: {e}')
+        
+        self.stdout.write(self.style.SUCCESS(
+            f"Campaign {campaign.id}: {stats['rows_imported']} imported, "
+            f"{stats['rows_invalid']} invalid of {stats['rows_read']} rows"
+        ))
@@ -0,0 +1,173 @@
+"""
+Optimised derivatives of stored media
+
+Images are recompressed with Pillow and, when MEDIA_VIDEO_FFMPEG is set,
+videos above MEDIA_VIDEO_TARGET_SIZE are downscaled with ffmpeg, so the
+Node.js service downloads, base64-encodes and uploads less. A derivative is
+stored next to its original as <digest>.<preset><ext> and recorded once per
+(media object, preset); sends use it once it exists and the original until
+then.
+"""
+import io
+import logging
+import os
+import subprocess
+import tempfile
+from django.conf import settings
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from PIL import Image, ImageOps
+from messages.models import MediaDerivative
+
+logger = logging.getLogger(__name__)
+
+IMAGE_PRESET = 'wa-image'
+VIDEO_PRESET = 'wa-video'
+
+
+def preset_for(media):
+    """Processing preset for a stored file, or None if it is sent as-is"""
+    content_type = media.content_type or ''
+    # GIFs may be animated; recompressing would keep only the first frame
+    if content_type.startswith('image/') and content_type != 'image/gif':
+        return IMAGE_PRESET
+    if content_type.startswith('video/'):
+        return VIDEO_PRESET
+    return None
+
+
+def derivative_path(media, preset, extension):
+    """<original path without extension>.<preset><extension>"""
+    return f'{os.path.splitext(media.file_path)[0]}.{preset}{extension}'
+
+
+def optimise_image(media):
+    """
+    Downscale to MEDIA_IMAGE_MAX_DIMENSION and recompress as JPEG
+
+    Returns:
+        (bytes, extension, content_type), or None if the image cannot be processed
+    """
+    try:
+        with default_storage.open(media.file_path, 'rb') as source, Image.open(source) as image:
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((settings.MEDIA_IMAGE_MAX_DIMENSION, settings.MEDIA_IMAGE_MAX_DIMENSION))
+
+            if image.mode not in ('RGB', 'L'):
+                # JPEG has no alpha; flatten onto white as WhatsApp would
+                background = Image.new('RGB', image.size, 'white')
+                background.paste(image, mask=image.convert('RGBA').getchannel('A'))
+                image = background
+
+            buffer = io.BytesIO()
+            image.save(buffer, 'JPEG', quality=settings.MEDIA_IMAGE_QUALITY, optimize=True, progressive=True)
+    except (OSError, Image.DecompressionBombError) as e:
+        logger.warning(f'Cannot optimise image {media.file_path}: {e}')
+        return None
+
+    return buffer.getvalue(), '.jpg', 'image/jpeg'
+
+
+def optimise_video(media, workdir):
+    """
+    Downscale to MEDIA_VIDEO_MAX_DIMENSION as H.264/AAC MP4 with ffmpeg
+
+    Returns:
+        (path in workdir, extension, content_type), or None if disabled, not
+        needed or failed
+    """
+    if not settings.MEDIA_VIDEO_FFMPEG or media.size <= settings.MEDIA_VIDEO_TARGET_SIZE:
+        return None
+
+    source_path = os.path.join(workdir, 'source')
+    output_path = os.path.join(workdir, 'output.mp4')
+    with default_storage.open(media.file_path, 'rb') as source, open(source_path, 'wb') as target:
+        for chunk in source.chunks():
+            target.write(chunk)
+
+    dimension = settings.MEDIA_VIDEO_MAX_DIMENSION
+    command = [
+        settings.MEDIA_VIDEO_FFMPEG, '-y', '-loglevel', 'error', '-i', source_path,
+        # Fit in dimension x dimension, keeping even sides for H.264
+        '-vf', f'scale={dimension}:{dimension}:force_original_aspect_ratio=decrease:force_divisible_by=2',
+        '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '28',
+        '-c:a', 'aac', '-b:a', '96k',
+        '-movflags', '+faststart',
+        output_path,
+    ]
+    try:
+        subprocess.run(command, check=True, capture_output=True, timeout=settings.MEDIA_VIDEO_TIMEOUT)
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.warning(f'Cannot optimise video {media.file_path}: {e}')
+        return None
+
+    return output_path, '.mp4', 'video/mp4'
+
+
+def create_derivative(media):
+    """
+    Compute and store the derivative of a media object for its preset
+
+    When optimising fails or does not make the file smaller, the derivative
+    row points at the original so the work is not repeated.
+
+    Returns:
+        MediaDerivative, or None if the file type has no preset
+    """
+    preset = preset_for(media)
+    if not preset:
+        return None
+
+    existing = MediaDerivative.objects.filter(media=media, preset=preset).first()
+    if existing:
+        return existing
+
+    file_path, size, content_type = media.file_path, media.size, media.content_type
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if preset == IMAGE_PRESET:
+            result = optimise_image(media)
+            if result and len(result[0]) < media.size:
+                data, extension, content_type = result
+                file_path = default_storage.save(derivative_path(media, preset, extension), ContentFile(data))
+                size = len(data)
+        else:
+            result = optimise_video(media, workdir)
+            if result and os.path.getsize(result[0]) < media.size:
+                output_path, extension, content_type = result
+                with open(output_path, 'rb') as output:
+                    file_path = default_storage.save(derivative_path(media, preset, extension), File(output))
+                size = os.path.getsize(output_path)
+
+    try:
+        with transaction.atomic():
+            derivative = MediaDerivative.objects.create(
+                media=media,
+                preset=preset,
+                file_path=file_path,
+                size=size,
+                content_type=content_type or ''
+            )
+    except IntegrityError:
+        # Computed concurrently; keep the stored one
+        if file_path != media.file_path:
+            default_storage.delete(file_path)
+        return MediaDerivative.objects.get(media=media, preset=preset)
+
+    logger.info(f'Media {media.id} {preset}: {media.size} -> {size} bytes')
+    return derivative
+
+
+def delivery_path(file_path, media_type):
+    """
+    Path to send for a stored file: its optimised derivative when there is
+    one; documents are always sent byte for byte
+    """
+    if media_type not in ('image', 'video'):
+        return file_path
+    return (
+        MediaDerivative.objects.filter(media__file_path=file_path)
+        .values_list('file_path', flat=True)
+        .first()
+    ) or file_path
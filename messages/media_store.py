@@ -0,0 +1,228 @@
+"""
+Content-addressed media storage
+
+Uploads are stored once per distinct content under
+whatsapp_media/sha256/<aa>/<bb>/<digest><ext>, with a MediaObject row
+counting the messages that reference the file. Sending the same file again
+only bumps the count; the file is deleted when the last referencing message
+is purged by retention. New images and videos also get an optimised
+derivative in the background (see media_processing), which sends use once it
+exists.
+
+Files are not public: the Node.js service downloads them from short-lived
+signed URLs (signed_media_url), and the serving view hands the bytes to
+nginx or sendfile instead of reading them in Python.
+"""
+import hashlib
+import logging
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+from messages.models import MediaDerivative, MediaObject
+
+logger = logging.getLogger(__name__)
+
+MEDIA_PREFIX = 'whatsapp_media/sha256'
+
+# Paths per IN (...) query when releasing references
+RELEASE_CHUNK_SIZE = 1000
+
+
+def hash_file(file):
+    """sha256 hex digest of an uploaded file, read chunk by chunk"""
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def media_path(digest, filename):
+    """Sharded storage path; two levels of 256 directories keep listings small"""
+    extension = os.path.splitext(filename or '')[1].lower()[:10]
+    return f'{MEDIA_PREFIX}/{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+
+def _acquire(digest):
+    """Add a reference to an existing object; None if there is none"""
+    updated = MediaObject.objects.filter(sha256=digest).update(
+        ref_count=F('ref_count') + 1,
+        last_used_at=timezone.now()
+    )
+    return MediaObject.objects.get(sha256=digest) if updated else None
+
+
+def acquire_media(media, count=1):
+    """
+    Take count more references on a stored object, one per message that
+    will send it; the caller must already hold one (e.g. a MediaUpload)
+    """
+    MediaObject.objects.filter(id=media.id).update(
+        ref_count=F('ref_count') + count,
+        last_used_at=timezone.now()
+    )
+    return media
+
+
+def store_media(file):
+    """
+    Store an uploaded file (once per content) and take a reference to it
+
+    Returns:
+        MediaObject whose file_path is the storage path to send
+    """
+    digest = getattr(file, 'sha256', None) or hash_file(file)
+
+    media = _acquire(digest)
+    if media:
+        return media
+
+    path = media_path(digest, file.name)
+    # The file can outlive its row (e.g. a failed delete); it holds the same bytes
+    if not default_storage.exists(path):
+        file.seek(0)
+        saved = default_storage.save(path, file)
+        if saved != path:
+            # Written concurrently by another upload of the same content
+            default_storage.delete(saved)
+
+    try:
+        with transaction.atomic():
+            media = MediaObject.objects.create(
+                sha256=digest,
+                file_path=path,
+                size=file.size,
+                content_type=getattr(file, 'content_type', '') or '',
+                ref_count=1,
+                last_used_at=timezone.now()
+            )
+    except IntegrityError:
+        # Another upload of the same content created the row first
+        return _acquire(digest)
+
+    from messages.media_processing import preset_for
+    from messages.tasks import optimise_media
+    if preset_for(media):
+        transaction.on_commit(lambda: optimise_media.delay(media.id))
+    return media
+
+
+def delete_media_files(paths, workers=None):
+    """
+    Delete media files from storage in parallel
+
+    Storage deletes are I/O bound (a syscall, or an HTTP request on object
+    storage), so a small thread pool removes a batch far faster than a loop.
+
+    Returns:
+        Number of files that could not be deleted
+    """
+    def delete(path):
+        try:
+            default_storage.delete(path)
+            return True
+        except Exception as e:
+            logger.error(f'Failed to delete media file {path}: {e}')
+            return False
+
+    if not paths:
+        return 0
+
+    with ThreadPoolExecutor(max_workers=workers or settings.MESSAGE_PURGE_MEDIA_WORKERS) as pool:
+        return sum(1 for deleted in pool.map(delete, paths) if not deleted)
+
+
+def release_media_references(paths):
+    """
+    Drop one reference per path (paths of deleted messages) and delete the
+    MediaObject rows no message references any more, in the caller's
+    transaction
+
+    Paths from before content addressing belong to a single message and are
+    returned as they are.
+
+    Returns:
+        Storage paths to delete once the transaction has committed
+    """
+    counts = Counter(path for path in paths if path)
+    unused_paths = [path for path in counts if not path.startswith(MEDIA_PREFIX + '/')]
+    shared = [path for path in counts if path.startswith(MEDIA_PREFIX + '/')]
+
+    for start in range(0, len(shared), RELEASE_CHUNK_SIZE):
+        chunk = shared[start:start + RELEASE_CHUNK_SIZE]
+
+        for path in chunk:
+            MediaObject.objects.filter(file_path=path).update(ref_count=F('ref_count') - counts[path])
+
+        # The row lock makes a concurrent store wait, then find no row and write the file again
+        unused = list(
+            MediaObject.objects.select_for_update()
+            .filter(file_path__in=chunk, ref_count__lte=0)
+            .values_list('id', 'file_path')
+        )
+        if unused:
+            unused_ids = [media_id for media_id, _ in unused]
+            # Derivatives that are not the original itself go with it
+            unused_paths += [path for _, path in unused] + list(
+                MediaDerivative.objects.filter(media_id__in=unused_ids)
+                .exclude(file_path=F('media__file_path'))
+                .values_list('file_path', flat=True)
+            )
+            MediaObject.objects.filter(id__in=unused_ids).delete()
+
+    return unused_paths
+
+
+def release_media(paths):
+    """
+    Drop one reference per path (paths of deleted messages) and delete files
+    no message references any more
+
+    Callers deleting the messages in a transaction should use
+    release_media_references in it instead, so the counts cannot go stale.
+
+    Returns:
+        Number of files that could not be deleted
+    """
+    with transaction.atomic():
+        unused_paths = release_media_references(paths)
+    return delete_media_files(unused_paths)
+
+
+def _url_signature(file_path, expires):
+    # Hex rather than base64, which can contain sequences the request filters reject (e.g. "--")
+    return salted_hmac('messages.media_store', f'{file_path}:{expires}', algorithm='sha256').hexdigest()
+
+
+def signed_media_url(file_path, ttl=None):
+    """
+    Absolute URL to download a stored file, valid for ttl seconds
+    (MEDIA_URL_TTL by default)
+
+    The signature is in the query string, so the path part stays the same
+    for a file and can be used as a cache key.
+    """
+    expires = int(time.time()) + (ttl or settings.MEDIA_URL_TTL)
+    query = urlencode({'expires': expires, 'signature': _url_signature(file_path, expires)})
+    path = reverse('api_v1:media-file', kwargs={'file_path': file_path})
+    return f'{settings.DJANGO_BASE_URL.rstrip("/")}{path}?{query}'
+
+
+def verify_media_signature(file_path, expires, signature):
+    """True if signature was issued for file_path and has not expired"""
+    try:
+        expires = int(expires)
+    except (TypeError, ValueError):
+        return False
+
+    if expires < time.time():
+        return False
+    return constant_time_compare(signature or '', _url_signature(file_path, expires))
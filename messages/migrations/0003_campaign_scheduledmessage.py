@@ -0,0 +1,64 @@
+# Generated by Django 5.0.14 on 2026-10-17 02:59
+
+import core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp_messages', '0002_messagebatch'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Campaign',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(blank=True, max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='campaigns', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Campaign',
+                'verbose_name_plural': 'Campaigns',
+                'db_table': 'campaigns',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ScheduledMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipient', models.CharField(max_length=20, validators=[core.validators.validate_phone_number])),
+                ('content', models.TextField()),
+                ('send_at', models.DateTimeField()),
+                ('status', models.CharField(choices=[('scheduled', 'Scheduled'), ('dispatched', 'Dispatched'), ('cancelled', 'Cancelled')], default='scheduled', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('campaign', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='scheduled_messages', to='whatsapp_messages.campaign')),
+                ('message', models.OneToOneField(blank=True, help_text='Message created when this entry was dispatched', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='scheduled_from', to='whatsapp_messages.message')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scheduled_messages', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Scheduled Message',
+                'verbose_name_plural': 'Scheduled Messages',
+                'db_table': 'scheduled_messages',
+                'ordering': ['send_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='campaign',
+            index=models.Index(fields=['user', '-created_at'], name='campaigns_user_id_c5fbd0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='scheduledmessage',
+            index=models.Index(condition=models.Q(('status', 'scheduled')), fields=['send_at'], name='sched_msg_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='scheduledmessage',
+            index=models.Index(fields=['campaign', 'status'], name='scheduled_m_campaig_f4b0d5_idx'),
+        ),
+    ]
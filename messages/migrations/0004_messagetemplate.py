@@ -0,0 +1,52 @@
+# Generated by Django 5.0.14 on 2026-10-17 03:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp_messages', '0003_campaign_scheduledmessage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='template_variables',
+            field=models.JSONField(blank=True, help_text='Variable values ordered like the template variables', null=True),
+        ),
+        migrations.AlterField(
+            model_name='message',
+            name='content',
+            field=models.TextField(blank=True, help_text='Text content or file path for media; empty for template messages'),
+        ),
+        migrations.CreateModel(
+            name='MessageTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('body', models.TextField(help_text='Text with {{variable}} placeholders; cannot be changed once created')),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='message_templates', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Message Template',
+                'verbose_name_plural': 'Message Templates',
+                'db_table': 'message_templates',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='template',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='messages', to='whatsapp_messages.messagetemplate'),
+        ),
+        migrations.AddIndex(
+            model_name='messagetemplate',
+            index=models.Index(fields=['user', 'is_active'], name='message_tem_user_id_76550a_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.14 on 2026-10-17 03:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp_messages', '0006_message_receipts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='priority',
+            field=models.CharField(choices=[('high', 'High'), ('normal', 'Normal'), ('low', 'Low')], default='normal', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='scheduledmessage',
+            name='priority',
+            field=models.CharField(choices=[('high', 'High'), ('normal', 'Normal'), ('low', 'Low')], default='low', max_length=10),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.14 on 2026-10-17 03:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp_messages', '0008_message_retries'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['user', 'status', '-sent_at'], name='msg_user_status_sent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['user', 'recipient', '-sent_at'], name='msg_user_recipient_sent_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+"""
+PostgreSQL-only search indexes for message history
+
+The full-text index expression must stay identical to MessageSearchVector
+in messages/search.py, otherwise the planner will not use it. Other
+databases (SQLite in development) skip these indexes and search with LIKE.
+"""
+from django.db import migrations
+
+FORWARD_SQL = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS msg_content_fts_idx "
+    "ON messages USING GIN (to_tsvector('simple'::regconfig, content))",
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS msg_recipient_trgm_idx '
+    'ON messages USING GIN (recipient gin_trgm_ops)',
+]
+
+REVERSE_SQL = [
+    'DROP INDEX CONCURRENTLY IF EXISTS msg_recipient_trgm_idx',
+    'DROP INDEX CONCURRENTLY IF EXISTS msg_content_fts_idx',
+]
+
+
+def run_on_postgres(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('whatsapp_messages', '0009_message_list_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_postgres(FORWARD_SQL), run_on_postgres(REVERSE_SQL)),
+    ]
@@ -0,0 +1,117 @@
+"""
+Partition the messages table by sent_at month (PostgreSQL only)
+
+The table is rebuilt as a RANGE partitioned table with one partition per
+month of existing data, the next few months, and a default partition. The
+primary key becomes (id, sent_at) because a partitioned table can only
+enforce uniqueness on keys that include the partition column; ids continue
+from the current maximum. Foreign keys pointing at messages are dropped
+(db_constraint=False) for the same reason. Indexes, check constraints and
+outgoing foreign keys are carried over unchanged.
+
+The rebuild copies every row inside one transaction and holds an exclusive
+lock on messages while it runs: every read and write of messages waits for
+the whole INSERT ... SELECT of the table plus the rebuild of each of its
+indexes, so the lock window grows linearly with the table size. Time the
+migration on a restored copy of production first, and stop the API and
+workers for that window on large tables. Other databases (SQLite in
+development) are left untouched.
+"""
+from datetime import datetime, timezone
+import django.db.models.deletion
+from django.db import migrations, models
+
+MONTHS_AHEAD = 3
+
+
+def month_starts(first, months_ahead):
+    """First instants of every month from first's month through months_ahead past now"""
+    now = datetime.now(timezone.utc)
+    index = first.year * 12 + first.month - 1
+    last = now.year * 12 + now.month - 1 + months_ahead
+    while index <= last:
+        yield datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+        index += 1
+
+
+def rebuild_messages(schema_editor, partitioned):
+    execute = schema_editor.execute
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexname, indexdef FROM pg_indexes "
+            "WHERE schemaname = current_schema() AND tablename = 'messages' AND indexname <> 'messages_pkey'"
+        )
+        indexes = [definition for _, definition in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = 'messages'::regclass AND contype = 'f'"
+        )
+        foreign_keys = cursor.fetchall()
+
+    execute('ALTER TABLE messages RENAME TO messages_old')
+
+    if partitioned:
+        execute(
+            'CREATE TABLE messages (LIKE messages_old INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            'PARTITION BY RANGE (sent_at)'
+        )
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute('SELECT COALESCE(MIN(sent_at), NOW()) FROM messages_old')
+            first = cursor.fetchone()[0]
+
+        # One extra month start so the last partition has an upper bound
+        months = list(month_starts(first, MONTHS_AHEAD + 1))
+        for start, end in zip(months, months[1:]):
+            execute(
+                f'CREATE TABLE messages_p{start:%Y_%m} PARTITION OF messages '
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            )
+        execute('CREATE TABLE messages_default PARTITION OF messages DEFAULT')
+    else:
+        execute('CREATE TABLE messages (LIKE messages_old INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+
+    execute('INSERT INTO messages SELECT * FROM messages_old')
+    # Drops the id sequence too, as it is owned by the old column
+    execute('DROP TABLE messages_old')
+
+    execute('CREATE SEQUENCE messages_id_seq OWNED BY messages.id')
+    execute("SELECT setval('messages_id_seq', COALESCE(MAX(id), 0) + 1, false) FROM messages")
+    execute("ALTER TABLE messages ALTER COLUMN id SET DEFAULT nextval('messages_id_seq')")
+
+    execute(f"ALTER TABLE messages ADD PRIMARY KEY ({'id, sent_at' if partitioned else 'id'})")
+    for definition in indexes:
+        execute(definition)
+    for name, definition in foreign_keys:
+        execute(f'ALTER TABLE messages ADD CONSTRAINT {name} {definition}')
+
+
+def partition_messages(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        rebuild_messages(schema_editor, partitioned=True)
+
+
+def unpartition_messages(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        rebuild_messages(schema_editor, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp_messages', '0010_message_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='deadlettermessage',
+            name='message',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='dead_letter', to='whatsapp_messages.message'),
+        ),
+        migrations.AlterField(
+            model_name='scheduledmessage',
+            name='message',
+            field=models.OneToOneField(blank=True, db_constraint=False, help_text='Message created when this entry was dispatched', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='scheduled_from', to='whatsapp_messages.message'),
+        ),
+        migrations.RunPython(partition_messages, unpartition_messages),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.0.14 on 2026-10-17 03:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp_messages', '0012_messageexport'),
+        ('whatsapp_sessions', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InboundMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('whatsapp_message_id', models.CharField(max_length=128)),
+                ('chat_id', models.CharField(help_text='Conversation: +<number> for direct chats, the WhatsApp id for groups', max_length=64)),
+                ('sender', models.CharField(help_text='Author (differs from chat_id in groups)', max_length=64)),
+                ('message_type', models.CharField(default='text', max_length=20)),
+                ('body', models.TextField(blank=True)),
+                ('has_media', models.BooleanField(default=False)),
+                ('received_at', models.DateTimeField(help_text='Timestamp reported by WhatsApp')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('session', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='inbound_messages', to='whatsapp_sessions.whatsappsession')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inbound_messages', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Inbound Message',
+                'verbose_name_plural': 'Inbound Messages',
+                'db_table': 'inbound_messages',
+                'ordering': ['-received_at'],
+                'indexes': [models.Index(fields=['user', 'chat_id', '-received_at'], name='inbound_msg_thread_idx'), models.Index(fields=['user', '-received_at'], name='inbound_msg_user_recv_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='inboundmessage',
+            constraint=models.UniqueConstraint(fields=('session', 'whatsapp_message_id'), name='inbound_msg_session_wamid_uniq'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.14 on 2026-10-17 03:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp_messages', '0013_inboundmessage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaObject',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('file_path', models.CharField(help_text='Content-addressed storage path', max_length=255, unique=True)),
+                ('size', models.BigIntegerField(help_text='Size in bytes')),
+                ('content_type', models.CharField(blank=True, max_length=100)),
+                ('ref_count', models.IntegerField(default=0, help_text='Messages referencing this file')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Media Object',
+                'verbose_name_plural': 'Media Objects',
+                'db_table': 'media_objects',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
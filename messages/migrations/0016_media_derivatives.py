@@ -0,0 +1,36 @@
+# Generated by Django 5.0.14 on 2026-10-17 03:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp_messages', '0015_media_uploads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaDerivative',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('preset', models.CharField(max_length=30)),
+                ('file_path', models.CharField(help_text='Derivative path; the original path when optimising did not make the file smaller', max_length=255)),
+                ('size', models.BigIntegerField(help_text='Size in bytes')),
+                ('content_type', models.CharField(blank=True, max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('media', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='derivatives', to='whatsapp_messages.mediaobject')),
+            ],
+            options={
+                'verbose_name': 'Media Derivative',
+                'verbose_name_plural': 'Media Derivatives',
+                'db_table': 'media_derivatives',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='mediaderivative',
+            constraint=models.UniqueConstraint(fields=('media', 'preset'), name='media_derivative_preset_uniq'),
+        ),
+    ]
@@ -1,6 +1,68 @@
 from django.db import models
 from django.conf import settings
 from core.validators import validate_phone_number
+from messages.templating import compile_template
+
+
+class MessageTemplate(models.Model):
+    """Reusable message body with {{variable}} placeholders"""
+    
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='message_templates'
+    )
+    name = models.CharField(max_length=100)
+    body = models.TextField(
+        help_text='Text with {{variable}} placeholders; cannot be changed once created'
+    )
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'message_templates'
+        verbose_name = 'Message Template'
+        verbose_name_plural = 'Message Templates'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'is_active']),
+        ]
+    
+    @property
+    def variables(self):
+        """Variable names in the order template rows must supply them"""
+        return list(compile_template(self.body).variables)
+    
+    def render(self, values):
+        """Render the body with values ordered like self.variables"""
+        return compile_template(self.body).render(values)
+    
+    def __str__(self):
+        return f'{self.user.username} - {self.name}'
+
+
+class MessageBatch(models.Model):
+    """Bulk send job grouping the messages created by one request"""
+    
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='message_batches'
+    )
+    total_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'message_batches'
+        verbose_name = 'Message Batch'
+        verbose_name_plural = 'Message Batches'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+        ]
+    
+    def __str__(self):
+        return f'{self.user.username} - batch {self.id} ({self.total_count} messages)'
 
 
 class Message(models.Model):
@@ -13,12 +75,25 @@ class Message(models.Model):
         ('video', 'Video'),
     ]
     
+    # Delivery lanes: high for OTP/transactional, low for bulk and campaigns
+    PRIORITY_CHOICES = [
+        ('high', 'High'),
+        ('normal', 'Normal'),
+        ('low', 'Low'),
+    ]
+    
     STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('sent', 'Sent'),
+        ('delivered', 'Delivered'),
+        ('read', 'Read'),
+        ('retrying', 'Retrying'),
         ('failed', 'Failed'),
     ]
     
+    # Receipts only move a message forward; a late "delivered" never undoes "read"
+    STATUS_PROGRESSION = ['pending', 'sent', 'delivered', 'read']
+    
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -33,8 +108,27 @@ class Message(models.Model):
         choices=MESSAGE_TYPE_CHOICES,
         default='text'
     )
+    priority = models.CharField(
+        max_length=10,
+        choices=PRIORITY_CHOICES,
+        default='normal'
+    )
     content = models.TextField(
-        help_text='Text content or file path for media'
+        blank=True,
+        help_text='Text content or file path for media; empty for template messages'
+    )
+    caption = models.TextField(blank=True, help_text='Caption sent with media')
+    template = models.ForeignKey(
+        MessageTemplate,
+        on_delete=models.PROTECT,
+        related_name='messages',
+        blank=True,
+        null=True
+    )
+    template_variables = models.JSONField(
+        blank=True,
+        null=True,
+        help_text='Variable values ordered like the template variables'
     )
     status = models.CharField(
         max_length=10,
@@ -42,6 +136,23 @@ class Message(models.Model):
         default='pending'
     )
     error_message = models.TextField(blank=True, null=True)
+    whatsapp_message_id = models.CharField(
+        max_length=128,
+        blank=True,
+        null=True,
+        help_text='Message id returned by the WhatsApp service, used to match receipts'
+    )
+    delivered_at = models.DateTimeField(blank=True, null=True)
+    read_at = models.DateTimeField(blank=True, null=True)
+    attempt_count = models.PositiveIntegerField(default=0)
+    next_retry_at = models.DateTimeField(blank=True, null=True)
+    batch = models.ForeignKey(
+        MessageBatch,
+        on_delete=models.SET_NULL,
+        related_name='messages',
+        blank=True,
+        null=True
+    )
     sent_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -52,8 +163,380 @@ class Message(models.Model):
         indexes = [
             models.Index(fields=['user', '-sent_at']),
             models.Index(fields=['status']),
+            # Message list filters, keeping the newest-first cursor order
+            models.Index(fields=['user', 'status', '-sent_at'], name='msg_user_status_sent_idx'),
+            models.Index(fields=['user', 'recipient', '-sent_at'], name='msg_user_recipient_sent_idx'),
+            models.Index(fields=['whatsapp_message_id']),
+            # Only messages waiting for a retry are scanned by the retry dispatcher
+            models.Index(
+                fields=['next_retry_at'],
+                condition=models.Q(status='retrying'),
+                name='msg_retry_due_idx'
+            ),
         ]
     
+    @property
+    def text(self):
+        """Text to send: the stored content or the rendered template"""
+        if self.template_id:
+            return self.template.render(self.template_variables or [])
+        return self.content
+    
     def __str__(self):
         return f'{self.user.username} -> {self.recipient} ({self.status})'
 
+
+
+class Campaign(models.Model):
+    """Named group of messages scheduled for later delivery"""
+    
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='campaigns'
+    )
+    name = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'campaigns'
+        verbose_name = 'Campaign'
+        verbose_name_plural = 'Campaigns'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+        ]
+    
+    def __str__(self):
+        return f'{self.user.username} - {self.name or f"Campaign {self.id}"}'
+
+
+class ScheduledMessage(models.Model):
+    """Message waiting for its send_at time before being handed to the send workers"""
+    
+    STATUS_CHOICES = [
+        ('scheduled', 'Scheduled'),
+        ('dispatched', 'Dispatched'),
+        ('cancelled', 'Cancelled'),
+    ]
+    
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='scheduled_messages'
+    )
+    campaign = models.ForeignKey(
+        Campaign,
+        on_delete=models.CASCADE,
+        related_name='scheduled_messages',
+        blank=True,
+        null=True
+    )
+    recipient = models.CharField(
+        max_length=20,
+        validators=[validate_phone_number]
+    )
+    content = models.TextField()
+    priority = models.CharField(
+        max_length=10,
+        choices=Message.PRIORITY_CHOICES,
+        default='low'
+    )
+    send_at = models.DateTimeField()
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='scheduled'
+    )
+    # No database constraint: messages is partitioned on PostgreSQL and its
+    # primary key includes sent_at, so id alone cannot be referenced
+    message = models.OneToOneField(
+        Message,
+        on_delete=models.SET_NULL,
+        db_constraint=False,
+        related_name='scheduled_from',
+        blank=True,
+        null=True,
+        help_text='Message created when this entry was dispatched'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'scheduled_messages'
+        verbose_name = 'Scheduled Message'
+        verbose_name_plural = 'Scheduled Messages'
+        ordering = ['send_at']
+        indexes = [
+            # Only pending rows are scanned by the dispatcher
+            models.Index(
+                fields=['send_at'],
+                condition=models.Q(status='scheduled'),
+                name='sched_msg_due_idx'
+            ),
+            models.Index(fields=['campaign', 'status']),
+        ]
+        constraints = [
+            # Lets imports dedupe recipients in the database instead of in memory
+            models.UniqueConstraint(fields=['campaign', 'recipient'], name='sched_msg_campaign_recipient_uniq'),
+        ]
+    
+    def __str__(self):
+        return f'{self.user.username} -> {self.recipient} at {self.send_at} ({self.status})'
+
+
+class RecipientImport(models.Model):
+    """Recipient file imported into a campaign by a background job"""
+    
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('ndjson', 'NDJSON'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='recipient_imports'
+    )
+    campaign = models.ForeignKey(
+        Campaign,
+        on_delete=models.CASCADE,
+        related_name='imports'
+    )
+    file_path = models.CharField(max_length=255, help_text='Storage path of the uploaded file')
+    file_format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    default_message = models.TextField(blank=True)
+    send_at = models.DateTimeField()
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pending'
+    )
+    rows_read = models.IntegerField(default=0)
+    rows_imported = models.IntegerField(default=0)
+    rows_invalid = models.IntegerField(default=0)
+    error_message = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        db_table = 'recipient_imports'
+        verbose_name = 'Recipient Import'
+        verbose_name_plural = 'Recipient Imports'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+        ]
+    
+    def __str__(self):
+        return f'{self.user.username} - import {self.id} ({self.status})'
+
+
+class MessageExport(models.Model):
+    """Message history export written to storage by a background job"""
+    
+    FORMAT_CHOICES = RecipientImport.FORMAT_CHOICES
+    STATUS_CHOICES = RecipientImport.STATUS_CHOICES
+    
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='message_exports'
+    )
+    file_format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    compress = models.BooleanField(default=False, help_text='Gzip the export file')
+    filters = models.JSONField(default=dict, blank=True, help_text='status, recipient, start_date, end_date')
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pending'
+    )
+    file_path = models.CharField(max_length=255, blank=True, help_text='Storage path of the export file')
+    rows_exported = models.IntegerField(default=0)
+    error_message = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        db_table = 'message_exports'
+        verbose_name = 'Message Export'
+        verbose_name_plural = 'Message Exports'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+        ]
+    
+    def __str__(self):
+        return f'{self.user.username} - export {self.id} ({self.status})'
+
+
+class DeadLetterMessage(models.Model):
+    """Message that still failed after every retry, kept for inspection and replay"""
+    
+    # No database constraint, see ScheduledMessage.message
+    message = models.OneToOneField(
+        Message,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        related_name='dead_letter'
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='dead_letter_messages'
+    )
+    attempt_count = models.PositiveIntegerField()
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    replayed_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        db_table = 'dead_letter_messages'
+        verbose_name = 'Dead Letter Message'
+        verbose_name_plural = 'Dead Letter Messages'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+        ]
+    
+    def __str__(self):
+        return f'{self.user.username} - message {self.message_id} ({self.attempt_count} attempts)'
+
+
+class InboundMessage(models.Model):
+    """Message received on one of the user's WhatsApp sessions"""
+    
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='inbound_messages'
+    )
+    session = models.ForeignKey(
+        'whatsapp_sessions.WhatsAppSession',
+        on_delete=models.SET_NULL,
+        related_name='inbound_messages',
+        blank=True,
+        null=True
+    )
+    whatsapp_message_id = models.CharField(max_length=128)
+    chat_id = models.CharField(
+        max_length=64,
+        help_text='Conversation: +<number> for direct chats, the WhatsApp id for groups'
+    )
+    sender = models.CharField(max_length=64, help_text='Author (differs from chat_id in groups)')
+    message_type = models.CharField(max_length=20, default='text')
+    body = models.TextField(blank=True)
+    has_media = models.BooleanField(default=False)
+    received_at = models.DateTimeField(help_text='Timestamp reported by WhatsApp')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'inbound_messages'
+        verbose_name = 'Inbound Message'
+        verbose_name_plural = 'Inbound Messages'
+        ordering = ['-received_at']
+        constraints = [
+            # Redelivered webhook batches are dropped by bulk_create(ignore_conflicts=True)
+            models.UniqueConstraint(
+                fields=['session', 'whatsapp_message_id'],
+                name='inbound_msg_session_wamid_uniq'
+            ),
+        ]
+        indexes = [
+            # A conversation thread, newest first
+            models.Index(fields=['user', 'chat_id', '-received_at'], name='inbound_msg_thread_idx'),
+            models.Index(fields=['user', '-received_at'], name='inbound_msg_user_recv_idx'),
+        ]
+    
+    def __str__(self):
+        return f'{self.chat_id} -> {self.user.username} ({self.message_type})'
+
+
+class MediaObject(models.Model):
+    """Media file stored once per content (sha256) and shared by the messages that send it"""
+    
+    sha256 = models.CharField(max_length=64, unique=True)
+    file_path = models.CharField(max_length=255, unique=True, help_text='Content-addressed storage path')
+    size = models.BigIntegerField(help_text='Size in bytes')
+    content_type = models.CharField(max_length=100, blank=True)
+    ref_count = models.IntegerField(default=0, help_text='Messages referencing this file')
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        db_table = 'media_objects'
+        verbose_name = 'Media Object'
+        verbose_name_plural = 'Media Objects'
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f'{self.sha256[:12]} ({self.ref_count} refs)'
+
+
+class MediaUpload(models.Model):
+    """File a user uploaded once and sends by id, without uploading it again"""
+    
+    MEDIA_TYPE_CHOICES = [choice for choice in Message.MESSAGE_TYPE_CHOICES if choice[0] != 'text']
+    
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='media_uploads'
+    )
+    # Holds one reference on the object until the upload is deleted
+    media = models.ForeignKey(
+        MediaObject,
+        on_delete=models.PROTECT,
+        related_name='uploads'
+    )
+    media_type = models.CharField(max_length=10, choices=MEDIA_TYPE_CHOICES)
+    file_name = models.CharField(max_length=255, help_text='Name of the uploaded file')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'media_uploads'
+        verbose_name = 'Media Upload'
+        verbose_name_plural = 'Media Uploads'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+        ]
+    
+    def __str__(self):
+        return f'{self.user.username} - {self.file_name} ({self.media_type})'
+
+
+class MediaDerivative(models.Model):
+    """Optimised version of a MediaObject for one processing preset, computed once"""
+    
+    media = models.ForeignKey(
+        MediaObject,
+        on_delete=models.CASCADE,
+        related_name='derivatives'
+    )
+    preset = models.CharField(max_length=30)
+    file_path = models.CharField(
+        max_length=255,
+        help_text='Derivative path; the original path when optimising did not make the file smaller'
+    )
+    size = models.BigIntegerField(help_text='Size in bytes')
+    content_type = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'media_derivatives'
+        verbose_name = 'Media Derivative'
+        verbose_name_plural = 'Media Derivatives'
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['media', 'preset'], name='media_derivative_preset_uniq'),
+        ]
+    
+    def __str__(self):
+        return f'{self.media.sha256[:12]} {self.preset} ({self.size} bytes)'
@@ -0,0 +1,194 @@
+"""
+Monthly range partitions of the messages table (PostgreSQL only)
+
+The table is partitioned by sent_at month (migration 0011) into
+messages_pYYYY_MM partitions plus a messages_default catch-all. Partitions
+are created ahead of time by the create_message_partitions command and beat
+task, and retention drops whole months instead of deleting rows.
+"""
+import logging
+from datetime import datetime, timezone as dt_timezone
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = 'messages'
+DEFAULT_PARTITION = 'messages_default'
+PARTITION_PREFIX = 'messages_p'
+MEDIA_TYPES = ('image', 'document', 'video')
+
+
+def is_partitioned() -> bool:
+    """Whether the messages table is a partitioned table on this database"""
+    if connection.vendor != 'postgresql':
+        return False
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)',
+            [PARENT_TABLE]
+        )
+        return cursor.fetchone() is not None
+
+
+def month_start(value):
+    """First instant (UTC) of the month containing value"""
+    value = value.astimezone(dt_timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(month, count):
+    """month shifted by count months (month must be a month_start)"""
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month):
+    """Table name of the partition for a month"""
+    return f'{PARTITION_PREFIX}{month:%Y_%m}'
+
+
+def list_partitions():
+    """Return {month_start: partition name} for the monthly partitions"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE pg_inherits.inhparent = to_regclass(%s)',
+            [PARENT_TABLE]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = {}
+    for name in names:
+        if not name.startswith(PARTITION_PREFIX):
+            continue
+        try:
+            month = datetime.strptime(name[len(PARTITION_PREFIX):], '%Y_%m')
+        except ValueError:
+            continue
+        partitions[month.replace(tzinfo=dt_timezone.utc)] = name
+    return partitions
+
+
+def create_partition(month, lock_timeout='5s'):
+    """
+    Create the partition for one month; returns False if it already exists
+
+    PostgreSQL refuses to create a partition while the default partition
+    holds rows in its range (e.g. written before the partition was created
+    in time). Those rows are moved in the same transaction: the default
+    partition is detached, the monthly partition created, the rows moved
+    into it and the default partition attached again. Writes to messages
+    wait on the parent's lock meanwhile, which lasts as long as the move;
+    the lock_timeout makes the run fail and be retried later rather than
+    queue behind long-running queries.
+    """
+    name = partition_name(month)
+    end = add_months(month, 1)
+    # Bounds are literals because DDL cannot take parameters
+    create = (
+        f'CREATE TABLE {name} PARTITION OF {PARENT_TABLE} '
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{end.isoformat()}')"
+    )
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('SELECT to_regclass(%s)', [name])
+        if cursor.fetchone()[0] is not None:
+            return False
+
+        cursor.execute(f"SET LOCAL lock_timeout = '{lock_timeout}'")
+        cursor.execute('SELECT to_regclass(%s)', [DEFAULT_PARTITION])
+        stranded = False
+        if cursor.fetchone()[0] is not None:
+            cursor.execute(
+                f'SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE sent_at >= %s AND sent_at < %s)',
+                [month, end]
+            )
+            stranded = cursor.fetchone()[0]
+
+        if not stranded:
+            cursor.execute(create)
+        else:
+            cursor.execute(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION {DEFAULT_PARTITION}')
+            cursor.execute(create)
+            cursor.execute(
+                f'INSERT INTO {name} SELECT * FROM {DEFAULT_PARTITION} WHERE sent_at >= %s AND sent_at < %s',
+                [month, end]
+            )
+            moved = cursor.rowcount
+            cursor.execute(
+                f'DELETE FROM {DEFAULT_PARTITION} WHERE sent_at >= %s AND sent_at < %s',
+                [month, end]
+            )
+            cursor.execute(f'ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT')
+            logger.warning(f'Moved {moved} messages from {DEFAULT_PARTITION} into {name}')
+
+    logger.info(f'Created message partition {name}')
+    return True
+
+
+def ensure_partitions(months_ahead, now=None):
+    """
+    Create partitions from the current month through months_ahead months ahead
+
+    Returns:
+        Names of the partitions created
+    """
+    current = month_start(now or datetime.now(dt_timezone.utc))
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        if create_partition(month):
+            created.append(partition_name(month))
+    return created
+
+
+def expired_partitions(cutoff):
+    """Monthly partitions holding only rows sent before cutoff, oldest first"""
+    return [
+        (month, name) for month, name in sorted(list_partitions().items())
+        if add_months(month, 1) <= cutoff
+    ]
+
+
+def default_partition_rows():
+    """Rows that fell into the default partition (no monthly partition existed)"""
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT to_regclass(%s)', [DEFAULT_PARTITION])
+        if cursor.fetchone()[0] is None:
+            return 0
+        cursor.execute(f'SELECT count(*) FROM {DEFAULT_PARTITION}')
+        return cursor.fetchone()[0]
+
+
+def partition_media_paths(name):
+    """Storage paths of media messages stored in a partition"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT content FROM {name} WHERE message_type = ANY(%s) AND content <> ''",
+            [list(MEDIA_TYPES)]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def drop_partition(name, lock_timeout='5s'):
+    """
+    Detach and drop a monthly partition
+
+    Rows referencing its messages are cleaned up first, since those foreign
+    keys cannot be enforced by the database on a partitioned table. The
+    lock_timeout keeps the brief ACCESS EXCLUSIVE lock on the parent from
+    queueing behind long-running queries; a timeout raises and the drop is
+    retried on the next run.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"SET LOCAL lock_timeout = '{lock_timeout}'")
+        cursor.execute(f'DELETE FROM dead_letter_messages WHERE message_id IN (SELECT id FROM {name})')
+        cursor.execute(
+            f'UPDATE scheduled_messages SET message_id = NULL WHERE message_id IN (SELECT id FROM {name})'
+        )
+        cursor.execute(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}')
+        cursor.execute(f'DROP TABLE {name}')
+
+    logger.info(f'Dropped message partition {name}')
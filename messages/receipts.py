@@ -0,0 +1,67 @@
+"""
+Delivery receipts that arrive before their message's send result is written
+
+Send workers write statuses in batches (see status_buffer), so the Node.js
+service can report a message as delivered before its whatsapp_message_id is
+in the database. Receipts that match no message are held in the cache for
+RECEIPT_HOLD_SECONDS and applied as soon as a sent status with their id is
+written; receipts for messages this service never sent simply expire.
+"""
+import logging
+from django.conf import settings
+from django.core.cache import cache
+from messages.models import Message
+
+logger = logging.getLogger(__name__)
+
+HELD_RECEIPT_KEY = 'receipts:held:{whatsapp_message_id}'
+
+
+def _key(whatsapp_message_id):
+    return HELD_RECEIPT_KEY.format(whatsapp_message_id=whatsapp_message_id)
+
+
+def hold_receipts(receipts):
+    """Keep unmatched receipts for a later apply_held_receipts, furthest status per message"""
+    receipts = list(receipts)
+    if not receipts:
+        return
+
+    progression = Message.STATUS_PROGRESSION
+    try:
+        held = cache.get_many([_key(receipt['message_id']) for receipt in receipts])
+        for receipt in receipts:
+            key = _key(receipt['message_id'])
+            current = held.get(key)
+            if current is None or progression.index(receipt['status']) > progression.index(current['status']):
+                held[key] = receipt
+        cache.set_many(held, settings.RECEIPT_HOLD_SECONDS)
+    except Exception as e:
+        logger.warning(f'Could not hold {len(receipts)} unmatched receipts: {e}')
+
+
+def apply_held_receipts(messages):
+    """
+    Apply receipts held for messages whose sent status was just written
+
+    Returns:
+        Number of messages updated
+    """
+    keys = [_key(message.whatsapp_message_id) for message in messages
+            if message.status == 'sent' and message.whatsapp_message_id]
+    if not keys:
+        return 0
+
+    try:
+        held = cache.get_many(keys)
+        if held:
+            cache.delete_many(list(held))
+    except Exception as e:
+        logger.warning(f'Could not read held receipts: {e}')
+        return 0
+
+    if not held:
+        return 0
+
+    from messages.services import MessageService
+    return MessageService().apply_receipts(held.values(), hold_unmatched=False)
@@ -0,0 +1,83 @@
+"""
+Chunked retention purge for unpartitioned messages tables
+
+PostgreSQL deployments drop whole monthly partitions instead (see
+messages.partitions); this module covers databases where the messages table
+is a single table. Expired rows are deleted in primary-key ranges with one
+DELETE per range, and progress is checkpointed in the cache (Redis) so a
+restarted worker resumes the same run instead of starting over.
+"""
+import logging
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+from messages.media_store import delete_media_files, release_media_references
+from messages.models import DeadLetterMessage, Message, ScheduledMessage
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_KEY = 'retention:messages:checkpoint'
+MEDIA_TYPES = ('image', 'document', 'video')
+
+
+def purge_expired_messages(cutoff, batch_size=None):
+    """
+    Delete messages sent before cutoff, batch_size ids at a time
+
+    ids grow with sent_at, so expired rows are the oldest ids: the table is
+    walked upwards in id windows until the next row is within retention. A
+    run interrupted midway resumes from its checkpoint with its original
+    cutoff, and the checkpoint is cleared once the run completes.
+
+    Returns:
+        Dict with deleted and media_failed counts
+    """
+    batch_size = batch_size or settings.MESSAGE_PURGE_BATCH_SIZE
+    next_id = 0
+
+    checkpoint = cache.get(CHECKPOINT_KEY)
+    if checkpoint:
+        cutoff = parse_datetime(checkpoint['cutoff'])
+        next_id = checkpoint['next_id']
+        logger.info(f'Resuming message purge at id {next_id} (cutoff {cutoff})')
+
+    stats = {'deleted': 0, 'media_failed': 0}
+
+    while True:
+        # Primary key lookup; also skips over gaps in the id sequence
+        head = Message.objects.filter(id__gte=next_id).order_by('id').values_list('id', 'sent_at').first()
+        if head is None or head[1] >= cutoff:
+            break
+
+        next_id = head[0]
+        end_id = next_id + batch_size - 1
+        window = Message.objects.filter(id__range=(next_id, end_id), sent_at__lt=cutoff)
+
+        with transaction.atomic():
+            media_paths = list(
+                window.filter(message_type__in=MEDIA_TYPES).exclude(content='').values_list('content', flat=True)
+            )
+
+            # Related rows first, as the database does not enforce these keys
+            DeadLetterMessage.objects.filter(message__in=window).delete()
+            ScheduledMessage.objects.filter(message__in=window).update(message=None)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {Message._meta.db_table} WHERE id BETWEEN %s AND %s AND sent_at < %s',
+                    [next_id, end_id, connection.ops.adapt_datetimefield_value(cutoff)]
+                )
+                stats['deleted'] += cursor.rowcount
+
+            # Released with the rows, so a killed worker cannot leave counts
+            # too high; files are only unlinked once the deletes are committed
+            unused_paths = release_media_references(media_paths)
+            transaction.on_commit(lambda paths=unused_paths: stats.update(
+                media_failed=stats['media_failed'] + delete_media_files(paths)
+            ))
+
+        next_id = end_id + 1
+        cache.set(CHECKPOINT_KEY, {'cutoff': cutoff.isoformat(), 'next_id': next_id}, None)
+
+    cache.delete(CHECKPOINT_KEY)
+    return stats
@@ -0,0 +1,71 @@
+"""
+Retry policy for failed message deliveries
+"""
+import random
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+
+# Error codes of a session (or the Node.js service) that cannot send right
+# now, see whatsapp-service/README.md; they count against the session's
+# circuit breaker and the message is worth sending again
+SESSION_ERROR_CODES = frozenset({
+    'SESSION_NOT_FOUND',
+    'SESSION_NOT_CONNECTED',
+    'SESSION_NOT_READY',
+    'SESSION_CLOSED',
+    'INTERNAL_ERROR',
+    'SERVICE_TIMEOUT',
+    'SERVICE_UNAVAILABLE',
+})
+
+# Failures worth retrying that say nothing about the session: the media URL
+# could not be downloaded, or the session's breaker is open (no send was made).
+# Any other code, e.g. SEND_FAILED for an invalid recipient, is permanent
+TRANSIENT_ERROR_CODES = SESSION_ERROR_CODES | {'MEDIA_UNAVAILABLE', 'SESSION_UNAVAILABLE'}
+
+
+def is_session_error(error_code, http_status=None) -> bool:
+    """
+    Whether a failed send is the session's fault rather than the message's
+
+    Decided on the service's error code; a response without one (e.g. a
+    proxy error page) is a session error when its status is a 5xx.
+    """
+    if error_code:
+        return error_code in SESSION_ERROR_CODES
+    return http_status is not None and http_status >= 500
+
+
+def _is_transient(error_code, http_status=None) -> bool:
+    if error_code:
+        return error_code in TRANSIENT_ERROR_CODES
+    return http_status is not None and http_status >= 500
+
+
+def is_transient_error(error) -> bool:
+    """Whether the exception a send raised is worth retrying later"""
+    return _is_transient(getattr(error, 'error_code', None), getattr(error, 'http_status', None))
+
+
+def is_transient_failure(attempts) -> bool:
+    """Whether every session attempt of a failed send failed transiently"""
+    failed = [attempt for attempt in attempts if not attempt.get('success')]
+    return bool(failed) and all(
+        _is_transient(attempt.get('error_code'), attempt.get('http_status')) for attempt in failed
+    )
+
+
+def next_retry_at(attempt_count):
+    """
+    Due time of the next attempt: exponential backoff with jitter
+
+    Half of the delay is fixed and half random, so retries of messages that
+    failed together (e.g. during a bridge restart) spread out instead of
+    hitting the service again at the same moment.
+    """
+    delay = min(
+        settings.MESSAGE_RETRY_BASE_DELAY * 2 ** (attempt_count - 1),
+        settings.MESSAGE_RETRY_MAX_DELAY
+    )
+    return timezone.now() + timedelta(seconds=delay / 2 + random.uniform(0, delay / 2))
@@ -0,0 +1,124 @@
+"""
+Message history search
+
+On PostgreSQL, content is matched with full-text search against a GIN
+expression index and recipients with a trigram GIN index; results are
+ordered by a weighted rank. Other databases (SQLite in development) fall
+back to LIKE matching ordered by recency. Both paths paginate with a
+(rank, id) keyset cursor.
+
+Template messages store only their template and variables, not the
+rendered text, so text search does not find them; recipient search does.
+"""
+import base64
+import json
+from django.conf import settings
+from django.db import connection
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVectorField, TrigramSimilarity
+)
+from django.db.models import F, FloatField, Func, Q, Value
+from messages.models import Message
+
+# Must match the expression of msg_content_fts_idx (migration 0010)
+SEARCH_CONFIG = 'simple'
+
+
+class MessageSearchVector(Func):
+    """to_tsvector over message content, written exactly like the index expression"""
+    template = f"to_tsvector('{SEARCH_CONFIG}'::regconfig, %(expressions)s)"
+    output_field = SearchVectorField()
+
+
+def encode_cursor(rank, message_id):
+    """Opaque cursor for the row after which the next page starts"""
+    return base64.urlsafe_b64encode(json.dumps([rank, message_id]).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return (rank, id) from a cursor, or None if it is malformed"""
+    try:
+        rank, message_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(rank), int(message_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def search_messages(user, text=None, recipient=None, start=None, end=None, cursor=None, limit=20):
+    """
+    Find a user's messages by content and/or recipient
+
+    Args:
+        user: Owner of the messages
+        text: Words to match in the content (web search syntax on PostgreSQL)
+        recipient: Full or partial phone number
+        start, end: Optional sent_at bounds (end is exclusive)
+        cursor: Cursor returned with the previous page
+        limit: Page size
+
+    Returns:
+        (messages, next_cursor) where next_cursor is None on the last page
+    """
+    queryset = search_queryset(user, text, recipient, start, end, cursor)
+    messages = list(queryset[:limit + 1])
+
+    next_cursor = None
+    if len(messages) > limit:
+        messages = messages[:limit]
+        next_cursor = encode_cursor(messages[-1].rank, messages[-1].id)
+
+    return messages, next_cursor
+
+
+def search_queryset(user, text=None, recipient=None, start=None, end=None, cursor=None):
+    """Ranked, cursor-filtered queryset behind search_messages"""
+    queryset = Message.objects.filter(user=user).select_related('user', 'template')
+
+    if start:
+        queryset = queryset.filter(sent_at__gte=start)
+    if end:
+        queryset = queryset.filter(sent_at__lt=end)
+
+    if connection.vendor == 'postgresql':
+        queryset = _postgres_search(queryset, text, recipient)
+    else:
+        queryset = _fallback_search(queryset, text, recipient)
+
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        rank, message_id = position
+        queryset = queryset.filter(Q(rank__lt=rank) | Q(rank=rank, id__lt=message_id))
+
+    return queryset.order_by('-rank', '-id')
+
+
+def _postgres_search(queryset, text, recipient):
+    """Full-text and trigram matching with a weighted rank"""
+    rank = Value(0.0, output_field=FloatField())
+
+    if text:
+        query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+        vector = MessageSearchVector(F('content'))
+        # alias() keeps the vector out of the SELECT list; the filter compiles to vector @@ query
+        queryset = queryset.alias(search_vector=vector).filter(search_vector=query)
+        rank = rank + SearchRank(vector, query) * settings.MESSAGE_SEARCH_CONTENT_WEIGHT
+
+    if recipient:
+        # LIKE '%...%' is served by the trigram index
+        queryset = queryset.filter(recipient__contains=recipient)
+        rank = rank + TrigramSimilarity('recipient', recipient) * settings.MESSAGE_SEARCH_RECIPIENT_WEIGHT
+
+    return queryset.annotate(rank=rank)
+
+
+def _fallback_search(queryset, text, recipient):
+    """LIKE matching for databases without full-text search; newest first"""
+    if text:
+        for word in text.split():
+            queryset = queryset.filter(content__icontains=word)
+
+    if recipient:
+        queryset = queryset.filter(recipient__contains=recipient)
+
+    # Constant rank turns the (rank, id) keyset into plain id order
+    return queryset.annotate(rank=Value(0.0, output_field=FloatField()))
@@ -2,11 +2,23 @@
 Message service layer with multi-instance support
 """
 from django.conf import settings
+from django.db import transaction
+from django.core.cache import cache
+from django.utils import timezone
 from sessions.services import WhatsAppService
 from sessions.models import WhatsAppSession
 from sessions.session_pool import SessionPoolService
-from messages.models import Message
-from core.exceptions import SessionNotConnected
+from sessions.outbound_queue import OutboundQueue
+from messages.models import Message, MessageBatch, Campaign, ScheduledMessage, DeadLetterMessage
+from messages.media_processing import delivery_path
+from messages.media_store import acquire_media, signed_media_url, store_media
+from messages.retry import is_transient_error, is_transient_failure, next_retry_at
+from messages.receipts import apply_held_receipts, hold_receipts
+from messages.status_buffer import StatusWriteBuffer
+from core.exceptions import SessionNotConnected, RateLimitExceeded, SessionThrottled, QuotaUnavailable
+from core.validators import normalize_phone_number
+from collections import defaultdict
+from datetime import timedelta
 import logging
 
 logger = logging.getLogger(__name__)
@@ -19,7 +31,7 @@ class MessageService:
         self.whatsapp_service = WhatsAppService()
         self.session_pool = SessionPoolService()
     
-    def send_text_message(self, user, recipient, message_text):
+    def send_text_message(self, user, recipient, message_text, idempotency_key=None, priority='normal'):
         """
         Send text message using session pool with fallback
         """
@@ -33,22 +45,605 @@ class MessageService:
             user=user,
             recipient=recipient,
             message_type='text',
+            priority=priority,
             content=message_text,
             status='pending'
         )
         
+        try:
+            return self.deliver_message(message, idempotency_key=idempotency_key, defer_throttled=False)
+        except SessionThrottled as e:
+            # The client is told to retry later (429), so this message is not sent
+            message.status = 'failed'
+            message.error_message = str(e)
+            message.save(update_fields=['status', 'error_message'])
+            raise
+    
+    def queue_text_message(self, user, recipient, message_text, priority='normal'):
+        """
+        Store a pending text message and hand it to the send workers
+        in its priority lane
+        """
+        # Fail fast so clients are not left polling a message that cannot be sent
+        available_sessions = self.session_pool.get_available_sessions(user)
+        if not available_sessions:
+            raise SessionNotConnected('No active WhatsApp sessions. Please connect at least one session.')
+        
+        message = Message.objects.create(
+            user=user,
+            recipient=recipient,
+            message_type='text',
+            priority=priority,
+            content=message_text,
+            status='pending'
+        )
+        
+        self._enqueue_for_delivery(user, [message.id], available_sessions, priority)
+        
+        logger.info(f'Queued message {message.id} for user {user.id}')
+        
+        return {
+            'success': True,
+            'dbId': message.id,
+            'status': message.status
+        }
+    
+    def queue_bulk_text_messages(self, user, entries, priority='low'):
+        """
+        Store one pending message per recipient and fan delivery out across
+        every connected session of the user
+        
+        Args:
+            user: User object
+            entries: List of {'recipient': ..., 'message': ...} dicts
+            priority: Delivery lane; bulk sends default to low
+        
+        Returns:
+            Dict with the batch id and number of queued messages
+        """
+        return self._queue_batch(user, [
+            Message(
+                user=user,
+                recipient=entry['recipient'],
+                message_type='text',
+                priority=priority,
+                content=entry['message'],
+                status='pending'
+            )
+            for entry in entries
+        ], priority)
+    
+    def queue_bulk_media_messages(self, user, entries, upload, priority='low'):
+        """
+        Queue one media message per recipient from an uploaded file
+        
+        The file is already stored, so each message only takes a reference
+        on it; per-recipient text becomes the caption.
+        
+        Args:
+            user: User object
+            entries: List of {'recipient': ..., 'message': ...} dicts; message may be None
+            upload: MediaUpload of the user to send
+            priority: Delivery lane; bulk sends default to low
+        
+        Returns:
+            Dict with the batch id and number of queued messages
+        """
+        messages = [
+            Message(
+                user=user,
+                recipient=entry['recipient'],
+                message_type=upload.media_type,
+                priority=priority,
+                content=upload.media.file_path,
+                caption=entry.get('message') or '',
+                status='pending'
+            )
+            for entry in entries
+        ]
+        
+        # Rolled back with the batch if it cannot be queued
+        with transaction.atomic():
+            acquire_media(upload.media, len(messages))
+            return self._queue_batch(user, messages, priority)
+    
+    def queue_template_messages(self, user, template, rows, priority='low'):
+        """
+        Queue one personalised message per row of a template send
+        
+        Only the variable values are stored; the send workers render the
+        text from the compiled template when delivering.
+        
+        Args:
+            user: User object
+            template: MessageTemplate to render
+            rows: List of [recipient, value, ...] with values ordered like template.variables
+            priority: Delivery lane; template sends default to low
+        
+        Returns:
+            Dict with the batch id and number of queued messages
+        """
+        return self._queue_batch(user, [
+            Message(
+                user=user,
+                recipient=row[0],
+                message_type='text',
+                priority=priority,
+                template=template,
+                template_variables=row[1:],
+                status='pending'
+            )
+            for row in rows
+        ], priority)
+    
+    def _queue_batch(self, user, messages, priority):
+        """
+        Store unsaved pending messages under one batch with a single
+        bulk_create and fan delivery out across every connected session
+        """
+        available_sessions = self.session_pool.get_available_sessions(user)
+        if not available_sessions:
+            raise SessionNotConnected('No active WhatsApp sessions. Please connect at least one session.')
+        
+        self.reserve_daily_quota(user, len(messages))
+        
+        with transaction.atomic():
+            batch = MessageBatch.objects.create(user=user, total_count=len(messages))
+            for message in messages:
+                message.batch = batch
+            messages = Message.objects.bulk_create(messages)
+        
+        message_ids = [message.id for message in messages]
+        self._enqueue_for_delivery(user, message_ids, available_sessions, priority)
+        
+        logger.info(f'Queued batch {batch.id} with {len(message_ids)} messages across {len(available_sessions)} sessions for user {user.id}')
+        
+        return {
+            'success': True,
+            'batchId': batch.id,
+            'queued': len(message_ids),
+            'sessions': len(available_sessions)
+        }
+    
+    def schedule_text_messages(self, user, entries, send_at, campaign_name='', priority='low'):
+        """
+        Store messages to be sent at send_at; the dispatcher task hands
+        them to the send workers once they are due
+        
+        Recipients are normalised to E.164 and deduplicated (first entry
+        wins) before the messages are counted against the daily limit of
+        the day they will be sent.
+        """
+        unique = {}
+        for entry in entries:
+            unique.setdefault(normalize_phone_number(entry['recipient']), entry['message'])
+        
+        self.reserve_daily_quota(user, len(unique), day=timezone.localdate(send_at))
+        
+        with transaction.atomic():
+            campaign = Campaign.objects.create(user=user, name=campaign_name)
+            ScheduledMessage.objects.bulk_create([
+                ScheduledMessage(
+                    user=user,
+                    campaign=campaign,
+                    recipient=recipient,
+                    content=message,
+                    priority=priority,
+                    send_at=send_at
+                )
+                for recipient, message in unique.items()
+            ], ignore_conflicts=True)
+            scheduled = ScheduledMessage.objects.filter(campaign=campaign).count()
+        
+        logger.info(f'Scheduled campaign {campaign.id} with {scheduled} messages at {send_at} for user {user.id}')
+        
+        return {
+            'success': True,
+            'campaignId': campaign.id,
+            'scheduled': scheduled,
+            'sendAt': send_at
+        }
+    
+    def import_recipients(self, campaign, stream, file_format, send_at, default_message='', on_progress=None):
+        """
+        Stream a CSV/NDJSON recipient file into a campaign
+        
+        Each chunk's new recipients are counted against the daily limit of
+        the send day before they are written, so an oversized file stops
+        with RateLimitExceeded after the rows that fit have been scheduled.
+        
+        Returns:
+            Dict with rows_read, rows_imported and rows_invalid
+        """
+        from messages.importing import RecipientImporter
+        
+        def on_chunk(chunk_length, stats):
+            self.reserve_daily_quota(campaign.user, chunk_length, day=timezone.localdate(send_at))
+            if on_progress:
+                on_progress(stats)
+        
+        importer = RecipientImporter(campaign, send_at, default_message, on_chunk=on_chunk)
+        return importer.run(stream, file_format)
+    
+    def cancel_campaign(self, campaign):
+        """Cancel every entry of a campaign that has not been dispatched yet"""
+        return ScheduledMessage.objects.filter(
+            campaign=campaign,
+            status='scheduled'
+        ).update(status='cancelled')
+    
+    def dispatch_due_messages(self, batch_size):
+        """
+        Claim one batch of due scheduled messages and queue them for delivery
+        
+        Rows are locked with SKIP LOCKED so several dispatchers can run at
+        once without sending anything twice.
+        
+        Returns:
+            Number of messages dispatched
+        """
+        from users.models import User
+        
+        with transaction.atomic():
+            due = list(
+                ScheduledMessage.objects.select_for_update(skip_locked=True)
+                .filter(status='scheduled', send_at__lte=timezone.now())
+                .order_by('send_at')[:batch_size]
+            )
+            if not due:
+                return 0
+            
+            messages = Message.objects.bulk_create([
+                Message(
+                    user_id=row.user_id,
+                    recipient=row.recipient,
+                    message_type='text',
+                    priority=row.priority,
+                    content=row.content,
+                    status='pending'
+                )
+                for row in due
+            ])
+            
+            for row, message in zip(due, messages):
+                row.status = 'dispatched'
+                row.message = message
+            ScheduledMessage.objects.bulk_update(due, ['status', 'message'])
+            
+            users = User.objects.in_bulk({message.user_id for message in messages})
+            self._requeue(users, messages)
+        
+        logger.info(f'Dispatched {len(due)} scheduled messages for {len(users)} users')
+        return len(due)
+    
+    def apply_receipts(self, receipts, hold_unmatched=True):
+        """
+        Apply a batch of delivery/read receipts from the WhatsApp service
+        
+        All matching messages are loaded with one query and written back with
+        one bulk_update, so a batch costs two round trips however large it is.
+        Receipts for ids not written yet are held briefly for the send
+        workers' batched status writes (see messages.receipts); receipts that
+        would move a message backwards are ignored.
+        
+        Args:
+            receipts: Iterable of dicts with message_id, status ('delivered' or
+                'read') and an optional timestamp
+            hold_unmatched: Hold receipts that match no message
+        
+        Returns:
+            Number of messages updated
+        """
+        progression = Message.STATUS_PROGRESSION
+        
+        # Keep only the furthest status per message within the batch
+        latest = {}
+        for receipt in receipts:
+            current = latest.get(receipt['message_id'])
+            if current is None or progression.index(receipt['status']) > progression.index(current['status']):
+                latest[receipt['message_id']] = receipt
+        
+        if not latest:
+            return 0
+        
+        now = timezone.now()
+        updated = []
+        
+        messages = list(Message.objects.filter(whatsapp_message_id__in=list(latest)).only(
+            'id', 'status', 'whatsapp_message_id', 'delivered_at', 'read_at'
+        ))
+        if hold_unmatched and len(messages) < len(latest):
+            matched = {message.whatsapp_message_id for message in messages}
+            hold_receipts(receipt for message_id, receipt in latest.items() if message_id not in matched)
+        
+        for message in messages:
+            receipt = latest[message.whatsapp_message_id]
+            if message.status not in progression:
+                continue
+            if progression.index(receipt['status']) <= progression.index(message.status):
+                continue
+            
+            timestamp = receipt.get('timestamp') or now
+            message.status = receipt['status']
+            if message.delivered_at is None:
+                message.delivered_at = timestamp
+            if receipt['status'] == 'read':
+                message.read_at = timestamp
+            updated.append(message)
+        
+        if updated:
+            Message.objects.bulk_update(
+                updated,
+                ['status', 'delivered_at', 'read_at'],
+                batch_size=settings.RECEIPT_UPDATE_BATCH_SIZE
+            )
+        
+        logger.info(f'Applied {len(updated)} of {len(latest)} message receipts')
+        return len(updated)
+    
+    def _enqueue_for_delivery(self, user, message_ids, sessions, priority='normal'):
+        """
+        Hand pending messages to the send workers once the surrounding
+        transaction commits, so workers never see rows that do not exist yet
+        
+        With Redis available each message goes to the priority lane of the
+        shortest per-session outbound queue; otherwise chunks are spread over
+        Celery tasks, with high priority ones on their own Celery queue.
+        """
+        if sessions and OutboundQueue.is_enabled():
+            transaction.on_commit(lambda: self._route_to_session_queues(user, message_ids, sessions, priority))
+        else:
+            transaction.on_commit(lambda: self._enqueue_chunks(message_ids, sessions, priority))
+    
+    @staticmethod
+    def _task_options(priority):
+        """Celery options keeping high priority work off the shared send queue"""
+        if priority == 'high':
+            return {'queue': settings.CELERY_PRIORITY_QUEUE}
+        return {}
+    
+    def _route_to_session_queues(self, user, message_ids, sessions, priority='normal'):
+        """Push messages onto session outbound queues and wake their senders"""
+        from messages.tasks import drain_session_queue
+        
+        try:
+            assignments = self.session_pool.route_to_queues(user, message_ids, lane=priority)
+        except Exception as e:
+            logger.error(f'Failed to route {len(message_ids)} messages to session queues: {e}. Falling back to chunk tasks.')
+            self._enqueue_chunks(message_ids, sessions, priority)
+            return
+        
+        # A sender already draining the session picks the new lane up on its
+        # next pop; otherwise this starts one
+        for session_id in assignments:
+            drain_session_queue.apply_async((session_id,), **self._task_options(priority))
+    
+    def _enqueue_chunks(self, message_ids, sessions, priority='normal'):
+        """Split pending messages into chunk tasks round-robin over the given sessions"""
+        from messages.tasks import send_bulk_chunk
+        
+        chunk_size = settings.BULK_SEND_CHUNK_SIZE
+        for index, start in enumerate(range(0, len(message_ids), chunk_size)):
+            # Without sessions the chunk still runs so its messages are marked failed
+            session_pk = sessions[index % len(sessions)].id if sessions else None
+            send_bulk_chunk.apply_async(
+                (message_ids[start:start + chunk_size], session_pk),
+                **self._task_options(priority)
+            )
+    
+    def _record_failure(self, message, error, transient, status_buffer=None):
+        """
+        Mark a queued message as retrying or failed after a send attempt
+        
+        Transient failures are retried with backoff until
+        MESSAGE_RETRY_MAX_ATTEMPTS; messages that exhaust their attempts are
+        copied to the dead-letter table. A dead-lettered message's status is
+        written with its dead-letter row, never left in status_buffer.
+        
+        Returns:
+            True if a retry was scheduled
+        """
+        message.error_message = error
+        retry = transient and message.attempt_count < settings.MESSAGE_RETRY_MAX_ATTEMPTS
+        
+        if retry:
+            message.status = 'retrying'
+            message.next_retry_at = next_retry_at(message.attempt_count)
+            logger.info(f'Retrying message {message.id} at {message.next_retry_at} (attempt {message.attempt_count} failed)')
+        else:
+            message.status = 'failed'
+            message.next_retry_at = None
+        
+        if not (transient and not retry):
+            self._save_status(message, status_buffer)
+            return retry
+        
+        if status_buffer is not None:
+            status_buffer.discard(message)
+        with transaction.atomic():
+            self._save_status(message)
+            DeadLetterMessage.objects.update_or_create(
+                message=message,
+                defaults={
+                    'user_id': message.user_id,
+                    'attempt_count': message.attempt_count,
+                    'last_error': error,
+                    'replayed_at': None
+                }
+            )
+        logger.warning(f'Message {message.id} moved to dead letters after {message.attempt_count} attempts')
+        
+        return retry
+    
+    def dispatch_due_retries(self, batch_size):
+        """
+        Claim one batch of messages whose retry is due and queue them again
+        
+        Uses SKIP LOCKED like dispatch_due_messages so several dispatchers
+        can run at once.
+        
+        Returns:
+            Number of messages requeued
+        """
+        from users.models import User
+        
+        with transaction.atomic():
+            due = list(
+                Message.objects.select_for_update(skip_locked=True)
+                .filter(status='retrying', next_retry_at__lte=timezone.now())
+                .order_by('next_retry_at')
+                .only('id', 'user_id', 'priority')[:batch_size]
+            )
+            if not due:
+                return 0
+            
+            Message.objects.filter(id__in=[message.id for message in due]).update(
+                status='pending',
+                next_retry_at=None
+            )
+            self._requeue(User.objects.in_bulk({message.user_id for message in due}), due)
+        
+        logger.info(f'Requeued {len(due)} messages for retry')
+        return len(due)
+    
+    def replay_dead_letters(self, dead_letters):
+        """
+        Send dead-lettered messages again with a fresh retry budget
+        
+        Returns:
+            Number of messages requeued
+        """
+        from users.models import User
+        
+        dead_letters = list(
+            dead_letters.filter(replayed_at__isnull=True)
+            .select_related('message')
+        )
+        if not dead_letters:
+            return 0
+        
+        messages = [dead_letter.message for dead_letter in dead_letters]
+        
+        with transaction.atomic():
+            Message.objects.filter(id__in=[message.id for message in messages]).update(
+                status='pending',
+                attempt_count=0,
+                next_retry_at=None,
+                error_message=None
+            )
+            DeadLetterMessage.objects.filter(id__in=[dl.id for dl in dead_letters]).update(
+                replayed_at=timezone.now()
+            )
+            self._requeue(User.objects.in_bulk({message.user_id for message in messages}), messages)
+        
+        logger.info(f'Replayed {len(messages)} dead-lettered messages')
+        return len(messages)
+    
+    def _requeue(self, users, messages):
+        """Enqueue pending messages grouped by user and priority lane"""
+        message_ids_by_lane = defaultdict(list)
+        for message in messages:
+            message_ids_by_lane[(message.user_id, message.priority)].append(message.id)
+        
+        for (user_id, priority), message_ids in message_ids_by_lane.items():
+            sessions = self.session_pool.get_available_sessions(users[user_id])
+            self._enqueue_for_delivery(users[user_id], message_ids, sessions, priority)
+    
+    @staticmethod
+    def _save_status(message, status_buffer=None):
+        """Persist a send result, batched through status_buffer when one is given"""
+        if status_buffer is not None:
+            status_buffer.add(message)
+        else:
+            message.save(update_fields=StatusWriteBuffer.FIELDS)
+            apply_held_receipts([message])
+    
+    @staticmethod
+    def _bridge_idempotency_key(message, idempotency_key=None):
+        """
+        Key sent to the Node.js service so HTTP-level retries of a send are
+        delivered once; scoped per user since client keys are not unique
+        """
+        if idempotency_key:
+            return f'{message.user_id}:{idempotency_key}'
+        return f'message:{message.id}'
+    
+    def reserve_daily_quota(self, user, count, day=None):
+        """
+        Count a bulk request or import chunk against the daily message limit
+        up front, since UsageTrackingMiddleware only counts one message per request
+        
+        day is the date the messages will be sent (default: today). The
+        count is added first and taken back if it went over the limit, so
+        concurrent requests cannot both pass a check made before either was
+        counted. Bulk work is refused when the counter cannot be reached.
+        
+        Raises:
+            RateLimitExceeded: the limit would be exceeded
+            QuotaUnavailable: the cache could not be reached
+        """
+        daily_limit = getattr(user, 'max_messages_per_day', settings.MAX_MESSAGES_PER_DAY)
+        today = timezone.now().date()
+        day = day or today
+        daily_key = f"rate_limit:daily:{user.id}:{day}"
+        # Keep a later day's count until that day is over
+        timeout = 86400 * (max((day - today).days, 0) + 1)
+        
+        try:
+            cache.add(daily_key, 0, timeout)
+            daily_count = cache.incr(daily_key, count)
+            if daily_count > daily_limit:
+                cache.decr(daily_key, count)
+        except Exception as e:
+            logger.error(f'Daily quota cache error: {e}. Refusing bulk request of {count} messages.')
+            raise QuotaUnavailable()
+        
+        if daily_count > daily_limit:
+            raise RateLimitExceeded(
+                f'Daily message limit exceeded ({daily_count - count}/{daily_limit} used, {count} requested)'
+            )
+    
+    def _message_data(self, message, idempotency_key=None):
+        """Payload for send_with_fallback: text, or media URL and caption"""
+        if message.message_type == 'text':
+            message_data = {'content': message.text}
+        else:
+            media_url = signed_media_url(delivery_path(message.content, message.message_type))
+            message_data = {'media_url': media_url, 'caption': message.caption}
+        message_data['idempotency_key'] = self._bridge_idempotency_key(message, idempotency_key)
+        return message_data
+    
+    def deliver_message(self, message, preferred_session=None, idempotency_key=None,
+                        status_buffer=None, defer_throttled=True):
+        """
+        Send a stored pending text or media message using session pool with fallback
+        
+        With a StatusWriteBuffer the resulting status is written in a batch
+        with other messages instead of immediately. Transient failures are
+        scheduled for a retry instead of being marked failed.
+        
+        When every session is at its rate limit nothing is sent: the message
+        is scheduled for when a token is available, or with
+        defer_throttled=False left pending and SessionThrottled raised.
+        """
+        user = message.user
+        message.attempt_count += 1
+        
         try:
             # Send using session pool with fallback
             result = self.session_pool.send_with_fallback(
                 user=user,
-                recipient=recipient,
-                message_data={'content': message_text},
-                message_type='text'
+                recipient=message.recipient,
+                message_data=self._message_data(message, idempotency_key),
+                message_type=message.message_type,
+                preferred_session=preferred_session
             )
             
             if result.get('success'):
                 message.status = 'sent'
-                message.save()
+                message.whatsapp_message_id = result.get('message_id')
+                message.next_retry_at = None
+                self._save_status(message, status_buffer)
                 
                 # Log which session was used
                 session_used = result.get('session_used', {})
@@ -63,45 +658,167 @@ class MessageService:
                     'attempts': result.get('attempts', [])
                 }
             else:
-                message.status = 'failed'
-                message.error_message = result.get('error', 'Failed to send message')
-                message.save()
+                error = result.get('error', 'Failed to send message')
+                self._record_failure(message, error, is_transient_failure(result.get('attempts', [])), status_buffer)
                 
                 logger.error(f'Failed to send message after {result.get("sessions_tried", 0)} attempts: {result.get("error")}')
                 
                 return {
                     'success': False,
-                    'error': result.get('error', 'Failed to send message'),
+                    'error': error,
                     'dbId': message.id,
+                    'status': message.status,
+                    'nextRetryAt': message.next_retry_at,
                     'attempts': result.get('attempts', [])
                 }
         
-        except Exception as e:
-            logger.error(f'Error sending text message for user {user.id}: {e}')
-            message.status = 'failed'
+        except SessionThrottled as e:
+            # Not an attempt: no session was tried
+            message.attempt_count -= 1
+            if not defer_throttled:
+                raise
+            message.status = 'retrying'
             message.error_message = str(e)
-            message.save()
+            message.next_retry_at = timezone.now() + timedelta(seconds=e.retry_after)
+            self._save_status(message, status_buffer)
+            return {
+                'success': False,
+                'error': str(e),
+                'dbId': message.id,
+                'status': message.status,
+                'nextRetryAt': message.next_retry_at,
+                'attempts': []
+            }
+        
+        except Exception as e:
+            logger.error(f'Error sending {message.message_type} message for user {user.id}: {e}')
+            if self._record_failure(message, str(e), is_transient_error(e), status_buffer):
+                # Will be delivered later; callers see a failed attempt, not an error
+                return {
+                    'success': False,
+                    'error': str(e),
+                    'dbId': message.id,
+                    'status': message.status,
+                    'nextRetryAt': message.next_retry_at,
+                    'attempts': []
+                }
             raise
     
-    def send_media_message(self, user, recipient, file, caption='', media_type='image'):
+    def deliver_queued_message(self, message, session, status_buffer=None):
+        """
+        Send a message popped from a session's outbound queue through that
+        session only
+        
+        The queue's sender is the only one driving the session's Chromium
+        page, so a failed send is not retried on another session inline:
+        after a transient failure the message is handed to another session's
+        queue while it has attempts left, otherwise it is scheduled for a
+        retry or failed as usual. The status is written before returning,
+        or added to status_buffer; a handed-off message is always written
+        first, as another sender may pick it up straight away.
+        
+        Raises:
+            SessionThrottled: the session is at its rate limit; nothing was sent
+        """
+        if session is None or session.status != 'connected':
+            # Not an attempt: the session went away while the message was queued
+            error = 'WhatsApp session of the outbound queue is not connected'
+            if not self._hand_off(message, session):
+                self._record_failure(message, error, transient=True, status_buffer=status_buffer)
+            return {'success': False, 'error': error, 'dbId': message.id, 'status': message.status}
+        
+        message.attempt_count += 1
+        try:
+            result = self.session_pool.send_via_session(
+                session,
+                message.recipient,
+                self._message_data(message),
+                message.message_type
+            )
+        except SessionThrottled:
+            message.attempt_count -= 1
+            raise
+        except Exception as e:
+            logger.error(f'Error sending queued message {message.id} via {session.instance_name}: {e}')
+            result = {'success': False, 'error': str(e), 'attempts': [{
+                'error': str(e),
+                'error_code': getattr(e, 'error_code', None),
+                'http_status': getattr(e, 'http_status', None)
+            }]}
+        
+        if result.get('success'):
+            message.status = 'sent'
+            message.whatsapp_message_id = result.get('message_id')
+            message.next_retry_at = None
+            self._save_status(message, status_buffer)
+            return {
+                'success': True,
+                'messageId': result.get('message_id'),
+                'dbId': message.id,
+                'sessionUsed': result.get('session_used', {})
+            }
+        
+        error = result.get('error', 'Failed to send message')
+        transient = is_transient_failure(result.get('attempts', []))
+        if transient and message.attempt_count < settings.MESSAGE_RETRY_MAX_ATTEMPTS:
+            # Keep the attempt before another sender can pick the message up
+            message.error_message = error
+            self._save_status(message)
+            if self._hand_off(message, session):
+                logger.info(f'Message {message.id} handed from session {session.instance_name} to another session')
+                return {'success': False, 'error': error, 'dbId': message.id, 'status': message.status}
+        
+        self._record_failure(message, error, transient, status_buffer)
+        return {
+            'success': False,
+            'error': error,
+            'dbId': message.id,
+            'status': message.status,
+            'nextRetryAt': message.next_retry_at
+        }
+    
+    def _hand_off(self, message, session):
+        """
+        Queue a pending message on another connected session of its user
+        and wake that session's sender
+        
+        Returns:
+            True if another session took the message
+        """
+        from messages.tasks import drain_session_queue
+        
+        try:
+            assignments = self.session_pool.route_to_queues(
+                message.user, [message.id], lane=message.priority, exclude=session
+            )
+        except SessionNotConnected:
+            return False
+        except Exception as e:
+            logger.error(f'Failed to hand message {message.id} to another session queue: {e}')
+            return False
+        
+        for session_id in assignments:
+            drain_session_queue.apply_async((session_id,), **self._task_options(message.priority))
+        return True
+    
+    def send_media_message(self, user, recipient, file=None, caption='', media_type='image',
+                           idempotency_key=None, status_buffer=None, upload=None):
         """
         Send media message using session pool with fallback
+        
+        Sends either a newly uploaded file or a MediaUpload stored earlier.
+        Transient failures are scheduled for a retry (status 'retrying').
         """
         # Check if user has any connected sessions
         available_sessions = self.session_pool.get_available_sessions(user)
         if not available_sessions:
             raise SessionNotConnected('No active WhatsApp sessions. Please connect at least one session.')
         
-        # Save file and get URL
-        from django.core.files.storage import default_storage
-        file_path = default_storage.save(f'whatsapp_media/{user.id}/{file.name}', file)
-        media_url = f'{settings.MEDIA_URL}{file_path}'
-        
-        # Make it absolute URL
-        if not media_url.startswith('http'):
-            # Get Django base URL from environment or use default
-            base_url = settings.DJANGO_BASE_URL if hasattr(settings, 'DJANGO_BASE_URL') else 'http://localhost:8000'
-            media_url = f'{base_url}{media_url}'
+        # Store the file once per content; resending the same file reuses it
+        if upload:
+            file_path = acquire_media(upload.media).file_path
+        else:
+            file_path = store_media(file).file_path
         
         # Create message record
         message = Message.objects.create(
@@ -109,56 +826,25 @@ class MessageService:
             recipient=recipient,
             message_type=media_type,
             content=file_path,
+            caption=caption,
             status='pending'
         )
         
         try:
-            # Send using session pool with fallback
-            result = self.session_pool.send_with_fallback(
-                user=user,
-                recipient=recipient,
-                message_data={
-                    'media_url': media_url,
-                    'caption': caption
-                },
-                message_type=media_type
+            # Transient failures are scheduled for a retry like text messages
+            result = self.deliver_message(
+                message,
+                idempotency_key=idempotency_key,
+                status_buffer=status_buffer,
+                defer_throttled=False
             )
-            
-            if result.get('success'):
-                message.status = 'sent'
-                message.save()
-                
-                # Log which session was used
-                session_used = result.get('session_used', {})
-                logger.info(f'Media message sent via session {session_used.get("instance_name", "unknown")} (ID: {session_used.get("id")})')
-                
-                return {
-                    'success': True,
-                    'messageId': result.get('message_id'),
-                    'timestamp': result.get('timestamp'),
-                    'dbId': message.id,
-                    'filePath': file_path,
-                    'sessionUsed': session_used,
-                    'attempts': result.get('attempts', [])
-                }
-            else:
-                message.status = 'failed'
-                message.error_message = result.get('error', 'Failed to send media')
-                message.save()
-                
-                logger.error(f'Failed to send media after {result.get("sessions_tried", 0)} attempts: {result.get("error")}')
-                
-                return {
-                    'success': False,
-                    'error': result.get('error', 'Failed to send media'),
-                    'dbId': message.id,
-                    'attempts': result.get('attempts', [])
-                }
-        
-        except Exception as e:
-            logger.error(f'Error sending media message for user {user.id}: {e}')
+        except SessionThrottled as e:
+            # The client is told to retry later (429), so this message is not sent
             message.status = 'failed'
             message.error_message = str(e)
-            message.save()
+            message.save(update_fields=['status', 'error_message'])
             raise
+        
+        result['filePath'] = file_path
+        return result
 
@@ -0,0 +1,90 @@
+"""
+Write-behind buffer for message status transitions
+"""
+import logging
+import time
+from django.conf import settings
+from messages.models import Message
+from messages.receipts import apply_held_receipts
+
+logger = logging.getLogger(__name__)
+
+
+class StatusWriteBuffer:
+    """
+    Collect sent/retrying/failed transitions and write them with one bulk_update
+
+    Send workers deliver messages in a loop; saving each row separately
+    costs a round trip and a full-row UPDATE per message. The buffer is
+    flushed once it holds max_size messages, when the oldest entry is older
+    than max_delay_ms, and when the context manager exits. Tasks using it
+    must acknowledge their work only after the exit (acks_late), so a killed
+    worker's unwritten statuses are redone rather than lost; ids of rows
+    that could not be written are kept in unwritten. Receipts that arrived
+    before a flush are applied right after it. Use it as:
+
+        with StatusWriteBuffer() as buffer:
+            for message in messages:
+                message_service.deliver_message(message, status_buffer=buffer)
+    """
+
+    FIELDS = ['status', 'error_message', 'whatsapp_message_id', 'attempt_count', 'next_retry_at']
+
+    def __init__(self, max_size=None, max_delay_ms=None):
+        self.max_size = max_size or settings.STATUS_WRITE_BUFFER_SIZE
+        self.max_delay = (max_delay_ms or settings.STATUS_WRITE_BUFFER_MAX_DELAY_MS) / 1000
+        self._pending = {}
+        self._oldest = None
+        self.unwritten = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+        return False
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, message):
+        """Queue a message's status fields for the next flush"""
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+        self._pending[message.pk] = message
+
+        if len(self._pending) >= self.max_size or time.monotonic() - self._oldest >= self.max_delay:
+            self.flush()
+
+    def discard(self, message):
+        """Drop a message's queued transition, e.g. because it was written directly"""
+        self._pending.pop(message.pk, None)
+        self.unwritten.discard(message.pk)
+        if not self._pending:
+            self._oldest = None
+
+    def flush(self):
+        """Write all pending transitions"""
+        if not self._pending:
+            return
+
+        messages = list(self._pending.values())
+        self._pending = {}
+        self._oldest = None
+
+        try:
+            Message.objects.bulk_update(messages, self.FIELDS)
+        except Exception as e:
+            # Fall back to row-at-a-time so one bad row does not lose the batch
+            logger.error(f'Bulk status write of {len(messages)} messages failed: {e}. Writing individually.')
+            written = []
+            for message in messages:
+                try:
+                    message.save(update_fields=self.FIELDS)
+                    written.append(message)
+                except Exception as row_error:
+                    logger.error(f'Failed to write status of message {message.pk}: {row_error}')
+                    self.unwritten.add(message.pk)
+            messages = written
+
+        apply_held_receipts(messages)
@@ -0,0 +1,394 @@
+"""
+Celery tasks for message delivery
+"""
+from datetime import timedelta
+from celery import shared_task
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from core.exceptions import SessionThrottled
+from messages import exporting, partitions
+from messages.filters import filter_messages
+from messages.inbound import ingest_inbound_events
+from messages.media_processing import create_derivative
+from messages.models import MediaObject, Message, MessageExport, RecipientImport
+from messages.services import MessageService
+from messages.status_buffer import StatusWriteBuffer
+from sessions.models import WhatsAppSession
+from sessions.outbound_queue import OutboundQueue, LaneScheduler
+import logging
+import tempfile
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True, acks_late=True, reject_on_worker_lost=True)
+def drain_session_queue(session_id, sender_token=None, lane_credits=None):
+    """
+    Send up to SESSION_SEND_BATCH_SIZE queued messages of one WhatsApp
+    session, then schedule the next run after SESSION_SEND_INTERVAL
+    Only the task holding the session's sender lock drains; duplicate
+    invocations exit immediately and each run passes the lock on to the
+    next. Messages are sent through this session only, back to back within
+    a run and paced by the session's rate limit; their statuses are written
+    with one bulk_update and acknowledged together at the end of the run.
+    Lanes are picked by LaneScheduler so high priority messages go first.
+    Runs on the send workers (queue: messages)
+    """
+    queue = OutboundQueue()
+
+    if sender_token:
+        # Taken over again if the lock expired while this run was waiting
+        if not (queue.refresh_sender(session_id, sender_token) or queue.acquire_sender(session_id, sender_token)):
+            return
+    else:
+        sender_token = uuid.uuid4().hex
+        if not queue.acquire_sender(session_id, sender_token):
+            return
+
+    scheduler = LaneScheduler(credits=lane_credits)
+    session = WhatsAppSession.objects.filter(session_id=session_id).first()
+    message_service = MessageService()
+    countdown = settings.SESSION_SEND_INTERVAL
+    drained = False
+    done = []
+    sent = 0
+
+    with StatusWriteBuffer(max_size=settings.SESSION_SEND_BATCH_SIZE) as status_buffer:
+        while sent < settings.SESSION_SEND_BATCH_SIZE:
+            popped = queue.pop(session_id, scheduler.order())
+            if popped is None:
+                drained = True
+                break
+
+            lane, message_id = popped
+            scheduler.record(lane)
+
+            message = Message.objects.select_related('user', 'template').filter(
+                id=message_id,
+                status='pending'
+            ).first()
+            if not message:
+                done.append(popped)
+                continue
+
+            try:
+                message_service.deliver_queued_message(message, session, status_buffer)
+            except SessionThrottled as e:
+                # Keep the message first in line and come back when a token is available
+                queue.requeue(session_id, message_id, lane)
+                countdown = e.retry_after
+                break
+            except Exception as e:
+                # Left unacknowledged if its status could not be written, so it is reclaimed
+                logger.error(f'Error delivering queued message {message_id} via {session_id}: {e}')
+            else:
+                done.append(popped)
+            sent += 1
+
+    # Statuses are written now; rows that failed to write stay unacknowledged
+    queue.ack_many(session_id, [
+        (lane, message_id) for lane, message_id in done if message_id not in status_buffer.unwritten
+    ])
+
+    if drained:
+        queue.release_sender(session_id, sender_token)
+        # Messages pushed while releasing would otherwise wait for kick_outbound_queues
+        if queue.length(session_id):
+            drain_session_queue.delay(session_id)
+        return
+
+    drain_session_queue.apply_async(
+        (session_id, sender_token, scheduler.credits),
+        countdown=countdown
+    )
+
+
+@shared_task
+def kick_outbound_queues():
+    """
+    Put messages popped by senders that died before writing their status
+    back at the head of their lane, and restart senders for non-empty
+    session queues that have none (e.g. after a worker was killed mid-drain)
+    Runs every minute
+    """
+    if not OutboundQueue.is_enabled():
+        return 'Outbound queues disabled'
+
+    queue = OutboundQueue()
+    reclaimed = 0
+    kicked = 0
+
+    for session_id in WhatsAppSession.objects.values_list('session_id', flat=True):
+        stalled = queue.stalled(session_id, settings.SESSION_OUTBOUND_ACK_TIMEOUT)
+        if stalled:
+            pending = set(Message.objects.filter(
+                id__in=[message_id for _, message_id in stalled],
+                status='pending'
+            ).values_list('id', flat=True))
+            for lane, message_id in stalled:
+                if message_id in pending:
+                    queue.requeue(session_id, message_id, lane)
+                    reclaimed += 1
+                else:
+                    queue.ack(session_id, message_id, lane)
+
+        if queue.length(session_id) and not queue.has_sender(session_id):
+            drain_session_queue.delay(session_id)
+            kicked += 1
+
+    if reclaimed:
+        logger.warning(f'Reclaimed {reclaimed} unacknowledged outbound queue messages')
+    if kicked:
+        logger.info(f'Restarted {kicked} outbound queue senders')
+
+    return f'Reclaimed {reclaimed} messages, restarted {kicked} outbound queue senders'
+
+
+@shared_task(ignore_result=True, acks_late=True, reject_on_worker_lost=True)
+def send_bulk_chunk(message_ids, session_pk):
+    """
+    Deliver a chunk of a bulk batch, preferring the session it was assigned to
+    The task is acknowledged only after its buffered statuses are written,
+    so a chunk whose worker dies is delivered again; messages already sent
+    are deduplicated by the Node.js service's idempotency keys
+    Runs on the dedicated send workers (queue: messages)
+    """
+    messages = list(Message.objects.select_related('user', 'template').filter(
+        id__in=message_ids,
+        status='pending'
+    ).order_by('id'))
+
+    if not messages:
+        return
+
+    message_service = MessageService()
+    session = next(
+        (s for s in message_service.session_pool.get_available_sessions(messages[0].user) if s.id == session_pk),
+        None
+    )
+
+    sent = 0
+    with StatusWriteBuffer() as status_buffer:
+        for message in messages:
+            try:
+                result = message_service.deliver_message(
+                    message,
+                    preferred_session=session,
+                    status_buffer=status_buffer
+                )
+                if result.get('success'):
+                    sent += 1
+            except Exception as e:
+                # deliver_message already marked the row as failed
+                logger.error(f'Error delivering bulk message {message.id}: {e}')
+
+    logger.info(f'Bulk chunk delivered {sent}/{len(messages)} messages (preferred session {session_pk})')
+
+
+@shared_task
+def dispatch_scheduled_messages():
+    """
+    Hand due scheduled messages to the send workers in batches
+    Runs every 30 seconds; several dispatchers can run at once
+    """
+    batch_size = settings.SCHEDULED_DISPATCH_BATCH_SIZE
+    message_service = MessageService()
+    total = 0
+
+    # Bounded so one run cannot overlap the next beat tick indefinitely
+    for _ in range(settings.SCHEDULED_DISPATCH_MAX_BATCHES):
+        dispatched = message_service.dispatch_due_messages(batch_size)
+        total += dispatched
+        if dispatched < batch_size:
+            break
+
+    if total > 0:
+        logger.info(f'Dispatched {total} scheduled messages')
+
+    return f'Dispatched {total} scheduled messages'
+
+
+@shared_task
+def import_recipients(import_id):
+    """
+    Stream an uploaded recipient file into its campaign
+    The file is removed from storage once the import finishes
+    """
+    try:
+        recipient_import = RecipientImport.objects.select_related('campaign__user').get(
+            id=import_id,
+            status='pending'
+        )
+    except RecipientImport.DoesNotExist:
+        return f'Recipient import {import_id} not found or already processed'
+
+    recipient_import.status = 'processing'
+    recipient_import.save(update_fields=['status'])
+
+    def save_progress(stats):
+        RecipientImport.objects.filter(id=import_id).update(
+            rows_read=stats['rows_read'],
+            rows_invalid=stats['rows_invalid']
+        )
+
+    message_service = MessageService()
+
+    try:
+        with default_storage.open(recipient_import.file_path, 'rb') as stream:
+            stats = message_service.import_recipients(
+                recipient_import.campaign,
+                stream,
+                recipient_import.file_format,
+                recipient_import.send_at,
+                recipient_import.default_message,
+                on_progress=save_progress
+            )
+        recipient_import.status = 'completed'
+        recipient_import.rows_read = stats['rows_read']
+        recipient_import.rows_imported = stats['rows_imported']
+        recipient_import.rows_invalid = stats['rows_invalid']
+    except Exception as e:
+        logger.error(f'Recipient import {import_id} failed: {e}')
+        recipient_import.refresh_from_db(fields=['rows_read', 'rows_invalid'])
+        recipient_import.rows_imported = recipient_import.campaign.scheduled_messages.count()
+        recipient_import.status = 'failed'
+        recipient_import.error_message = str(e)
+    finally:
+        try:
+            default_storage.delete(recipient_import.file_path)
+        except Exception as e:
+            logger.warning(f'Could not delete import file {recipient_import.file_path}: {e}')
+
+    recipient_import.completed_at = timezone.now()
+    recipient_import.save()
+
+    return (
+        f'Recipient import {import_id} {recipient_import.status}: '
+        f'{recipient_import.rows_imported} imported, {recipient_import.rows_invalid} invalid'
+    )
+
+
+@shared_task
+def retry_failed_messages():
+    """
+    Requeue messages whose retry backoff has elapsed
+    Runs every 15 seconds; several dispatchers can run at once
+    """
+    batch_size = settings.MESSAGE_RETRY_BATCH_SIZE
+    message_service = MessageService()
+    total = 0
+
+    # Bounded so one run cannot overlap the next beat tick indefinitely
+    for _ in range(settings.SCHEDULED_DISPATCH_MAX_BATCHES):
+        requeued = message_service.dispatch_due_retries(batch_size)
+        total += requeued
+        if requeued < batch_size:
+            break
+
+    if total > 0:
+        logger.info(f'Requeued {total} messages for retry')
+
+    return f'Requeued {total} messages for retry'
+
+
+@shared_task
+def create_message_partitions():
+    """
+    Create the monthly messages partitions ahead of time (PostgreSQL only)
+    Runs daily so inserts never fall back to the default partition
+    """
+    if not partitions.is_partitioned():
+        return 'Messages table is not partitioned'
+
+    created = partitions.ensure_partitions(settings.MESSAGE_PARTITION_MONTHS_AHEAD)
+
+    stray = partitions.default_partition_rows()
+    if stray:
+        logger.warning(f'{stray} messages are in {partitions.DEFAULT_PARTITION}; create partitions further ahead')
+
+    return f'Created {len(created)} message partitions'
+
+
+@shared_task
+def export_messages(export_id):
+    """
+    Write a message history export to storage
+    The file is streamed to a temporary file first, so memory use is
+    constant however many messages are exported
+    """
+    try:
+        export = MessageExport.objects.select_related('user').get(id=export_id, status='pending')
+    except MessageExport.DoesNotExist:
+        return f'Message export {export_id} not found or already processed'
+
+    export.status = 'processing'
+    export.save(update_fields=['status'])
+
+    queryset = filter_messages(Message.objects.filter(user=export.user), export.filters)
+    stats = {'rows_exported': 0}
+
+    try:
+        with tempfile.TemporaryFile() as tmp:
+            for chunk in exporting.export_messages(queryset, export.file_format, export.compress, stats):
+                tmp.write(chunk)
+            tmp.seek(0)
+
+            filename = exporting.export_filename(export.file_format, export.compress, stem=f'messages-{export.id}')
+            export.file_path = default_storage.save(f'message_exports/{export.user_id}/{filename}', File(tmp))
+        export.status = 'completed'
+    except Exception as e:
+        logger.error(f'Message export {export_id} failed: {e}')
+        export.status = 'failed'
+        export.error_message = str(e)
+
+    export.rows_exported = stats['rows_exported']
+    export.completed_at = timezone.now()
+    export.save()
+
+    return f'Message export {export_id} {export.status}: {export.rows_exported} messages'
+
+
+@shared_task
+def cleanup_message_exports():
+    """Delete export files older than MESSAGE_EXPORT_RETENTION_DAYS"""
+    cutoff = timezone.now() - timedelta(days=settings.MESSAGE_EXPORT_RETENTION_DAYS)
+    expired = MessageExport.objects.filter(created_at__lt=cutoff)
+
+    for export in expired.exclude(file_path=''):
+        try:
+            default_storage.delete(export.file_path)
+        except Exception as e:
+            logger.warning(f'Could not delete export file {export.file_path}: {e}')
+
+    deleted, _ = expired.delete()
+    return f'Deleted {deleted} expired message exports'
+
+
+@shared_task(ignore_result=True)
+def ingest_inbound_messages(events):
+    """Store one webhook batch of inbound messages with a single bulk insert"""
+    stats = ingest_inbound_events(events)
+
+    if stats['skipped']:
+        logger.warning(f"Skipped {stats['skipped']} of {stats['received']} inbound events")
+    logger.debug(f"Stored {stats['stored']} inbound messages")
+
+
+@shared_task
+def optimise_media(media_id):
+    """
+    Compute the optimised derivative of a stored image or video
+    Queued when a new file is stored; sends use the original until it exists
+    """
+    media = MediaObject.objects.filter(id=media_id).first()
+    if not media:
+        return f'Media {media_id} not found'
+
+    derivative = create_derivative(media)
+    if not derivative:
+        return f'Media {media_id} has no optimisation preset'
+
+    return f'Media {media_id} {derivative.preset}: {media.size} -> {derivative.size} bytes'
@@ -0,0 +1,52 @@
+"""
+Message template compilation and rendering
+"""
+import re
+from functools import lru_cache
+
+PLACEHOLDER_RE = re.compile(r'\{\{\s*([A-Za-z_][A-Za-z0-9_]*)\s*\}\}')
+
+
+class CompiledTemplate:
+    """
+    Template body pre-split into literal chunks and variable slots
+
+    Rendering is a single join over the chunks, so personalising thousands
+    of messages does no parsing or regex work per message.
+    """
+
+    __slots__ = ('variables', '_literals', '_slots')
+
+    def __init__(self, body):
+        literals = []
+        slots = []
+        variables = []
+        position = 0
+
+        for match in PLACEHOLDER_RE.finditer(body):
+            literals.append(body[position:match.start()])
+            name = match.group(1)
+            if name not in variables:
+                variables.append(name)
+            slots.append(variables.index(name))
+            position = match.end()
+
+        literals.append(body[position:])
+
+        self.variables = tuple(variables)
+        self._literals = tuple(literals)
+        self._slots = tuple(slots)
+
+    def render(self, values):
+        """Render with values given in the order of self.variables"""
+        parts = [self._literals[0]]
+        for slot, literal in zip(self._slots, self._literals[1:]):
+            parts.append(str(values[slot]))
+            parts.append(literal)
+        return ''.join(parts)
+
+
+@lru_cache(maxsize=1024)
+def compile_template(body):
+    """Compile a template body once per process"""
+    return CompiledTemplate(body)
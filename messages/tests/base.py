@@ -0,0 +1,66 @@
+"""
+Shared fixtures for the messages API tests
+"""
+from unittest import mock
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from core.exceptions import WhatsAppServiceError
+from sessions.models import WhatsAppSession
+from users.models import User
+
+
+@override_settings(
+    USE_REDIS=False,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class MessagingTestCase(TestCase):
+    """
+    An authenticated API client for a user with two connected sessions
+
+    Calls to the Node.js service are replaced by self.send_text and
+    self.send_media mocks, which report success unless a test changes them.
+    """
+
+    def setUp(self):
+        # Idempotency records, quotas and cached session lists live in the cache
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+        self.user = User.objects.create_user('sender', password='secret')
+        self.sessions = [
+            WhatsAppSession.objects.create(
+                user=self.user, session_id=f'session-{i}', instance_name=f'Instance {i}', status='connected'
+            )
+            for i in range(2)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        self.send_text = self._patch('send_text_message')
+        self.send_media = self._patch('send_media_message')
+
+    def _patch(self, method):
+        patcher = mock.patch(f'sessions.services.WhatsAppService.{method}', autospec=True)
+        send = patcher.start()
+        self.addCleanup(patcher.stop)
+        self._succeed(send)
+        return send
+
+    @staticmethod
+    def _succeed(send):
+        send.side_effect = lambda *args, **kwargs: {
+            'success': True, 'messageId': f'wamid.{send.call_count}', 'timestamp': 1
+        }
+
+    def succeed_sends(self):
+        """Make every send succeed again"""
+        for send in (self.send_text, self.send_media):
+            self._succeed(send)
+
+    def fail_sends(self, error='Session not ready', code='SESSION_NOT_READY', http_status=503):
+        """Make every send fail as the Node.js service reports it (transient by default)"""
+        def fail(*args, **kwargs):
+            raise WhatsAppServiceError(f'WhatsApp service error: {error}', error_code=code, http_status=http_status)
+        for send in (self.send_text, self.send_media):
+            send.side_effect = fail
@@ -0,0 +1,44 @@
+"""
+Message history exports
+"""
+import csv
+import io
+import json
+from messages.models import Message, MessageTemplate
+from .base import MessagingTestCase
+
+
+class MessageExportTests(MessagingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        template = MessageTemplate.objects.create(
+            user=self.user, name='Shipping', body='Hi {{name}}, order {{order}} has shipped'
+        )
+        self.plain = Message.objects.create(
+            user=self.user, recipient='+254700000001', content='Plain text', status='sent'
+        )
+        self.templated = Message.objects.create(
+            user=self.user, recipient='+254700000002', template=template,
+            template_variables=['Amina', 'A-17'], status='sent'
+        )
+
+    def export(self, file_format):
+        response = self.client.get('/api/v1/messages/export/', {'file_format': file_format})
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_contains_the_text_sent_for_template_messages(self):
+        rows = list(csv.DictReader(io.StringIO(self.export('csv'))))
+
+        self.assertEqual([row['content'] for row in rows], ['Plain text', 'Hi Amina, order A-17 has shipped'])
+        self.assertEqual(rows[1]['template_name'], 'Shipping')
+        self.assertEqual(json.loads(rows[1]['template_variables']), ['Amina', 'A-17'])
+        self.assertEqual(rows[0]['template_variables'], '')
+
+    def test_ndjson_contains_the_text_sent_for_template_messages(self):
+        rows = [json.loads(line) for line in self.export('ndjson').splitlines()]
+
+        self.assertEqual(rows[1]['content'], 'Hi Amina, order A-17 has shipped')
+        self.assertEqual(rows[1]['template_variables'], ['Amina', 'A-17'])
+        self.assertIsNone(rows[0]['template_variables'])
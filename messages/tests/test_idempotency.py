@@ -0,0 +1,61 @@
+"""
+Idempotency-Key handling of the send endpoints
+"""
+from django.core.cache import cache
+from core.idempotency import _cache_key
+from messages.models import Message
+from .base import MessagingTestCase
+
+
+class IdempotencyKeyTests(MessagingTestCase):
+    url = '/api/v1/messages/send-text/'
+    payload = {'recipient': '+254700000001', 'message': 'Your order has shipped'}
+
+    def post(self, payload=None, key='order-42'):
+        return self.client.post(self.url, payload or self.payload, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_replay_returns_stored_response_without_sending_again(self):
+        first = self.post()
+        second = self.post()
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(self.send_text.call_count, 1)
+        self.assertEqual(Message.objects.count(), 1)
+
+    def test_key_reused_for_different_request_is_rejected(self):
+        self.post()
+        response = self.post({**self.payload, 'message': 'Something else'})
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.data['error_code'], 'IDEMPOTENCY_KEY_REUSED')
+        self.assertEqual(self.send_text.call_count, 1)
+
+    def test_key_still_in_progress_conflicts(self):
+        cache.add(_cache_key(self.user.id, 'order-42'), {'state': 'in_progress', 'fingerprint': 'x'})
+
+        response = self.post()
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['error_code'], 'IDEMPOTENCY_KEY_IN_USE')
+        self.send_text.assert_not_called()
+
+    def test_keys_are_scoped_per_user(self):
+        self.post()
+        other = type(self.user).objects.create_user('other', password='secret')
+        self.sessions[0].user = other
+        self.sessions[0].save()
+        self.client.force_authenticate(other)
+
+        response = self.post()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(self.send_text.call_count, 2)
+
+    def test_bridge_receives_key_scoped_to_user(self):
+        self.post()
+
+        self.assertEqual(self.send_text.call_args.kwargs['idempotency_key'], f'{self.user.id}:order-42')
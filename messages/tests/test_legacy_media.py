@@ -0,0 +1,50 @@
+"""
+Redirects of pre-content-addressing /media/ URLs
+"""
+import shutil
+import tempfile
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import override_settings
+from messages.models import Message
+from .base import MessagingTestCase
+
+
+@override_settings(MEDIA_LEGACY_URLS_ENABLED=True)
+class LegacyMediaTests(MessagingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.path = default_storage.save(f'whatsapp_media/{self.user.id}/photo.jpg', ContentFile(b'\xff\xd8\xff'))
+        Message.objects.create(user=self.user, recipient='+254700000001', message_type='image', content=self.path)
+        self.client.force_authenticate(None)
+
+    def test_message_media_redirects_to_a_signed_link(self):
+        response = self.client.get(f'/media/{self.path}')
+
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(f'/api/v1/media/files/{self.path}?', response['Location'])
+
+    def test_files_no_message_references_are_not_found(self):
+        export = default_storage.save(f'message_exports/{self.user.id}/messages-1.csv', ContentFile(b'id\n'))
+        unsent = default_storage.save(f'whatsapp_media/{self.user.id}/other.jpg', ContentFile(b'\xff\xd8\xff'))
+
+        for path in (export, unsent):
+            self.assertEqual(self.client.get(f'/media/{path}').status_code, 404)
+
+    def test_paths_under_another_user_are_not_found(self):
+        other = self.user.id + 1
+        path = default_storage.save(f'whatsapp_media/{other}/photo.jpg', ContentFile(b'\xff\xd8\xff'))
+        Message.objects.filter(content=self.path).update(content=path)
+
+        self.assertEqual(self.client.get(f'/media/{path}').status_code, 404)
+
+    @override_settings(MEDIA_LEGACY_URLS_ENABLED=False)
+    def test_disabled(self):
+        self.assertEqual(self.client.get(f'/media/{self.path}').status_code, 404)
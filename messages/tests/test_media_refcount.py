@@ -0,0 +1,141 @@
+"""
+Reference counting of stored media across uploads, sends, deletes and retention
+"""
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import override_settings
+from django.utils import timezone
+from messages.media_store import release_media
+from messages.models import MediaObject, Message
+from messages.retention import purge_expired_messages
+from .base import MessagingTestCase
+
+PDF = b'%PDF-1.4\n% invoice\n' + b'0' * 256
+
+
+class MediaRefcountTests(MessagingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, content=PDF, name='invoice.pdf'):
+        response = self.client.post(
+            '/api/v1/media/',
+            {'file': ContentFile(content, name=name), 'media_type': 'document'},
+            format='multipart'
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data['data']['media_id']
+
+    def send(self, media_id, recipient='+254700000001'):
+        response = self.client.post(
+            '/api/v1/messages/send-media/',
+            {'recipient': recipient, 'media_id': media_id},
+            format='multipart'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+
+    def purge_all(self):
+        # Files are deleted once the purge's transactions commit
+        with self.captureOnCommitCallbacks(execute=True):
+            return purge_expired_messages(timezone.now() + timedelta(seconds=1))
+
+    def test_identical_uploads_share_one_file(self):
+        self.upload()
+        self.upload(name='copy.pdf')
+
+        media = MediaObject.objects.get()
+        self.assertEqual(media.ref_count, 2)
+        self.assertTrue(default_storage.exists(media.file_path))
+
+    def test_each_sent_message_holds_a_reference(self):
+        media_id = self.upload()
+        self.send(media_id)
+        self.send(media_id, recipient='+254700000002')
+
+        media = MediaObject.objects.get()
+        self.assertEqual(media.ref_count, 3)
+        self.assertEqual(set(Message.objects.values_list('content', flat=True)), {media.file_path})
+
+    def test_deleting_the_upload_keeps_the_file_for_sent_messages(self):
+        media_id = self.upload()
+        self.send(media_id)
+
+        response = self.client.delete(f'/api/v1/media/{media_id}/')
+        self.assertEqual(response.status_code, 204)
+
+        media = MediaObject.objects.get()
+        self.assertEqual(media.ref_count, 1)
+        self.assertTrue(default_storage.exists(media.file_path))
+
+    def test_retention_deletes_the_file_with_its_last_message(self):
+        media_id = self.upload()
+        self.send(media_id)
+        self.send(media_id, recipient='+254700000002')
+        self.client.delete(f'/api/v1/media/{media_id}/')
+        path = MediaObject.objects.get().file_path
+
+        stats = self.purge_all()
+
+        self.assertEqual(stats, {'deleted': 2, 'media_failed': 0})
+        self.assertFalse(MediaObject.objects.exists())
+        self.assertFalse(default_storage.exists(path))
+
+    def test_retention_keeps_files_the_upload_still_references(self):
+        media_id = self.upload()
+        self.send(media_id)
+
+        self.purge_all()
+
+        media = MediaObject.objects.get()
+        self.assertEqual(media.ref_count, 1)
+        self.assertTrue(default_storage.exists(media.file_path))
+
+    def test_release_counts_repeated_paths(self):
+        media_id = self.upload()
+        self.send(media_id)
+        self.send(media_id, recipient='+254700000002')
+        self.send(media_id, recipient='+254700000003')
+        self.client.delete(f'/api/v1/media/{media_id}/')
+        path = MediaObject.objects.get().file_path
+
+        release_media([path, path])
+        self.assertEqual(MediaObject.objects.get().ref_count, 1)
+
+        release_media([path])
+        self.assertFalse(MediaObject.objects.exists())
+        self.assertFalse(default_storage.exists(path))
+
+    def test_release_deletes_legacy_paths_directly(self):
+        path = default_storage.save('whatsapp_media/legacy.pdf', ContentFile(PDF))
+
+        self.assertEqual(release_media([path]), 0)
+        self.assertFalse(default_storage.exists(path))
+        self.assertFalse(os.path.exists(default_storage.path(path)))
+
+    def test_retention_releases_references_with_the_deleted_rows(self):
+        media_id = self.upload()
+        self.send(media_id)
+        self.client.delete(f'/api/v1/media/{media_id}/')
+        path = MediaObject.objects.get().file_path
+
+        # Nothing is released if the purge fails before its deletes commit
+        with mock.patch('messages.retention.ScheduledMessage.objects.filter', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.purge_all()
+        self.assertEqual(Message.objects.count(), 1)
+        self.assertEqual(MediaObject.objects.get().ref_count, 1)
+
+        self.purge_all()
+        self.assertFalse(MediaObject.objects.exists())
+        self.assertFalse(default_storage.exists(path))
@@ -0,0 +1,70 @@
+"""
+Cursor pagination of the message list
+"""
+from datetime import timedelta
+from django.utils import timezone
+from messages.models import Message
+from .base import MessagingTestCase
+
+
+class MessageListPaginationTests(MessagingTestCase):
+    url = '/api/v1/messages/list/'
+
+    def create_messages(self, count, sent_at=None, status='sent'):
+        messages = Message.objects.bulk_create([
+            Message(user=self.user, recipient=f'+2547000{i:05d}', content=f'Message {i}', status=status)
+            for i in range(count)
+        ])
+        if sent_at:
+            Message.objects.filter(id__in=[message.id for message in messages]).update(sent_at=sent_at)
+        return messages
+
+    def fetch_all(self, url, on_page=None):
+        """ids of every page following next links, calling on_page after each page"""
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [message['id'] for message in response.data['results']]
+            if on_page:
+                on_page()
+            url = response.data['next']
+        return ids
+
+    def test_pages_cover_every_message_once_newest_first(self):
+        now = timezone.now()
+        older = self.create_messages(7, sent_at=now - timedelta(hours=1))
+        # Identical sent_at values are ordered by id, so ties cannot repeat or vanish across pages
+        newer = self.create_messages(6, sent_at=now)
+
+        ids = self.fetch_all(f'{self.url}?page_size=4')
+
+        expected = [m.id for m in sorted(newer, key=lambda m: -m.id)] + [m.id for m in sorted(older, key=lambda m: -m.id)]
+        self.assertEqual(ids, expected)
+
+    def test_messages_created_while_paging_do_not_shift_pages(self):
+        start = timezone.now() - timedelta(minutes=5)
+        existing = self.create_messages(10)
+        for i, message in enumerate(existing):
+            Message.objects.filter(id=message.id).update(sent_at=start + timedelta(seconds=i))
+
+        ids = self.fetch_all(f'{self.url}?page_size=3', on_page=lambda: self.create_messages(2))
+
+        self.assertEqual(sorted(ids), sorted(m.id for m in existing))
+        self.assertEqual(len(ids), len(set(ids)))
+
+    def test_filters_apply_to_every_page(self):
+        self.create_messages(5, status='failed')
+        sent = self.create_messages(5)
+
+        ids = self.fetch_all(f'{self.url}?page_size=2&status=sent')
+
+        self.assertEqual(sorted(ids), sorted(m.id for m in sent))
+
+    def test_page_size_is_capped(self):
+        self.create_messages(120)
+
+        response = self.client.get(f'{self.url}?page_size=1000')
+
+        self.assertEqual(len(response.data['results']), 100)
+        self.assertIsNotNone(response.data['next'])
@@ -0,0 +1,61 @@
+"""
+Receipts that arrive before a message's batched sent status is written
+"""
+from messages.models import Message
+from messages.services import MessageService
+from messages.status_buffer import StatusWriteBuffer
+from .base import MessagingTestCase
+
+
+class HeldReceiptTests(MessagingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.service = MessageService()
+        self.message = Message.objects.create(
+            user=self.user, recipient='+254700000001', content='Hello', status='pending'
+        )
+
+    def mark_sent(self, message, whatsapp_message_id):
+        message.status = 'sent'
+        message.whatsapp_message_id = whatsapp_message_id
+        message.attempt_count = 1
+
+    def test_receipt_is_applied_when_the_buffer_flushes(self):
+        with StatusWriteBuffer(max_size=10) as buffer:
+            self.mark_sent(self.message, 'wamid.early')
+            buffer.add(self.message)
+
+            receipts = [{'message_id': 'wamid.early', 'status': 'delivered', 'timestamp': None}]
+            self.assertEqual(self.service.apply_receipts(receipts), 0)
+
+        self.message.refresh_from_db()
+        self.assertEqual(self.message.status, 'delivered')
+        self.assertIsNotNone(self.message.delivered_at)
+
+    def test_held_receipts_keep_the_furthest_status(self):
+        self.service.apply_receipts([{'message_id': 'wamid.early', 'status': 'read', 'timestamp': None}])
+        self.service.apply_receipts([{'message_id': 'wamid.early', 'status': 'delivered', 'timestamp': None}])
+
+        self.mark_sent(self.message, 'wamid.early')
+        MessageService._save_status(self.message)
+
+        self.message.refresh_from_db()
+        self.assertEqual(self.message.status, 'read')
+
+    def test_held_receipts_are_applied_once(self):
+        self.service.apply_receipts([{'message_id': 'wamid.early', 'status': 'delivered', 'timestamp': None}])
+        self.mark_sent(self.message, 'wamid.early')
+
+        with StatusWriteBuffer() as buffer:
+            buffer.add(self.message)
+        self.message.refresh_from_db()
+        self.assertEqual(self.message.status, 'delivered')
+
+        # A later write of the same message finds nothing held
+        Message.objects.filter(id=self.message.id).update(status='sent', delivered_at=None)
+        self.message.refresh_from_db()
+        with StatusWriteBuffer() as buffer:
+            buffer.add(self.message)
+        self.message.refresh_from_db()
+        self.assertEqual(self.message.status, 'sent')
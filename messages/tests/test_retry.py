@@ -0,0 +1,159 @@
+"""
+Retry of transient send failures, dead letters and their replay
+"""
+from datetime import timedelta
+from unittest import mock
+import requests
+from django.test import override_settings
+from django.utils import timezone
+from messages.models import DeadLetterMessage, Message
+from messages.retry import is_transient_error
+from messages.services import MessageService
+from messages.tasks import send_bulk_chunk
+from sessions.circuit_breaker import SessionCircuitBreaker
+from sessions.services import WhatsAppService
+from .base import MessagingTestCase
+
+
+@override_settings(MESSAGE_RETRY_MAX_ATTEMPTS=3)
+class RetryDeadLetterTests(MessagingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Run chunk tasks inline instead of on a Celery worker
+        patcher = mock.patch.object(
+            send_bulk_chunk, 'apply_async',
+            side_effect=lambda args, **kwargs: send_bulk_chunk(*args)
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def send(self):
+        return self.client.post(
+            '/api/v1/messages/send-text/',
+            {'recipient': '+254700000001', 'message': 'Your code is 1234'},
+            format='json'
+        )
+
+    def status_of(self, message_id):
+        return self.client.get(f'/api/v1/messages/status/{message_id}/').data['data']
+
+    def retry_due(self):
+        """Make every scheduled retry due and dispatch it"""
+        Message.objects.filter(status='retrying').update(next_retry_at=timezone.now() - timedelta(seconds=1))
+        with self.captureOnCommitCallbacks(execute=True):
+            return MessageService().dispatch_due_retries(100)
+
+    def test_transient_failure_is_accepted_and_scheduled(self):
+        self.fail_sends()
+
+        response = self.send()
+
+        self.assertEqual(response.status_code, 202)
+        message = self.status_of(response.data['data']['dbId'])
+        self.assertEqual(message['status'], 'retrying')
+        self.assertEqual(message['attempt_count'], 1)
+        self.assertIsNotNone(message['next_retry_at'])
+
+    def test_permanent_failure_is_not_retried(self):
+        self.fail_sends('Invalid recipient number', code='SEND_FAILED', http_status=422)
+
+        response = self.send()
+
+        self.assertEqual(response.status_code, 400)
+        message = Message.objects.get()
+        self.assertEqual(message.status, 'failed')
+        self.assertFalse(DeadLetterMessage.objects.exists())
+
+    def test_exhausted_retries_go_to_dead_letters_and_replay_delivers(self):
+        self.fail_sends()
+        message_id = self.send().data['data']['dbId']
+
+        self.assertEqual(self.retry_due(), 1)
+        self.assertEqual(self.status_of(message_id)['status'], 'retrying')
+        self.assertEqual(self.retry_due(), 1)
+
+        message = self.status_of(message_id)
+        self.assertEqual(message['status'], 'failed')
+        self.assertEqual(message['attempt_count'], 3)
+        dead_letter = DeadLetterMessage.objects.get(message_id=message_id)
+        self.assertEqual(dead_letter.attempt_count, 3)
+        self.assertIsNone(dead_letter.replayed_at)
+        self.assertEqual(self.retry_due(), 0)
+
+        self.succeed_sends()
+        with self.captureOnCommitCallbacks(execute=True):
+            replayed = MessageService().replay_dead_letters(DeadLetterMessage.objects.all())
+
+        self.assertEqual(replayed, 1)
+        message = self.status_of(message_id)
+        self.assertEqual(message['status'], 'sent')
+        self.assertEqual(message['attempt_count'], 1)
+        dead_letter.refresh_from_db()
+        self.assertIsNotNone(dead_letter.replayed_at)
+
+        # A replayed dead letter is not replayed twice
+        self.assertEqual(MessageService().replay_dead_letters(DeadLetterMessage.objects.all()), 0)
+
+
+class FailureClassificationTests(MessagingTestCase):
+    """Retries and circuit breakers go by the Node.js service's error code, not its message"""
+
+    def setUp(self):
+        super().setUp()
+        self.record_failure = self._patch_breaker('record_failure')
+        self.record_success = self._patch_breaker('record_success')
+
+    def _patch_breaker(self, method):
+        patcher = mock.patch.object(SessionCircuitBreaker, method)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def send(self):
+        return self.client.post(
+            '/api/v1/messages/send-text/',
+            {'recipient': '+254700000001', 'message': 'Your code is 1234'},
+            format='json'
+        )
+
+    def test_rejected_message_is_permanent_whatever_its_text(self):
+        self.fail_sends('Recipient timeout: number not on WhatsApp', code='SEND_FAILED', http_status=422)
+
+        self.assertEqual(self.send().status_code, 400)
+
+        self.assertEqual(Message.objects.get().status, 'failed')
+        self.record_failure.assert_not_called()
+        self.assertEqual(self.record_success.call_count, 2)
+
+    def test_session_errors_count_against_the_breaker(self):
+        self.fail_sends('Client session closed. Please reconnect the session.', code='SESSION_CLOSED')
+
+        self.assertEqual(self.send().status_code, 202)
+
+        self.assertEqual(Message.objects.get().status, 'retrying')
+        self.assertEqual(self.record_failure.call_count, 2)
+        self.record_success.assert_not_called()
+
+    def response(self, status_code, body, content_type='application/json'):
+        response = requests.Response()
+        response.status_code = status_code
+        response._content = body.encode()
+        response.headers['Content-Type'] = content_type
+        return response
+
+    def test_service_error_carries_code_and_status(self):
+        error = WhatsAppService._service_error(self.response(
+            503, '{"success": false, "code": "SESSION_NOT_READY", "message": "Client not ready"}'
+        ))
+
+        self.assertEqual((error.error_code, error.http_status), ('SESSION_NOT_READY', 503))
+        self.assertEqual(str(error), 'WhatsApp service error: Client not ready')
+        self.assertTrue(is_transient_error(error))
+
+    def test_error_without_code_is_classified_by_status(self):
+        gateway = WhatsAppService._service_error(self.response(502, '<html>Bad Gateway</html>', 'text/html'))
+        rejected = WhatsAppService._service_error(self.response(400, '{"success": false, "error": "bad"}'))
+
+        self.assertIsNone(gateway.error_code)
+        self.assertTrue(is_transient_error(gateway))
+        self.assertFalse(is_transient_error(rejected))
@@ -0,0 +1,70 @@
+"""
+Scheduling text messages: recipient deduplication and the daily quota
+"""
+import io
+from datetime import timedelta
+from django.core.cache import cache
+from django.test import override_settings
+from django.utils import timezone
+from messages.models import Campaign, ScheduledMessage
+from messages.services import MessageService
+from .base import MessagingTestCase
+
+
+class ScheduleDuplicateTests(MessagingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.send_at = timezone.now() + timedelta(days=2)
+
+    def schedule(self, recipients, **data):
+        return self.client.post(
+            '/api/v1/messages/schedule/',
+            {'recipients': recipients, 'message': 'Your order ships soon', 'send_at': self.send_at, **data},
+            format='json'
+        )
+
+    def quota_used(self, day):
+        return cache.get(f'rate_limit:daily:{self.user.id}:{day}')
+
+    def test_recipients_in_different_formats_are_scheduled_once(self):
+        response = self.schedule([
+            {'recipient': '+254700000001', 'message': 'First'},
+            {'recipient': '254700000001', 'message': 'Second'},
+            '+254700000002',
+        ])
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['data']['scheduled'], 2)
+        self.assertEqual(
+            dict(ScheduledMessage.objects.values_list('recipient', 'content')),
+            {'+254700000001': 'First', '+254700000002': 'Your order ships soon'}
+        )
+
+    def test_quota_counts_unique_recipients_on_the_send_day(self):
+        self.schedule(['+254700000001', '254700000001', '+254700000002'])
+
+        self.assertEqual(self.quota_used(timezone.localdate(self.send_at)), 2)
+        self.assertIsNone(self.quota_used(timezone.localdate()))
+
+    def test_duplicates_do_not_count_towards_the_limit(self):
+        self.user.max_messages_per_day = 2
+        self.user.save()
+
+        response = self.schedule(['+254700000001', '00254700000001', '+254700000002'])
+        self.assertEqual(response.status_code, 201, response.data)
+
+        response = self.schedule(['+254700000003'])
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(self.quota_used(timezone.localdate(self.send_at)), 2)
+
+    @override_settings(RECIPIENT_IMPORT_CHUNK_SIZE=2)
+    def test_import_counts_recipients_new_to_the_campaign_on_the_send_day(self):
+        campaign = Campaign.objects.create(user=self.user, name='Import')
+        rows = b'recipient\n+254700000001\n254700000002\n00254700000001\n+254700000003\n'
+
+        stats = MessageService().import_recipients(campaign, io.BytesIO(rows), 'csv', self.send_at, 'Hello')
+
+        self.assertEqual(stats['rows_imported'], 3)
+        self.assertEqual(self.quota_used(timezone.localdate(self.send_at)), 3)
+        self.assertIsNone(self.quota_used(timezone.localdate()))
@@ -0,0 +1,151 @@
+"""
+Streaming handling of media uploads
+
+MediaUploadHandler replaces Django's default upload handlers on the media
+endpoints: every chunk goes straight to a temporary file while it is hashed
+(sha256, reused by the media store) and the type is sniffed from the first
+bytes, so memory per upload stays at one chunk whatever the file size. The
+upload is aborted as soon as it passes the limit of the media_type given in
+the query string or the X-Media-Type header, which are known before the
+body is read; without either, the largest per-type limit applies while
+streaming and the form's media_type is checked once the form has been
+parsed, as the field may arrive after the file.
+"""
+import hashlib
+import logging
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from django.http import JsonResponse
+from django.urls import reverse
+from django.utils.deprecation import MiddlewareMixin
+
+logger = logging.getLogger(__name__)
+
+# Leading bytes of the formats WhatsApp accepts as image or video
+SIGNATURES = [
+    (0, b'\xff\xd8\xff', 'image/jpeg'),
+    (0, b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (0, b'GIF87a', 'image/gif'),
+    (0, b'GIF89a', 'image/gif'),
+    (8, b'WEBP', 'image/webp'),
+    (4, b'ftypqt', 'video/quicktime'),
+    (4, b'ftyp3g', 'video/3gpp'),
+    (4, b'ftyp', 'video/mp4'),
+    (0, b'\x1a\x45\xdf\xa3', 'video/webm'),
+    (0, b'%PDF-', 'application/pdf'),
+]
+
+
+class UploadTooLarge(Exception):
+    """Raised by MediaUploadHandler once an upload passes its size limit"""
+
+
+def sniff_content_type(head, declared=None):
+    """
+    MIME type from a file's first bytes; unrecognised files keep the declared
+    type unless it claims to be an image or video
+    """
+    for offset, signature, content_type in SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            return content_type
+    if declared and not declared.startswith(('image/', 'video/')):
+        return declared
+    return 'application/octet-stream'
+
+
+def max_upload_size(media_type=None):
+    """Size limit in bytes for a media type, or the largest limit"""
+    if media_type:
+        return settings.MEDIA_MAX_UPLOAD_SIZES[media_type]
+    return max(settings.MEDIA_MAX_UPLOAD_SIZES.values())
+
+
+def requested_media_type(request):
+    """media_type announced ahead of the body (query string or X-Media-Type header), if valid"""
+    media_type = request.GET.get('media_type') or request.META.get('HTTP_X_MEDIA_TYPE')
+    if media_type in settings.MEDIA_MAX_UPLOAD_SIZES:
+        return media_type
+    return None
+
+
+def validate_media_upload(file, media_type):
+    """Check an uploaded file against the size limit and content of its media_type"""
+    limit = max_upload_size(media_type)
+    if file.size > limit:
+        raise ValidationError(f'{media_type.capitalize()} files can be at most {limit // (1024 * 1024)} MB.')
+
+    # Any file can go out as a document; images and videos must be what they claim
+    if media_type in ('image', 'video') and not (file.content_type or '').startswith(f'{media_type}/'):
+        raise ValidationError(f'File content is not a supported {media_type} ({file.content_type}).')
+
+
+class MediaUploadHandler(FileUploadHandler):
+    """Write uploads to a temporary file, hashing and sniffing them on the way"""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file = TemporaryUploadedFile(self.file_name, self.content_type, 0, self.charset, self.content_type_extra)
+        self.digest = hashlib.sha256()
+        self.head = b''
+        self.size = 0
+        self.media_type = requested_media_type(self.request)
+        self.limit = max_upload_size(self.media_type)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.size > self.limit:
+            # Closing the temporary file deletes it
+            self.file.close()
+            kind = f'{self.media_type} ' if self.media_type else ''
+            raise UploadTooLarge(f'Uploaded {kind}file exceeds the {self.limit // (1024 * 1024)} MB limit.')
+
+        if len(self.head) < 16:
+            self.head += raw_data[:16]
+        self.digest.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        self.file.seek(0)
+        self.file.size = file_size
+        # Trust the bytes over the client's Content-Type
+        self.file.content_type = sniff_content_type(self.head, self.content_type)
+        self.file.sha256 = self.digest.hexdigest()
+        return self.file
+
+    def upload_interrupted(self):
+        if hasattr(self, 'file'):
+            self.file.close()
+
+
+class MediaUploadMiddleware(MiddlewareMixin):
+    """
+    Parse multipart bodies of the media upload endpoints with MediaUploadHandler
+
+    Must run before any middleware that reads request.POST, which would
+    otherwise parse the upload with Django's default handlers first.
+    """
+
+    UPLOAD_URL_NAMES = ('api_v1:send-media', 'api_v1:media-list')
+
+    def process_request(self, request):
+        if request.method != 'POST' or request.content_type != 'multipart/form-data':
+            return None
+
+        if request.path not in {reverse(name) for name in self.UPLOAD_URL_NAMES}:
+            return None
+
+        request.upload_handlers = [MediaUploadHandler(request)]
+        try:
+            # Parse here so an oversized upload is answered before any view runs
+            request.POST
+        except UploadTooLarge as e:
+            logger.warning(f'Rejected upload to {request.path}: {e}')
+            return JsonResponse({
+                'success': False,
+                'message': str(e),
+                'error_code': 'UPLOAD_TOO_LARGE'
+            }, status=413)
+
+        return None
@@ -21,6 +21,9 @@ class WhatsAppSessionAdmin(ModelAdmin):
         ('Session Info', {
             'fields': ['session_id', 'status', 'phone_number']
         }),
+        ('Rate Limit', {
+            'fields': ['send_rate_per_minute', 'send_burst']
+        }),
         ('QR Code', {
             'fields': ['qr_code'],
             'classes': ['collapse']
@@ -42,8 +45,18 @@ class WhatsAppSessionAdmin(ModelAdmin):
         label, color = status_map.get(obj.status, ('Unknown', 'info'))
         return label, color
     
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Pool selection reads rate limits from the cached session list
+        from sessions.session_pool import SessionPoolService
+        SessionPoolService.invalidate_user_sessions_cache(obj.user_id)
+    
     def disconnect_sessions(self, request, queryset):
+        from sessions.session_pool import SessionPoolService
+        user_ids = set(queryset.values_list('user_id', flat=True))
         queryset.update(status='disconnected')
+        for user_id in user_ids:
+            SessionPoolService.invalidate_user_sessions_cache(user_id)
         self.message_user(request, f'{queryset.count()} sessions disconnected.')
     disconnect_sessions.short_description = 'Disconnect selected sessions'
 
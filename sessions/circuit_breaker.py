@@ -0,0 +1,190 @@
+"""
+Per-session circuit breakers for message sending
+
+A session whose sends keep failing with session-level errors (see
+messages.retry.SESSION_ERROR_CODES: the Node.js service's session codes,
+its timeouts and 5xx answers) is taken out of rotation for a cooldown
+instead of every request paying for a failed first attempt on it:
+
+- closed: the session is used; failures are counted in a fixed window
+- open: SESSION_BREAKER_FAILURE_THRESHOLD failures within
+  SESSION_BREAKER_WINDOW seconds trip the breaker and the session is
+  skipped for SESSION_BREAKER_COOLDOWN seconds
+- half-open: after the cooldown a single send is let through as a probe;
+  success closes the breaker, failure opens it for another cooldown
+
+The session's status is left alone: a breaker only reflects recent sends,
+while the status is owned by the Node.js service webhooks and status checks.
+"""
+import logging
+import time
+from typing import Iterable, List, Tuple
+from django.conf import settings
+from sessions.models import WhatsAppSession
+
+logger = logging.getLogger(__name__)
+
+# Returns 1 if this failure opened (or re-opened) the breaker
+FAILURE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local open_until = tonumber(redis.call('get', KEYS[2]))
+if open_until then
+    if now < open_until then
+        return 0
+    end
+    -- A failed probe: open for another cooldown
+    redis.call('set', KEYS[2], now + tonumber(ARGV[4]), 'EX', ARGV[5])
+    redis.call('del', KEYS[3])
+    return 1
+end
+local failures = redis.call('incr', KEYS[1])
+if failures == 1 then
+    redis.call('expire', KEYS[1], ARGV[2])
+end
+if failures >= tonumber(ARGV[3]) then
+    redis.call('set', KEYS[2], now + tonumber(ARGV[4]), 'EX', ARGV[5])
+    redis.call('del', KEYS[1])
+    return 1
+end
+return 0
+"""
+
+# Returns 1 if this success closed an open breaker
+SUCCESS_SCRIPT = """
+if redis.call('exists', KEYS[2]) == 1 then
+    redis.call('del', KEYS[1], KEYS[2], KEYS[3])
+    return 1
+end
+return 0
+"""
+
+# How long an open breaker outlives its cooldown without a probe before it is forgotten
+OPEN_STATE_TTL = 24 * 60 * 60
+
+
+class SessionCircuitBreaker:
+    """
+    Redis-backed closed/open/half-open state per WhatsApp session
+
+    Redis errors never block a send: every session is then treated as closed.
+    """
+
+    FAILURES_KEY = 'sessions:breaker:{session_id}:failures'
+    OPEN_KEY = 'sessions:breaker:{session_id}:open_until'
+    PROBE_KEY = 'sessions:breaker:{session_id}:probe'
+
+    def __init__(self):
+        self.redis = None
+        if self.is_enabled():
+            from django_redis import get_redis_connection
+            try:
+                self.redis = get_redis_connection('default')
+            except Exception as e:
+                logger.warning(f'Session circuit breakers unavailable: {e}')
+                return
+            self._failure = self.redis.register_script(FAILURE_SCRIPT)
+            self._success = self.redis.register_script(SUCCESS_SCRIPT)
+
+    @staticmethod
+    def is_enabled() -> bool:
+        """Circuit breakers need a real Redis backend"""
+        return settings.USE_REDIS and settings.SESSION_BREAKER_ENABLED
+
+    def _keys(self, session_id):
+        return [
+            self.FAILURES_KEY.format(session_id=session_id),
+            self.OPEN_KEY.format(session_id=session_id),
+            self.PROBE_KEY.format(session_id=session_id),
+        ]
+
+    def available(self, sessions: Iterable[WhatsAppSession],
+                  probe: bool = True) -> Tuple[List[WhatsAppSession], List[WhatsAppSession]]:
+        """
+        Split sessions into those with a closed breaker and those this
+        caller may probe (cooldown over and the probe claimed, unless probe
+        is False); sessions still cooling down are left out
+
+        Returns:
+            (closed sessions, sessions to probe)
+        """
+        sessions = list(sessions)
+        if not self.redis or not sessions:
+            return sessions, []
+
+        try:
+            open_until = self.redis.mget([self._keys(session.session_id)[1] for session in sessions])
+        except Exception as e:
+            logger.warning(f'Could not read session circuit breakers: {e}')
+            return sessions, []
+
+        now = time.time()
+        closed, probes = [], []
+        for session, until in zip(sessions, open_until):
+            if until is None:
+                closed.append(session)
+            elif probe and now >= float(until) and self._claim_probe(session.session_id):
+                probes.append(session)
+        return closed, probes
+
+    def _claim_probe(self, session_id) -> bool:
+        """Let one sender probe a half-open session; the claim expires if the probe never reports"""
+        try:
+            return bool(self.redis.set(
+                self._keys(session_id)[2], 1,
+                nx=True, ex=settings.SESSION_BREAKER_PROBE_TIMEOUT
+            ))
+        except Exception as e:
+            logger.warning(f'Could not claim circuit breaker probe for session {session_id}: {e}')
+            return False
+
+    def record_success(self, session_id):
+        """A send reached WhatsApp through the session; closes a half-open breaker"""
+        if not self.redis:
+            return
+
+        try:
+            if self._success(keys=self._keys(session_id)):
+                logger.info(f'Circuit breaker for session {session_id} closed')
+        except Exception as e:
+            logger.warning(f'Could not record success for session {session_id}: {e}')
+
+    def record_failure(self, session_id) -> bool:
+        """
+        A send failed because of the session
+
+        Returns:
+            True if this failure opened the breaker
+        """
+        if not self.redis:
+            return False
+
+        try:
+            opened = bool(self._failure(
+                keys=self._keys(session_id),
+                args=[
+                    time.time(),
+                    settings.SESSION_BREAKER_WINDOW,
+                    settings.SESSION_BREAKER_FAILURE_THRESHOLD,
+                    settings.SESSION_BREAKER_COOLDOWN,
+                    settings.SESSION_BREAKER_COOLDOWN + OPEN_STATE_TTL,
+                ]
+            ))
+        except Exception as e:
+            logger.warning(f'Could not record failure for session {session_id}: {e}')
+            return False
+
+        if opened:
+            logger.warning(
+                f'Circuit breaker for session {session_id} opened for {settings.SESSION_BREAKER_COOLDOWN}s'
+            )
+        return opened
+
+    def reset(self, session_id):
+        """Close the breaker, e.g. when the session (re)connects"""
+        if not self.redis:
+            return
+
+        try:
+            self.redis.delete(*self._keys(session_id))
+        except Exception as e:
+            logger.warning(f'Could not reset circuit breaker for session {session_id}: {e}')
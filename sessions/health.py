@@ -0,0 +1,194 @@
+"""
+Live health metrics of WhatsApp sessions for load balancing
+
+Every send attempt updates, per session, an exponentially weighted moving
+average of its latency and of its success ratio, and a set of attempts in
+flight. A session's score is its expected time per successful send
+(failures count as a fallback to another session), scaled by the sends it
+is already handling; lower is better, so slow or
+flaky numbers receive less traffic without being taken out of rotation.
+"""
+import logging
+import random
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional
+from django.conf import settings
+from sessions.models import WhatsAppSession
+
+logger = logging.getLogger(__name__)
+
+# Fold one attempt into the averages and drop it from the in-flight set
+RECORD_SCRIPT = """
+local alpha = tonumber(ARGV[1])
+local latency = tonumber(ARGV[2])
+local success = tonumber(ARGV[3])
+local old_latency = tonumber(redis.call('hget', KEYS[1], 'latency'))
+local old_success = tonumber(redis.call('hget', KEYS[1], 'success'))
+if old_latency then
+    latency = old_latency + alpha * (latency - old_latency)
+end
+if old_success then
+    success = old_success + alpha * (success - old_success)
+end
+redis.call('hset', KEYS[1], 'latency', latency, 'success', success)
+redis.call('expire', KEYS[1], ARGV[4])
+redis.call('zrem', KEYS[2], ARGV[5])
+return 1
+"""
+
+# Success ratio below which a session is not penalised further
+MIN_SUCCESS_RATIO = 0.05
+
+
+class SessionHealth:
+    """
+    Redis-backed per-session latency, success ratio and in-flight count
+
+    Metrics expire after SESSION_HEALTH_TTL seconds without traffic, so a
+    session that was avoided starts over from the optimistic defaults.
+    Redis errors never fail a send: they are logged and the session is
+    scored with the defaults.
+    """
+
+    METRICS_KEY = 'sessions:health:{session_id}'
+    INFLIGHT_KEY = 'sessions:health:{session_id}:inflight'
+
+    def __init__(self):
+        self.redis = None
+        if self.is_enabled():
+            from django_redis import get_redis_connection
+            try:
+                self.redis = get_redis_connection('default')
+            except Exception as e:
+                logger.warning(f'Session health metrics unavailable: {e}')
+                return
+            self._record = self.redis.register_script(RECORD_SCRIPT)
+
+    @staticmethod
+    def is_enabled() -> bool:
+        """Health metrics need a real Redis backend"""
+        return settings.USE_REDIS and settings.SESSION_HEALTH_ENABLED
+
+    def _metrics_key(self, session_id):
+        return self.METRICS_KEY.format(session_id=session_id)
+
+    def _inflight_key(self, session_id):
+        return self.INFLIGHT_KEY.format(session_id=session_id)
+
+    def begin(self, session_id) -> Optional[str]:
+        """
+        Mark a send attempt as in flight
+
+        Returns:
+            Token to pass to finish(), or None if metrics are disabled
+        """
+        if not self.redis:
+            return None
+
+        token = uuid.uuid4().hex
+        try:
+            pipeline = self.redis.pipeline(transaction=False)
+            pipeline.zadd(self._inflight_key(session_id), {token: time.time()})
+            pipeline.expire(self._inflight_key(session_id), settings.SESSION_HEALTH_TTL)
+            pipeline.execute()
+        except Exception as e:
+            logger.warning(f'Could not record attempt start for session {session_id}: {e}')
+        return token
+
+    def finish(self, session_id, token, success: bool, latency: float):
+        """Record the outcome and latency (seconds) of an attempt started with begin()"""
+        if not self.redis:
+            return
+
+        try:
+            self._record(
+                keys=[self._metrics_key(session_id), self._inflight_key(session_id)],
+                args=[
+                    settings.SESSION_HEALTH_ALPHA,
+                    latency * 1000,
+                    1 if success else 0,
+                    settings.SESSION_HEALTH_TTL,
+                    token,
+                ]
+            )
+        except Exception as e:
+            logger.warning(f'Could not record attempt result for session {session_id}: {e}')
+
+    def metrics(self, sessions: Iterable[WhatsAppSession]) -> Dict[str, Dict[str, float]]:
+        """
+        Latency (ms), success ratio and in-flight count per session_id,
+        fetched in one round trip; sessions without data get the defaults
+        """
+        session_ids = [session.session_id for session in sessions]
+        defaults = {
+            'latency': float(settings.SESSION_HEALTH_DEFAULT_LATENCY_MS),
+            'success': 1.0,
+            'inflight': 0,
+        }
+        metrics = {session_id: dict(defaults) for session_id in session_ids}
+
+        if not self.redis or not session_ids:
+            return metrics
+
+        # Attempts older than this were abandoned (e.g. a killed worker)
+        stale_before = time.time() - settings.SESSION_HEALTH_INFLIGHT_TIMEOUT
+        try:
+            pipeline = self.redis.pipeline(transaction=False)
+            for session_id in session_ids:
+                pipeline.hmget(self._metrics_key(session_id), 'latency', 'success')
+                pipeline.zremrangebyscore(self._inflight_key(session_id), '-inf', stale_before)
+                pipeline.zcard(self._inflight_key(session_id))
+            results = pipeline.execute()
+        except Exception as e:
+            logger.warning(f'Could not read session health metrics: {e}')
+            return metrics
+
+        for i, session_id in enumerate(session_ids):
+            (latency, success), _, inflight = results[i * 3:(i + 1) * 3]
+            if latency is not None:
+                metrics[session_id]['latency'] = float(latency)
+            if success is not None:
+                metrics[session_id]['success'] = float(success)
+            metrics[session_id]['inflight'] = inflight
+        return metrics
+
+    @staticmethod
+    def cost(metrics: Dict[str, float]) -> float:
+        """
+        Expected milliseconds per successful send, ignoring concurrent load
+
+        Failures often return fast, so each one is also charged the fallback
+        it causes (a send on another session) rather than just its latency.
+        """
+        success = max(metrics['success'], MIN_SUCCESS_RATIO)
+        fallback = settings.SESSION_HEALTH_DEFAULT_LATENCY_MS
+        return (metrics['latency'] + (1 - success) * fallback) / success
+
+    def scores(self, sessions: Iterable[WhatsAppSession]) -> Dict[str, float]:
+        """Score per session_id for an immediate send; lower is better"""
+        return {
+            session_id: self.cost(session_metrics) * (1 + session_metrics['inflight'])
+            for session_id, session_metrics in self.metrics(sessions).items()
+        }
+
+    def rank(self, sessions: List[WhatsAppSession]) -> List[WhatsAppSession]:
+        """
+        Order sessions for a send: the first is chosen by the power of two
+        choices (the better scored of two random sessions), the rest follow
+        best first as fallbacks
+
+        Sampling two sessions rather than always taking the best keeps
+        concurrent senders, which read the same scores, from piling onto
+        one session.
+        """
+        if len(sessions) < 2:
+            return list(sessions)
+
+        scores = self.scores(sessions)
+        first = min(random.sample(sessions, 2), key=lambda session: scores[session.session_id])
+        # Shuffle first so sessions with equal scores share the fallback traffic
+        others = [session for session in sessions if session.id != first.id]
+        random.shuffle(others)
+        others.sort(key=lambda session: scores[session.session_id])
+        return [first] + others
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.14 on 2026-10-17 03:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp_sessions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='whatsappsession',
+            name='send_burst',
+            field=models.PositiveIntegerField(blank=True, help_text='Messages this number may send back to back; empty uses SESSION_RATE_LIMIT_BURST', null=True),
+        ),
+        migrations.AddField(
+            model_name='whatsappsession',
+            name='send_rate_per_minute',
+            field=models.PositiveIntegerField(blank=True, help_text='Sustained messages per minute for this number; empty uses SESSION_RATE_LIMIT_PER_MINUTE', null=True),
+        ),
+    ]
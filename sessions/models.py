@@ -39,6 +39,16 @@ class WhatsAppSession(models.Model):
         default=False,
         help_text='Primary instance for this user'
     )
+    send_rate_per_minute = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+        help_text='Sustained messages per minute for this number; empty uses SESSION_RATE_LIMIT_PER_MINUTE'
+    )
+    send_burst = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+        help_text='Messages this number may send back to back; empty uses SESSION_RATE_LIMIT_BURST'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -0,0 +1,200 @@
+"""
+Per-session outbound queues for serialised message delivery
+"""
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from django.conf import settings
+from sessions.models import WhatsAppSession
+
+logger = logging.getLogger(__name__)
+
+# Only delete/extend the sender lock if we still own it
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Pop from the first non-empty lane list, returning {key index, value}, and
+# record the pop in the processing set (last key) until it is acknowledged
+POP_FIRST_SCRIPT = """
+for i = 1, #KEYS - 1 do
+    local value = redis.call('lpop', KEYS[i])
+    if value then
+        redis.call('zadd', KEYS[#KEYS], ARGV[1], ARGV[i + 1] .. ':' .. value)
+        return {i, value}
+    end
+end
+return nil
+"""
+
+REFRESH_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('expire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+# Highest priority first
+LANES = ('high', 'normal', 'low')
+
+
+class LaneScheduler:
+    """
+    Weighted choice of which priority lane a sender pops from next
+
+    Each lane gets OUTBOUND_LANE_WEIGHTS[lane] credits per round. Lanes
+    with credits left are tried in priority order, so high-priority
+    messages go first, but once the high lane has used its share a waiting
+    lower lane gets a slot; no lane starves while others are busy.
+    Senders pass the credits on to their next run to keep the round going.
+    """
+
+    def __init__(self, weights=None, credits=None):
+        self.weights = weights or settings.OUTBOUND_LANE_WEIGHTS
+        self.credits = dict(credits) if credits else dict(self.weights)
+
+    def order(self):
+        """Lanes in the order they should be tried for the next pop"""
+        with_credit = [lane for lane in LANES if self.credits[lane] > 0]
+        return with_credit + [lane for lane in LANES if self.credits[lane] <= 0]
+
+    def record(self, lane):
+        """Charge a pop to its lane, starting a new round when needed"""
+        if self.credits[lane] <= 0:
+            # Every lane with credit was empty; nothing is waiting on a share
+            self.credits = dict(self.weights)
+        self.credits[lane] -= 1
+        if not any(credit > 0 for credit in self.credits.values()):
+            self.credits = dict(self.weights)
+
+
+class OutboundQueue:
+    """
+    Redis lists of pending message ids per WhatsApp session and priority lane
+
+    A session's lanes are drained by exactly one sender at a time, guarded
+    by a lock key, so a session's Chromium page only ever sends one message
+    at a time. A popped message stays in the session's processing set until
+    the sender has written its status and acknowledges it; entries older
+    than SESSION_OUTBOUND_ACK_TIMEOUT belong to a sender that died and are
+    reclaimed.
+    """
+
+    # The normal lane keeps the pre-lane key so ids queued before an upgrade are still drained
+    QUEUE_KEY = 'outbound:queue:{session_id}'
+    LANE_QUEUE_KEY = 'outbound:queue:{session_id}:{lane}'
+    LOCK_KEY = 'outbound:sender:{session_id}'
+    PROCESSING_KEY = 'outbound:processing:{session_id}'
+
+    def __init__(self):
+        from django_redis import get_redis_connection
+        self.redis = get_redis_connection('default')
+
+    @staticmethod
+    def is_enabled() -> bool:
+        """Outbound queues need a real Redis backend"""
+        return settings.USE_REDIS and settings.SESSION_OUTBOUND_QUEUES_ENABLED
+
+    def _queue_key(self, session_id, lane='normal'):
+        if lane == 'normal':
+            return self.QUEUE_KEY.format(session_id=session_id)
+        return self.LANE_QUEUE_KEY.format(session_id=session_id, lane=lane)
+
+    def _lock_key(self, session_id):
+        return self.LOCK_KEY.format(session_id=session_id)
+
+    def _processing_key(self, session_id):
+        return self.PROCESSING_KEY.format(session_id=session_id)
+
+    def length(self, session_id) -> int:
+        """Number of messages waiting for a session across all lanes"""
+        pipeline = self.redis.pipeline(transaction=False)
+        for lane in LANES:
+            pipeline.llen(self._queue_key(session_id, lane))
+        return sum(pipeline.execute())
+
+    def lengths(self, sessions: Iterable[WhatsAppSession], lanes=LANES) -> Dict[str, int]:
+        """Messages waiting in the given lanes per session_id, fetched in one round trip"""
+        session_ids = [session.session_id for session in sessions]
+        pipeline = self.redis.pipeline(transaction=False)
+        for session_id in session_ids:
+            for lane in lanes:
+                pipeline.llen(self._queue_key(session_id, lane))
+        results = pipeline.execute()
+        return {
+            session_id: sum(results[i * len(lanes):(i + 1) * len(lanes)])
+            for i, session_id in enumerate(session_ids)
+        }
+
+    def push(self, assignments: Dict[str, List[int]], lane='normal'):
+        """Append message ids to a lane of their assigned sessions"""
+        pipeline = self.redis.pipeline(transaction=False)
+        for session_id, message_ids in assignments.items():
+            if message_ids:
+                pipeline.rpush(self._queue_key(session_id, lane), *message_ids)
+        pipeline.execute()
+
+    def requeue(self, session_id, message_id, lane='normal'):
+        """Put a popped message back at the head of its lane, e.g. when it could not be sent yet"""
+        pipeline = self.redis.pipeline()
+        pipeline.lpush(self._queue_key(session_id, lane), message_id)
+        pipeline.zrem(self._processing_key(session_id), f'{lane}:{message_id}')
+        pipeline.execute()
+
+    def pop(self, session_id, lanes=LANES) -> Optional[Tuple[str, int]]:
+        """
+        Take the next (lane, message id) from the first non-empty lane, in
+        the order given; ack() it once its status is written
+        """
+        keys = [self._queue_key(session_id, lane) for lane in lanes] + [self._processing_key(session_id)]
+        result = self.redis.eval(POP_FIRST_SCRIPT, len(keys), *keys, time.time(), *lanes)
+        if not result:
+            return None
+        index, value = result
+        return lanes[int(index) - 1], int(value)
+
+    def ack(self, session_id, message_id, lane='normal'):
+        """Forget a popped message whose status has been written"""
+        self.redis.zrem(self._processing_key(session_id), f'{lane}:{message_id}')
+
+    def ack_many(self, session_id, popped):
+        """Forget several popped (lane, message id) pairs with one command"""
+        if popped:
+            self.redis.zrem(self._processing_key(session_id), *(f'{lane}:{message_id}' for lane, message_id in popped))
+
+    def stalled(self, session_id, older_than) -> List[Tuple[str, int]]:
+        """(lane, message id) of messages popped more than older_than seconds ago and never acknowledged"""
+        members = self.redis.zrangebyscore(self._processing_key(session_id), '-inf', time.time() - older_than)
+        stalled = []
+        for member in members:
+            lane, message_id = member.decode().split(':')
+            stalled.append((lane, int(message_id)))
+        return stalled
+
+    def acquire_sender(self, session_id, token) -> bool:
+        """Become the single sender for a session's queue"""
+        return bool(self.redis.set(
+            self._lock_key(session_id),
+            token,
+            nx=True,
+            ex=settings.SESSION_SENDER_LOCK_TIMEOUT
+        ))
+
+    def refresh_sender(self, session_id, token) -> bool:
+        """Extend the sender lock while still draining"""
+        return bool(self.redis.eval(
+            REFRESH_LOCK_SCRIPT, 1, self._lock_key(session_id),
+            token, settings.SESSION_SENDER_LOCK_TIMEOUT
+        ))
+
+    def release_sender(self, session_id, token):
+        """Give up the sender lock"""
+        self.redis.eval(RELEASE_LOCK_SCRIPT, 1, self._lock_key(session_id), token)
+
+    def has_sender(self, session_id) -> bool:
+        """Whether a sender currently owns the session's queue"""
+        return bool(self.redis.exists(self._lock_key(session_id)))
@@ -6,7 +6,7 @@ import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 from django.conf import settings
-from core.exceptions import APIException
+from core.exceptions import WhatsAppServiceError
 import logging
 
 logger = logging.getLogger(__name__)
@@ -33,8 +33,11 @@ class WhatsAppService:
             retry_strategy = Retry(
                 total=3,  # Maximum number of retries
                 backoff_factor=0.3,  # Wait 0.3, 0.6, 1.2 seconds between retries
-                status_forcelist=[429, 500, 502, 503, 504],  # Retry on these status codes
-                allowed_methods=["GET", "POST"]  # Retry on these methods
+                # Retry on these status codes; not 503, which the service answers
+                # for a session that cannot send, so callers fail over instead
+                status_forcelist=[429, 500, 502, 504],
+                allowed_methods=["GET", "POST"],  # Retry on these methods
+                raise_on_status=False  # Hand the last response to raise_for_status
             )
             
             # Configure adapter with connection pooling
@@ -52,7 +55,7 @@ class WhatsAppService:
         
         return cls._http_session
     
-    def _make_request(self, method, endpoint, data=None, timeout=None):
+    def _make_request(self, method, endpoint, data=None, timeout=None, extra_headers=None):
         """
         Make HTTP request to Node.js service using connection pooling
         """
@@ -61,6 +64,8 @@ class WhatsAppService:
             'Content-Type': 'application/json',
             'x-api-key': self.api_key
         }
+        if extra_headers:
+            headers.update(extra_headers)
         
         # Use shared session for connection pooling
         session = self.get_http_session()
@@ -78,16 +83,36 @@ class WhatsAppService:
         
         except requests.Timeout:
             logger.error(f'Timeout connecting to WhatsApp service: {url}')
-            raise APIException('WhatsApp service timeout')
+            raise WhatsAppServiceError('WhatsApp service timeout', error_code='SERVICE_TIMEOUT')
         except requests.ConnectionError:
             logger.error(f'Connection error to WhatsApp service: {url}')
-            raise APIException('WhatsApp service unavailable')
+            raise WhatsAppServiceError('WhatsApp service unavailable', error_code='SERVICE_UNAVAILABLE')
         except requests.HTTPError as e:
             logger.error(f'HTTP error from WhatsApp service: {e}')
-            raise APIException(f'WhatsApp service error: {e.response.text}')
+            raise self._service_error(e.response)
         except Exception as e:
             logger.error(f'Unexpected error calling WhatsApp service: {e}')
-            raise APIException(f'WhatsApp service error: {str(e)}')
+            raise WhatsAppServiceError(f'WhatsApp service error: {str(e)}')
+    
+    @staticmethod
+    def _service_error(response):
+        """
+        Exception for an error response, carrying the service's error code
+        and HTTP status (see whatsapp-service/README.md); responses without
+        a JSON body, e.g. from a proxy, keep only the status
+        """
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        if not isinstance(body, dict):
+            body = {}
+        error = body.get('message') or body.get('error') or response.text
+        return WhatsAppServiceError(
+            f'WhatsApp service error: {error}',
+            error_code=body.get('code'),
+            http_status=response.status_code
+        )
     
     def init_session(self, user_id, session_id):
         """
@@ -112,7 +137,12 @@ class WhatsAppService:
         data = {'sessionId': session_id}
         return self._make_request('POST', '/api/session/disconnect', data, timeout=10)
     
-    def send_text_message(self, session_id, recipient, message):
+    @staticmethod
+    def _idempotency_headers(idempotency_key):
+        """Headers letting the Node.js service drop duplicate sends on retry"""
+        return {'Idempotency-Key': idempotency_key} if idempotency_key else None
+    
+    def send_text_message(self, session_id, recipient, message, idempotency_key=None):
         """
         Send text message via WhatsApp
         """
@@ -121,9 +151,13 @@ class WhatsAppService:
             'recipient': recipient,
             'message': message
         }
-        return self._make_request('POST', '/api/message/send-text', data, timeout=30)
+        return self._make_request(
+            'POST', '/api/message/send-text', data, timeout=30,
+            extra_headers=self._idempotency_headers(idempotency_key)
+        )
     
-    def send_media_message(self, session_id, recipient, media_url, caption='', media_type='image'):
+    def send_media_message(self, session_id, recipient, media_url, caption='', media_type='image',
+                           idempotency_key=None):
         """
         Send media message via WhatsApp
         """
@@ -134,7 +168,10 @@ class WhatsAppService:
             'caption': caption,
             'mediaType': media_type
         }
-        return self._make_request('POST', '/api/message/send-media', data, timeout=60)
+        return self._make_request(
+            'POST', '/api/message/send-media', data, timeout=60,
+            extra_headers=self._idempotency_headers(idempotency_key)
+        )
     
     def check_health(self):
         """
@@ -1,14 +1,22 @@
 """
 Session Pool Service for Multi-Instance WhatsApp Management
 """
-import random
+import heapq
 import logging
+import time
+from collections import defaultdict
 from typing import List, Optional, Dict, Any
+from django.conf import settings
 from django.db import transaction
 from django.core.cache import cache
+from sessions.circuit_breaker import SessionCircuitBreaker
+from sessions.health import SessionHealth
+from sessions.throttle import SessionThrottle
 from sessions.models import WhatsAppSession
 from sessions.services import WhatsAppService
-from core.exceptions import SessionNotConnected
+from sessions.outbound_queue import OutboundQueue, LANES
+from messages.retry import is_session_error
+from core.exceptions import SessionNotConnected, SessionThrottled
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +29,9 @@ class SessionPoolService:
     
     def __init__(self):
         self.whatsapp_service = WhatsAppService()
+        self.health = SessionHealth()
+        self.breaker = SessionCircuitBreaker()
+        self.throttle = SessionThrottle()
     
     @staticmethod
     def _get_user_sessions_cache_key(user_id):
@@ -55,33 +66,16 @@ class SessionPoolService:
         return sessions
     
     def get_random_session(self, user) -> Optional[WhatsAppSession]:
-        """Get a random connected session for load balancing"""
+        """
+        Get a connected session for load balancing: the healthier of two
+        randomly sampled sessions (see SessionHealth.rank)
+        """
         sessions = self.get_available_sessions(user)
         
         if not sessions:
             return None
         
-        # Weighted random selection (prefer less recently used sessions)
-        weights = []
-        for session in sessions:
-            # Give higher weight to sessions that haven't been used recently
-            # This helps distribute load more evenly
-            weight = 1.0
-            if session.last_active_at:
-                # Older last_active_at = higher weight
-                from django.utils import timezone
-                time_diff = timezone.now() - session.last_active_at
-                weight += time_diff.total_seconds() / 3600  # Add hours since last use
-            weights.append(weight)
-        
-        # Normalize weights
-        total_weight = sum(weights)
-        if total_weight > 0:
-            weights = [w / total_weight for w in weights]
-        else:
-            weights = [1.0 / len(sessions)] * len(sessions)
-        
-        return random.choices(sessions, weights=weights, k=1)[0]
+        return self.health.rank(sessions)[0]
     
     def get_primary_session(self, user) -> Optional[WhatsAppSession]:
         """Get the primary session for a user"""
@@ -92,15 +86,17 @@ class SessionPoolService:
         ).first()
     
     def send_with_fallback(self, user, recipient: str, message_data: Dict[str, Any], 
-                          message_type: str = 'text') -> Dict[str, Any]:
+                          message_type: str = 'text',
+                          preferred_session: Optional[WhatsAppSession] = None) -> Dict[str, Any]:
         """
         Send message with automatic fallback to other sessions if first attempt fails
         
         Args:
             user: User object
             recipient: Phone number to send to
-            message_data: Message data (content, media_url, etc.
+            message_data: Message data (content, media_url, idempotency_key, etc.)
             message_type: Type of message ('text', 'image', 'document', 'video')
+            preferred_session: Session to try first (used by bulk sends to spread load)
         
         Returns:
             Dict with success status, message_id, session_used, and attempts
@@ -110,35 +106,151 @@ class SessionPoolService:
         if not sessions:
             raise SessionNotConnected('No connected WhatsApp sessions available')
         
-        # Try primary session first, then random selection
-        primary_session = self.get_primary_session(user)
-        if primary_session:
-            sessions = [primary_session] + [s for s in sessions if s.id != primary_session.id]
+        # Skip sessions whose circuit breaker is open
+        sessions, probes = self.breaker.available(sessions)
+        if not sessions and not probes:
+            raise SessionNotConnected('No connected WhatsApp sessions available: all are cooling down after failures')
+        
+        # Try preferred session first, then primary, then sessions due a probe, then health-scored selection
+        primary_session = None if preferred_session else self.get_primary_session(user)
+        first = preferred_session or primary_session
+        if first and any(s.id == first.id for s in sessions):
+            others = [s for s in sessions if s.id != first.id]
+            sessions = [first] + probes + self.health.rank(others)
         else:
-            # Randomize order for load balancing
-            random.shuffle(sessions)
+            sessions = probes + self.health.rank(sessions)
         
         last_error = None
         attempts = []
+        # Seconds until a session skipped for its rate limit has a token again
+        throttled_waits = []
+        
+        for session in sessions:
+            # Only sessions with a send token left are used
+            allowed, wait = self.throttle.acquire(session)
+            if not allowed:
+                logger.debug(f'Session {session.instance_name} is at its rate limit for {wait:.1f}s')
+                throttled_waits.append(wait)
+                continue
+            
+            attempt, result = self._send_once(session, recipient, message_data, message_type)
+            attempts.append(attempt)
+            if attempt['success']:
+                return self._sent_result(session, attempts, result)
+            last_error = attempt['error']
+        
+        if not attempts:
+            # Nothing was sent; callers queue the message or answer 429
+            raise SessionThrottled(
+                f'All {len(sessions)} WhatsApp sessions are at their rate limit',
+                retry_after=min(throttled_waits)
+            )
+        
+        # All sessions failed
+        logger.error(f'All {len(attempts)} sessions tried failed to send message to {recipient}')
+        return {
+            'success': False,
+            'error': f'Failed to send message after trying {len(attempts)} sessions. Last error: {last_error}',
+            'attempts': attempts,
+            'sessions_tried': len(attempts)
+        }
+    
+    def send_via_session(self, session: WhatsAppSession, recipient: str, message_data: Dict[str, Any],
+                         message_type: str = 'text') -> Dict[str, Any]:
+        """
+        Send through one session only, never falling back to another
+        
+        Used by the outbound queue sender of a session, so that sender is the
+        only one driving the session's Chromium page. A session whose circuit
+        breaker is open fails without being called.
+        
+        Raises:
+            SessionThrottled: the session has no send token left
         
-        for i, session in enumerate(sessions):
+        Returns:
+            Dict like send_with_fallback
+        """
+        closed, probes = self.breaker.available([session])
+        if not closed and not probes:
+            error = f'Session {session.instance_name} unavailable: cooling down after failures'
+            return {
+                'success': False,
+                'error': error,
+                'attempts': [{
+                    'session_id': session.id,
+                    'instance_name': session.instance_name,
+                    'success': False,
+                    'error': error,
+                    'error_code': 'SESSION_UNAVAILABLE',
+                    'http_status': None
+                }],
+                'sessions_tried': 0
+            }
+        
+        allowed, wait = self.throttle.acquire(session)
+        if not allowed:
+            raise SessionThrottled(f'Session {session.instance_name} is at its rate limit', retry_after=wait)
+        
+        attempt, result = self._send_once(session, recipient, message_data, message_type)
+        if attempt['success']:
+            return self._sent_result(session, [attempt], result)
+        return {
+            'success': False,
+            'error': attempt['error'],
+            'attempts': [attempt],
+            'sessions_tried': 1
+        }
+    
+    @staticmethod
+    def _sent_result(session, attempts, result) -> Dict[str, Any]:
+        return {
+            'success': True,
+            'message_id': result.get('messageId'),
+            'session_used': {
+                'id': session.id,
+                'instance_name': session.instance_name,
+                'session_id': session.session_id
+            },
+            'attempts': attempts,
+            'timestamp': result.get('timestamp')
+        }
+    
+    def _send_once(self, session, recipient, message_data, message_type):
+        """
+        One send attempt through a session, recorded in its health metrics
+        and circuit breaker
+        
+        Returns:
+            (attempt dict, result of the WhatsApp service or None if the call raised)
+        """
+        attempt = {
+            'session_id': session.id,
+            'instance_name': session.instance_name,
+            'success': False
+        }
+        
+        try:
+            logger.info(f'Attempting to send message via session {session.instance_name}')
+            
+            # Update last active time atomically
+            from django.utils import timezone
+            WhatsAppSession.objects.filter(id=session.id).update(
+                last_active_at=timezone.now()
+            )
+            # Update local object for consistency
+            session.last_active_at = timezone.now()
+            
+            # Send message based on type, timing the attempt for health scoring
+            health_token = self.health.begin(session.session_id)
+            started = time.monotonic()
+            sent = False
             try:
-                logger.info(f'Attempting to send message via session {session.instance_name} (attempt {i+1})')
-                
-                # Update last active time atomically
-                from django.utils import timezone
-                WhatsAppSession.objects.filter(id=session.id).update(
-                    last_active_at=timezone.now()
-                )
-                # Update local object for consistency
-                session.last_active_at = timezone.now()
-                
-                # Send message based on type
                 if message_type == 'text':
                     result = self.whatsapp_service.send_text_message(
                         session.session_id,
                         recipient,
-                        message_data['content']
+                        message_data['content'],
+                        idempotency_key=message_data.get('idempotency_key')
                     )
                 elif message_type in ['image', 'document', 'video']:
                     result = self.whatsapp_service.send_media_message(
@@ -146,73 +258,107 @@ class SessionPoolService:
                         recipient,
                         message_data['media_url'],
                         message_data.get('caption', ''),
-                        message_type
+                        message_type,
+                        idempotency_key=message_data.get('idempotency_key')
                     )
                 else:
                     raise ValueError(f'Unsupported message type: {message_type}')
-                
-                if result.get('success'):
-                    logger.info(f'Message sent successfully via session {session.instance_name}')
-                    return {
-                        'success': True,
-                        'message_id': result.get('messageId'),
-                        'session_used': {
-                            'id': session.id,
-                            'instance_name': session.instance_name,
-                            'session_id': session.session_id
-                        },
-                        'attempts': attempts + [{
-                            'session_id': session.id,
-                            'instance_name': session.instance_name,
-                            'success': True,
-                            'message_id': result.get('messageId')
-                        }],
-                        'timestamp': result.get('timestamp')
-                    }
-                else:
-                    error_msg = result.get('message', 'Unknown error')
-                    logger.warning(f'Failed to send via session {session.instance_name}: {error_msg}')
-                    
-                    # Check if error indicates session is not actually connected
-                    if any(keyword in error_msg.lower() for keyword in ['not found', 'reconnect', 'closed', 'not connected', 'not ready']):
-                        logger.warning(f'Session {session.instance_name} appears disconnected, updating status')
-                        session.status = 'disconnected'
-                        session.save(update_fields=['status'])
-                    
-                    attempts.append({
-                        'session_id': session.id,
-                        'instance_name': session.instance_name,
-                        'success': False,
-                        'error': error_msg
-                    })
-                    last_error = error_msg
-                    
-            except Exception as e:
-                error_msg = str(e)
-                logger.error(f'Exception sending via session {session.instance_name}: {error_msg}')
-                
-                # Check if exception indicates disconnection
-                if 'WhatsApp service error' in error_msg or 'timeout' in error_msg.lower():
-                    logger.warning(f'Session {session.instance_name} might be disconnected, updating status')
-                    session.status = 'disconnected'
-                    session.save(update_fields=['status'])
-                
-                attempts.append({
-                    'session_id': session.id,
-                    'instance_name': session.instance_name,
-                    'success': False,
-                    'error': error_msg
-                })
-                last_error = error_msg
+                sent = bool(result.get('success'))
+            finally:
+                self.health.finish(session.session_id, health_token, sent, time.monotonic() - started)
         
-        # All sessions failed
-        logger.error(f'All {len(sessions)} sessions failed to send message to {recipient}')
-        return {
-            'success': False,
-            'error': f'Failed to send message after trying {len(sessions)} sessions. Last error: {last_error}',
-            'attempts': attempts,
-            'sessions_tried': len(sessions)
-        }
+        except Exception as e:
+            error_msg = str(e)
+            logger.error(f'Exception sending via session {session.instance_name}: {error_msg}')
+            
+            attempt['error'] = error_msg
+            attempt['error_code'] = getattr(e, 'error_code', None)
+            attempt['http_status'] = getattr(e, 'http_status', None)
+            self._record_attempt_failure(session, attempt)
+            return attempt, None
+        
+        if result.get('success'):
+            logger.info(f'Message sent successfully via session {session.instance_name}')
+            self.breaker.record_success(session.session_id)
+            attempt['success'] = True
+            attempt['message_id'] = result.get('messageId')
+            return attempt, result
+        
+        error_msg = result.get('message', 'Unknown error')
+        logger.warning(f'Failed to send via session {session.instance_name}: {error_msg}')
+        
+        attempt['error'] = error_msg
+        attempt['error_code'] = result.get('code')
+        attempt['http_status'] = None
+        self._record_attempt_failure(session, attempt)
+        return attempt, result
+    
+    def _record_attempt_failure(self, session, attempt):
+        """
+        Count a failed attempt against the session's circuit breaker only if
+        the Node.js service reported a session-level error; e.g. a rejected
+        recipient (SEND_FAILED) means the session itself worked
+        """
+        if is_session_error(attempt['error_code'], attempt['http_status']):
+            self.breaker.record_failure(session.session_id)
+        else:
+            self.breaker.record_success(session.session_id)
+    
+    def route_to_queues(self, user, message_ids: List[int], lane='normal',
+                        exclude: Optional[WhatsAppSession] = None) -> Dict[str, List[int]]:
+        """
+        Append messages to a priority lane of the user's connected sessions,
+        always picking the session that will get through its work ahead of
+        that lane (its queued messages of the same or higher priority) first
+        
+        Each queued message costs a session its send interval (or the
+        interval its rate limit allows, if longer) plus its health-scored
+        time per successful send, so slow, flaky or rate-limited sessions
+        are given shorter queues.
+        
+        exclude leaves one session out, e.g. the session whose sender hands
+        a message it could not send to another session.
+        
+        Returns:
+            Dict mapping session_id to the message ids routed to it
+        """
+        sessions = self.get_available_sessions(user)
+        if exclude:
+            sessions = [s for s in sessions if s.id != exclude.id]
+        
+        if not sessions:
+            raise SessionNotConnected('No connected WhatsApp sessions available')
+        
+        # Keep work away from sessions cooling down after failures, unless all are
+        sessions = self.breaker.available(sessions, probe=False)[0] or sessions
+        
+        queue = OutboundQueue()
+        lengths = queue.lengths(sessions, lanes=LANES[:LANES.index(lane) + 1])
+        metrics = self.health.metrics(sessions)
+        costs = {}
+        for session in sessions:
+            # A session sends no faster than its send interval and its rate limit allow
+            rate, _ = self.throttle.limits(session)
+            interval = max(settings.SESSION_SEND_INTERVAL, 1 / rate) * 1000
+            costs[session.session_id] = interval + self.health.cost(metrics[session.session_id])
+        
+        # Min-heap of (expected ms to drain, tiebreak, session_id)
+        heap = [
+            (lengths[s.session_id] * costs[s.session_id], i, s.session_id)
+            for i, s in enumerate(sessions)
+        ]
+        heapq.heapify(heap)
+        
+        assignments = defaultdict(list)
+        for message_id in message_ids:
+            work, i, session_id = heapq.heappop(heap)
+            assignments[session_id].append(message_id)
+            heapq.heappush(heap, (work + costs[session_id], i, session_id))
+        
+        queue.push(assignments, lane)
+        
+        logger.debug(f'Routed {len(message_ids)} {lane} messages to {len(assignments)} session queues for user {user.id}')
+        return dict(assignments)
     
     def get_session_stats(self, user) -> Dict[str, Any]:
         """Get statistics about user's sessions"""
@@ -0,0 +1,100 @@
+"""
+Token-bucket send rate limits per WhatsApp session
+
+WhatsApp throttles, and may ban, numbers that send in fast bursts. Each
+session has a bucket of send_burst tokens (SESSION_RATE_LIMIT_BURST by
+default) refilled at send_rate_per_minute (SESSION_RATE_LIMIT_PER_MINUTE);
+every send attempt takes one token, so a number can burst briefly but never
+sustain more than its rate. Pool selection skips sessions with an empty
+bucket, which keeps a user's pool at full speed while each number stays at
+its own limit.
+"""
+import logging
+import time
+from typing import Tuple
+from django.conf import settings
+from sessions.models import WhatsAppSession
+
+logger = logging.getLogger(__name__)
+
+# Refill by elapsed time, then take a token if there is one.
+# Returns {taken (0/1), seconds until a token is available}; floats are
+# returned as strings since Redis truncates Lua numbers to integers
+TAKE_TOKEN_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local tokens = tonumber(redis.call('hget', KEYS[1], 'tokens'))
+local updated = tonumber(redis.call('hget', KEYS[1], 'updated'))
+if tokens == nil then
+    tokens = capacity
+    updated = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local taken = 0
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    taken = 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('hset', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('expire', KEYS[1], math.ceil(capacity / rate) + 60)
+return {taken, tostring(wait)}
+"""
+
+
+class SessionThrottle:
+    """
+    Redis token bucket per WhatsApp session, updated atomically by a Lua script
+
+    Without Redis, or if Redis fails, sends are not throttled.
+    """
+
+    BUCKET_KEY = 'sessions:throttle:{session_id}'
+
+    def __init__(self):
+        self.redis = None
+        if self.is_enabled():
+            from django_redis import get_redis_connection
+            try:
+                self.redis = get_redis_connection('default')
+            except Exception as e:
+                logger.warning(f'Session rate limits unavailable: {e}')
+                return
+            self._take = self.redis.register_script(TAKE_TOKEN_SCRIPT)
+
+    @staticmethod
+    def is_enabled() -> bool:
+        """Rate limits need a real Redis backend"""
+        return settings.USE_REDIS and settings.SESSION_RATE_LIMIT_ENABLED
+
+    @staticmethod
+    def limits(session: WhatsAppSession) -> Tuple[float, int]:
+        """(tokens per second, bucket size) of a session"""
+        per_minute = session.send_rate_per_minute or settings.SESSION_RATE_LIMIT_PER_MINUTE
+        burst = session.send_burst or settings.SESSION_RATE_LIMIT_BURST
+        return per_minute / 60, max(burst, 1)
+
+    def acquire(self, session: WhatsAppSession) -> Tuple[bool, float]:
+        """
+        Take a send token from a session's bucket
+
+        Returns:
+            (whether a token was taken, seconds until one is available if not)
+        """
+        if not self.redis:
+            return True, 0.0
+
+        rate, capacity = self.limits(session)
+        try:
+            taken, wait = self._take(
+                keys=[self.BUCKET_KEY.format(session_id=session.session_id)],
+                args=[rate, capacity, time.time()]
+            )
+        except Exception as e:
+            logger.warning(f'Could not take send token for session {session.session_id}: {e}')
+            return True, 0.0
+
+        return bool(taken), float(wait)
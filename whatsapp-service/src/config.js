@@ -22,8 +22,26 @@ module.exports = {
   sessionTimeout: parseInt(process.env.SESSION_TIMEOUT) || 300000,
   maxConcurrentSessions: parseInt(process.env.MAX_CONCURRENT_SESSIONS) || 50,
   
+  // How long a completed send is remembered for Idempotency-Key replays (ms)
+  idempotencyTtl: parseInt(process.env.IDEMPOTENCY_TTL) || 600000,
+  
   // Webhook
   webhookUrl: process.env.WEBHOOK_URL || `${process.env.DJANGO_API_URL || 'http://localhost:8000'}/api/v1/sessions/webhook/`,
+  receiptWebhookUrl: process.env.RECEIPT_WEBHOOK_URL || `${process.env.DJANGO_API_URL || 'http://localhost:8000'}/api/v1/messages/receipts/webhook/`,
+  
+  // Delivery receipts are batched: flushed every interval (ms) or once this many are buffered
+  receiptFlushInterval: parseInt(process.env.RECEIPT_FLUSH_INTERVAL) || 1000,
+  receiptBatchSize: parseInt(process.env.RECEIPT_BATCH_SIZE) || 500,
+  
+  // Inbound messages are batched the same way; failed batches are retried
+  // until inboundMaxBuffer messages are waiting, then the oldest are dropped
+  inboundWebhookUrl: process.env.INBOUND_WEBHOOK_URL || `${process.env.DJANGO_API_URL || 'http://localhost:8000'}/api/v1/messages/inbound/webhook/`,
+  inboundFlushInterval: parseInt(process.env.INBOUND_FLUSH_INTERVAL) || 1000,
+  inboundBatchSize: parseInt(process.env.INBOUND_BATCH_SIZE) || 500,
+  inboundMaxBuffer: parseInt(process.env.INBOUND_MAX_BUFFER) || 20000,
+  
+  // Downloaded media kept in memory for repeat sends (bytes of base64)
+  mediaCacheBytes: parseInt(process.env.MEDIA_CACHE_BYTES) || 256 * 1024 * 1024,
   
   // Security
   apiKey: process.env.API_KEY || 'change-this-secret-key',
@@ -6,6 +6,22 @@ const router = express.Router();
 const whatsappManager = require('../whatsappManager');
 const logger = require('../logger');
 
+// HTTP status of a failed send by error code: session-level failures are
+// 503 so callers can try another session, a failed media download is 502,
+// and anything else WhatsApp rejected is 422
+const SEND_ERROR_STATUS = {
+  SESSION_NOT_FOUND: 503,
+  SESSION_NOT_CONNECTED: 503,
+  SESSION_NOT_READY: 503,
+  SESSION_CLOSED: 503,
+  MEDIA_UNAVAILABLE: 502,
+  SEND_FAILED: 422
+};
+
+function sendFailureStatus(result) {
+  return SEND_ERROR_STATUS[result.code] || 422;
+}
+
 /**
  * Send text message
  * POST /api/message/send-text
@@ -17,14 +33,18 @@ router.post('/send-text', async (req, res) => {
     if (!sessionId || !recipient || !message) {
       return res.status(400).json({
         success: false,
+        code: 'INVALID_REQUEST',
         error: 'sessionId, recipient, and message are required'
       });
     }
 
-    const result = await whatsappManager.sendTextMessage(sessionId, recipient, message);
+    const result = await whatsappManager.runIdempotent(
+      req.get('Idempotency-Key'),
+      () => whatsappManager.sendTextMessage(sessionId, recipient, message)
+    );
     
     if (!result.success) {
-      return res.status(400).json(result);
+      return res.status(sendFailureStatus(result)).json(result);
     }
 
     res.json(result);
@@ -32,6 +52,7 @@ router.post('/send-text', async (req, res) => {
     logger.error('Error sending text message:', error);
     res.status(500).json({
       success: false,
+      code: 'INTERNAL_ERROR',
       error: error.message
     });
   }
@@ -48,20 +69,24 @@ router.post('/send-media', async (req, res) => {
     if (!sessionId || !recipient || !mediaUrl) {
       return res.status(400).json({
         success: false,
+        code: 'INVALID_REQUEST',
         error: 'sessionId, recipient, and mediaUrl are required'
       });
     }
 
-    const result = await whatsappManager.sendMediaMessage(
-      sessionId,
-      recipient,
-      mediaUrl,
-      caption || '',
-      mediaType || 'image'
+    const result = await whatsappManager.runIdempotent(
+      req.get('Idempotency-Key'),
+      () => whatsappManager.sendMediaMessage(
+        sessionId,
+        recipient,
+        mediaUrl,
+        caption || '',
+        mediaType || 'image'
+      )
     );
     
     if (!result.success) {
-      return res.status(400).json(result);
+      return res.status(sendFailureStatus(result)).json(result);
     }
 
     res.json(result);
@@ -69,6 +94,7 @@ router.post('/send-media', async (req, res) => {
     logger.error('Error sending media message:', error);
     res.status(500).json({
       success: false,
+      code: 'INTERNAL_ERROR',
       error: error.message
     });
   }
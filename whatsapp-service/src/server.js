@@ -137,6 +137,8 @@ process.on('SIGTERM', async () => {
   for (const session of sessions) {
     await whatsappManager.destroyClient(session.sessionId);
   }
+  await whatsappManager.flushReceipts();
+  await whatsappManager.flushInbound();
   process.exit(0);
 });
 
@@ -147,6 +149,8 @@ process.on('SIGINT', async () => {
   for (const session of sessions) {
     await whatsappManager.destroyClient(session.sessionId);
   }
+  await whatsappManager.flushReceipts();
+  await whatsappManager.flushInbound();
   process.exit(0);
 });
 
@@ -13,17 +13,190 @@ class WhatsAppManager {
     this.qrCodes = new Map();
     this.qrCodeTimestamps = new Map(); // Track when QR codes were created
     this.sessionStatus = new Map();
+    this.idempotentSends = new Map(); // Idempotency-Key -> { promise, expiresAt }
+    this.pendingReceipts = new Map(); // messageId -> { messageId, status, timestamp }
+    this.receiptFlushTimer = null;
+    this.pendingInbound = []; // received messages waiting for the next inbound webhook call
+    this.inboundFlushTimer = null;
+    this.mediaCache = new Map(); // media URL -> { mimeType, data }, least recently used first
+    this.mediaCacheBytes = 0;
     
     // Start periodic QR code cleanup (every minute)
     this.startQRCodeCleanup();
   }
 
+  /**
+   * Buffer a delivery/read receipt for the next batched webhook call
+   * Only the furthest status per message is kept, so a message read
+   * within the flush window costs a single row.
+   */
+  queueReceipt(messageId, status) {
+    const existing = this.pendingReceipts.get(messageId);
+    if (existing && existing.status === 'read') {
+      return;
+    }
+
+    this.pendingReceipts.set(messageId, { messageId, status, timestamp: Date.now() });
+
+    if (this.pendingReceipts.size >= config.receiptBatchSize) {
+      this.flushReceipts();
+    } else if (!this.receiptFlushTimer) {
+      this.receiptFlushTimer = setTimeout(() => this.flushReceipts(), config.receiptFlushInterval);
+    }
+  }
+
+  /**
+   * Send buffered receipts to Django in one request
+   */
+  async flushReceipts() {
+    if (this.receiptFlushTimer) {
+      clearTimeout(this.receiptFlushTimer);
+      this.receiptFlushTimer = null;
+    }
+
+    if (this.pendingReceipts.size === 0) {
+      return;
+    }
+
+    const receipts = Array.from(this.pendingReceipts.values());
+    this.pendingReceipts.clear();
+
+    try {
+      const axios = require('axios');
+      await axios.post(config.receiptWebhookUrl, { receipts }, {
+        headers: {
+          'Content-Type': 'application/json',
+          'x-api-key': config.apiKey
+        },
+        timeout: 10000
+      });
+      logger.debug(`Sent ${receipts.length} message receipts`);
+    } catch (error) {
+      logger.error(`Failed to send ${receipts.length} message receipts: ${error.message}`);
+      // Don't throw - receipts are best effort; a later ack for the same message still applies
+    }
+  }
+
+  /**
+   * Buffer a received message for the next batched inbound webhook call
+   */
+  queueInbound(sessionId, message) {
+    this.pendingInbound.push({
+      sessionId,
+      messageId: message.id.id,
+      from: message.from,
+      author: message.author || null,
+      type: message.type,
+      body: message.body,
+      hasMedia: message.hasMedia,
+      timestamp: message.timestamp * 1000
+    });
+
+    if (this.pendingInbound.length >= config.inboundBatchSize) {
+      this.flushInbound();
+    } else if (!this.inboundFlushTimer) {
+      this.inboundFlushTimer = setTimeout(() => this.flushInbound(), config.inboundFlushInterval);
+    }
+  }
+
+  /**
+   * Send buffered inbound messages to Django in one request
+   * A failed batch is put back and retried with the next flush, up to
+   * inboundMaxBuffer messages, so a Django restart does not lose messages.
+   */
+  async flushInbound() {
+    if (this.inboundFlushTimer) {
+      clearTimeout(this.inboundFlushTimer);
+      this.inboundFlushTimer = null;
+    }
+
+    if (this.pendingInbound.length === 0) {
+      return;
+    }
+
+    const messages = this.pendingInbound.splice(0, config.inboundBatchSize);
+
+    try {
+      const axios = require('axios');
+      await axios.post(config.inboundWebhookUrl, { messages }, {
+        headers: {
+          'Content-Type': 'application/json',
+          'x-api-key': config.apiKey
+        },
+        timeout: 10000
+      });
+      logger.debug(`Sent ${messages.length} inbound messages`);
+    } catch (error) {
+      logger.error(`Failed to send ${messages.length} inbound messages: ${error.message}`);
+      this.pendingInbound.unshift(...messages);
+      const overflow = this.pendingInbound.length - config.inboundMaxBuffer;
+      if (overflow > 0) {
+        this.pendingInbound.splice(0, overflow);
+        logger.error(`Inbound buffer full, dropped ${overflow} oldest messages`);
+      }
+    }
+
+    if (this.pendingInbound.length > 0 && !this.inboundFlushTimer) {
+      this.inboundFlushTimer = setTimeout(() => this.flushInbound(), config.inboundFlushInterval);
+    }
+  }
+
+  /**
+   * Run a send at most once per Idempotency-Key
+   * Concurrent or repeated calls with the same key share the first call's
+   * result; failed sends are forgotten so they can be retried.
+   */
+  runIdempotent(key, send) {
+    if (!key) {
+      return send();
+    }
+
+    const entry = this.idempotentSends.get(key);
+    if (entry && entry.expiresAt > Date.now()) {
+      logger.info(`Reusing result of in-flight or completed send for idempotency key ${key}`);
+      return entry.promise;
+    }
+
+    const promise = send().then(
+      (result) => {
+        if (!result.success) {
+          this.idempotentSends.delete(key);
+        }
+        return result;
+      },
+      (error) => {
+        this.idempotentSends.delete(key);
+        throw error;
+      }
+    );
+
+    this.idempotentSends.set(key, {
+      promise,
+      expiresAt: Date.now() + config.idempotencyTtl
+    });
+
+    return promise;
+  }
+
+  /**
+   * Drop idempotency records past their TTL
+   */
+  cleanupIdempotencyKeys() {
+    const now = Date.now();
+    for (const [key, entry] of this.idempotentSends.entries()) {
+      if (entry.expiresAt <= now) {
+        this.idempotentSends.delete(key);
+      }
+    }
+  }
+
   /**
    * Start periodic QR code cleanup
    */
   startQRCodeCleanup() {
     setInterval(() => {
       this.cleanupExpiredQRCodes();
+      this.cleanupIdempotencyKeys();
     }, 60000); // Run every 60 seconds
     
     logger.info('Started QR code cleanup task (runs every 60 seconds)');
@@ -101,7 +274,7 @@ class WhatsAppManager {
       this.clients.delete(sessionId);
       this.sessionStatus.delete(sessionId);
       
-      return { success: false, message: error.message };
+      return { success: false, code: 'SEND_FAILED', message: error.message };
     }
   }
 
@@ -180,10 +353,26 @@ class WhatsAppManager {
       });
     });
 
-    // Message received (for future webhook support)
-    client.on('message', async (message) => {
+    // Delivery/read receipts for messages we sent
+    client.on('message_ack', (message, ack) => {
+      if (!message.fromMe) {
+        return;
+      }
+      // 2 = delivered to device, 3 = read, 4 = played (voice/video)
+      if (ack === 2) {
+        this.queueReceipt(message.id.id, 'delivered');
+      } else if (ack >= 3) {
+        this.queueReceipt(message.id.id, 'read');
+      }
+    });
+
+    // Message received: batched to the Django inbound webhook
+    client.on('message', (message) => {
       logger.debug(`Message received on ${sessionId} from ${message.from}`);
-      // Future: Send to Django webhook
+      if (message.fromMe || message.isStatus) {
+        return;
+      }
+      this.queueInbound(sessionId, message);
     });
   }
   
@@ -297,7 +486,7 @@ class WhatsAppManager {
       return { success: true, message: 'Client destroyed' };
     } catch (error) {
       logger.error(`Error destroying client ${sessionId}:`, error);
-      return { success: false, message: error.message };
+      return { success: false, code: 'SEND_FAILED', message: error.message };
     }
   }
 
@@ -309,13 +498,13 @@ class WhatsAppManager {
       const client = this.clients.get(sessionId);
       if (!client) {
         logger.error(`Client ${sessionId} not found in memory`);
-        return { success: false, message: 'Client not found. Please reconnect the session.' };
+        return { success: false, code: 'SESSION_NOT_FOUND', message: 'Client not found. Please reconnect the session.' };
       }
 
       const status = this.sessionStatus.get(sessionId);
       if (status !== 'connected') {
         logger.error(`Client ${sessionId} status is ${status}, not connected`);
-        return { success: false, message: `Client not connected (status: ${status}). Please reconnect the session.` };
+        return { success: false, code: 'SESSION_NOT_CONNECTED', message: `Client not connected (status: ${status}). Please reconnect the session.` };
       }
 
       // Check if client is actually ready
@@ -324,12 +513,12 @@ class WhatsAppManager {
         if (state !== 'CONNECTED') {
           logger.error(`Client ${sessionId} state is ${state}, not CONNECTED`);
           this.sessionStatus.set(sessionId, 'disconnected');
-          return { success: false, message: `Client not ready (state: ${state}). Please reconnect the session.` };
+          return { success: false, code: 'SESSION_NOT_READY', message: `Client not ready (state: ${state}). Please reconnect the session.` };
         }
       } catch (stateError) {
         logger.error(`Error checking state for ${sessionId}:`, stateError);
         this.sessionStatus.set(sessionId, 'disconnected');
-        return { success: false, message: 'Client session closed. Please reconnect the session.' };
+        return { success: false, code: 'SESSION_CLOSED', message: 'Client session closed. Please reconnect the session.' };
       }
 
       // Format recipient number
@@ -350,11 +539,46 @@ class WhatsAppManager {
       // If error is related to closed session, update status
       if (error.message && (error.message.includes('Session closed') || error.message.includes('Protocol error'))) {
         this.sessionStatus.set(sessionId, 'disconnected');
-        return { success: false, message: 'Client session closed. Please reconnect the session.' };
+        return { success: false, code: 'SESSION_CLOSED', message: 'Client session closed. Please reconnect the session.' };
       }
       
-      return { success: false, message: error.message };
+      return { success: false, code: 'SEND_FAILED', message: error.message };
+    }
+  }
+
+  /**
+   * Download media for a send, reusing recently sent files
+   * Stored media paths are content-addressed, so a URL always returns the
+   * same bytes and a campaign downloads its file once instead of per recipient.
+   * Entries are keyed without the query string, which only carries the
+   * short-lived signature.
+   */
+  async fetchMedia(mediaUrl) {
+    const cacheKey = mediaUrl.split('?')[0];
+    const cached = this.mediaCache.get(cacheKey);
+    if (cached) {
+      // Move to the most recently used end
+      this.mediaCache.delete(cacheKey);
+      this.mediaCache.set(cacheKey, cached);
+      return cached;
+    }
+
+    const axios = require('axios');
+    const response = await axios.get(mediaUrl, { responseType: 'arraybuffer' });
+    const buffer = Buffer.from(response.data, 'binary');
+    const entry = { mimeType: response.headers['content-type'], data: buffer.toString('base64') };
+
+    if (entry.data.length <= config.mediaCacheBytes) {
+      this.mediaCache.set(cacheKey, entry);
+      this.mediaCacheBytes += entry.data.length;
+      for (const [url, old] of this.mediaCache) {
+        if (this.mediaCacheBytes <= config.mediaCacheBytes) break;
+        this.mediaCache.delete(url);
+        this.mediaCacheBytes -= old.data.length;
+      }
     }
+
+    return entry;
   }
 
   /**
@@ -365,13 +589,13 @@ class WhatsAppManager {
       const client = this.clients.get(sessionId);
       if (!client) {
         logger.error(`Client ${sessionId} not found in memory`);
-        return { success: false, message: 'Client not found. Please reconnect the session.' };
+        return { success: false, code: 'SESSION_NOT_FOUND', message: 'Client not found. Please reconnect the session.' };
       }
 
       const status = this.sessionStatus.get(sessionId);
       if (status !== 'connected') {
         logger.error(`Client ${sessionId} status is ${status}, not connected`);
-        return { success: false, message: `Client not connected (status: ${status}). Please reconnect the session.` };
+        return { success: false, code: 'SESSION_NOT_CONNECTED', message: `Client not connected (status: ${status}). Please reconnect the session.` };
       }
 
       // Check if client is actually ready
@@ -380,28 +604,28 @@ class WhatsAppManager {
         if (state !== 'CONNECTED') {
           logger.error(`Client ${sessionId} state is ${state}, not CONNECTED`);
           this.sessionStatus.set(sessionId, 'disconnected');
-          return { success: false, message: `Client not ready (state: ${state}). Please reconnect the session.` };
+          return { success: false, code: 'SESSION_NOT_READY', message: `Client not ready (state: ${state}). Please reconnect the session.` };
         }
       } catch (stateError) {
         logger.error(`Error checking state for ${sessionId}:`, stateError);
         this.sessionStatus.set(sessionId, 'disconnected');
-        return { success: false, message: 'Client session closed. Please reconnect the session.' };
+        return { success: false, code: 'SESSION_CLOSED', message: 'Client session closed. Please reconnect the session.' };
       }
 
       const chatId = recipient.includes('@c.us') ? recipient : `${recipient}@c.us`;
 
-      // Download media from URL
-      const axios = require('axios');
-      const response = await axios.get(mediaUrl, { responseType: 'arraybuffer' });
-      const buffer = Buffer.from(response.data, 'binary');
-      const base64 = buffer.toString('base64');
-
-      // Determine mimetype
-      const mimeType = response.headers['content-type'];
+      // Download media from URL (or reuse a recent download)
+      let mimeType, data;
+      try {
+        ({ mimeType, data } = await this.fetchMedia(mediaUrl));
+      } catch (mediaError) {
+        logger.error(`Error downloading media for ${sessionId}:`, mediaError);
+        return { success: false, code: 'MEDIA_UNAVAILABLE', message: `Could not download media: ${mediaError.message}` };
+      }
 
       // Create MessageMedia
       const { MessageMedia } = require('whatsapp-web.js');
-      const media = new MessageMedia(mimeType, base64);
+      const media = new MessageMedia(mimeType, data);
 
       // Send media
       const result = await client.sendMessage(chatId, media, { caption: caption });
@@ -418,10 +642,10 @@ class WhatsAppManager {
       // If error is related to closed session, update status
       if (error.message && (error.message.includes('Session closed') || error.message.includes('Protocol error'))) {
         this.sessionStatus.set(sessionId, 'disconnected');
-        return { success: false, message: 'Client session closed. Please reconnect the session.' };
+        return { success: false, code: 'SESSION_CLOSED', message: 'Client session closed. Please reconnect the session.' };
       }
       
-      return { success: false, message: error.message };
+      return { success: false, code: 'SEND_FAILED', message: error.message };
     }
   }
 